@@ -0,0 +1,270 @@
+"""
+Control de admisión de las llamadas a Azure TTS.
+
+Limita las síntesis simultáneas contra Azure por worker. Las que no tienen
+hueco esperan en una cola acotada ordenada por prioridad (interactive antes
+que normal y bulk) y, dentro de cada prioridad, por orden de llegada. Cada
+petición tiene un plazo (el suyo o, si no lo trae, max_wait de espera en
+cola por cada síntesis): si no va a conseguir hueco a tiempo (la cola está
+llena, la espera estimada supera el plazo o el plazo vence esperando) se
+rechaza al momento con Overloaded, que el servicio convierte en un 503 con
+Retry-After. Con la cola llena, una petición de más prioridad expulsa a la
+última de menos prioridad.
+
+La prioridad y el plazo de la petición en curso viajan en una ContextVar,
+y bind_context() la lleva a los hilos de segmentos y lotes. Los hilos esperan con un Event y las corrutinas de async_app.py
+con un Future: comparten la misma cola y los mismos huecos.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PRIORITIES = {"interactive": 0, "normal": 1, "bulk": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+# (prioridad, plazo absoluto en time.monotonic() o None) de la petición en curso
+admission_context = ContextVar("admission_context", default=(PRIORITIES["normal"], None))
+
+
+def bind_context(func):
+    """Envuelve func para ejecutarla en otro hilo con la prioridad y el plazo de la petición actual"""
+    ticket = admission_context.get()
+
+    def run(*args):
+        admission_context.set(ticket)
+        return func(*args)
+
+    return run
+
+
+class Overloaded(Exception):
+    """La síntesis no se admite: el cliente debe reintentar pasados retry_after segundos"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Service overloaded ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "notify", "granted", "evicted", "cancelled")
+
+    def __init__(self, priority, seq, notify):
+        self.priority = priority
+        self.seq = seq
+        self.notify = notify
+        self.granted = False
+        self.evicted = False
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Huecos de síntesis contra Azure con cola por prioridad y plazos"""
+
+    def __init__(self, max_concurrent=16, max_queue=64, max_wait=None, alpha=0.2, on_shed=None, on_change=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.alpha = alpha
+        self.on_shed = on_shed        # (nombre de prioridad, motivo)
+        self.on_change = on_change    # ({nombre de prioridad: en cola}, huecos ocupados)
+        self._lock = threading.Lock()
+        self._queue = []              # heap de _Waiter (los cancelados se descartan al salir)
+        self._waiting = 0
+        self._active = 0
+        self._hold_ewma = None        # segundos que se ocupa un hueco
+        self._seq = itertools.count()
+        self._stats = {"admitted": 0, "queued": 0, "shed": {}}
+
+    @contextmanager
+    def slot(self):
+        """Ocupa un hueco con la prioridad y el plazo de la petición en curso"""
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def acquire(self):
+        """Espera un hueco (hilos); devuelve un token para release() o lanza Overloaded"""
+        priority, deadline = self._ticket()
+        event = threading.Event()
+        waiter = self._enqueue(priority, deadline, event.set)
+        if waiter is None:
+            return time.monotonic()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        event.wait(timeout)
+        return self._finish_wait(waiter)
+
+    async def acquire_async(self):
+        """Igual que acquire() pero esperando en el bucle de eventos"""
+        priority, deadline = self._ticket()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, deadline, notify)
+        if waiter is None:
+            return time.monotonic()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # El cliente se fue: si el hueco ya se le había cedido se devuelve
+            with self._lock:
+                granted = waiter.granted
+                if not granted and not waiter.cancelled:
+                    waiter.cancelled = True
+                    self._waiting -= 1
+            if granted:
+                self.release(time.monotonic())
+            raise
+        return self._finish_wait(waiter)
+
+    def release(self, token):
+        """Libera el hueco; si hay alguien en cola se le cede directamente"""
+        held = time.monotonic() - token
+        notify = None
+        with self._lock:
+            self._hold_ewma = held if self._hold_ewma is None else self._hold_ewma + self.alpha * (held - self._hold_ewma)
+            while self._queue:
+                waiter = heapq.heappop(self._queue)
+                if waiter.cancelled:
+                    continue
+                waiter.granted = True
+                self._waiting -= 1
+                notify = waiter.notify
+                break
+            else:
+                self._active -= 1
+            depths = self._depths()
+        if notify is not None:
+            notify()
+        self._changed(depths)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "max_wait_ms": self.max_wait * 1000 if self.max_wait else None,
+                "active": self._active,
+                "queued": {PRIORITY_NAMES[priority]: depth for priority, depth in self._depths().items()},
+                "hold_ewma_ms": round(self._hold_ewma * 1000, 1) if self._hold_ewma is not None else None,
+                "admitted": self._stats["admitted"],
+                "waited": self._stats["queued"],
+                "shed": dict(self._stats["shed"]),
+            }
+
+    def _ticket(self):
+        priority, deadline = admission_context.get()
+        if deadline is None and self.max_wait:
+            deadline = time.monotonic() + self.max_wait
+        return priority, deadline
+
+    def _enqueue(self, priority, deadline, notify):
+        """Admite al momento (None), encola (devuelve el _Waiter) o lanza Overloaded"""
+        waiter = evicted = reason = None
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+                self._stats["admitted"] += 1
+            else:
+                ahead = sum(1 for queued in self._queue if not queued.cancelled and queued.priority <= priority)
+                estimate = self._estimate_wait(ahead)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and (remaining <= 0 or (estimate is not None and estimate > remaining)):
+                    reason = "deadline"
+                elif self._waiting >= self.max_queue:
+                    evicted = self._evict_below(priority)
+                    if evicted is None:
+                        reason = "queue_full"
+                if reason is not None:
+                    self._count_shed(priority, reason)
+                    retry_after = self._retry_after(self._waiting)
+                else:
+                    waiter = _Waiter(priority, next(self._seq), notify)
+                    heapq.heappush(self._queue, waiter)
+                    self._waiting += 1
+                    self._stats["queued"] += 1
+            depths = self._depths()
+
+        if evicted is not None:
+            evicted.notify()
+        if reason is not None:
+            self._shed(priority, reason)
+            raise Overloaded(reason, retry_after)
+        self._changed(depths)
+        return waiter
+
+    def _finish_wait(self, waiter):
+        with self._lock:
+            if waiter.granted:
+                self._stats["admitted"] += 1
+                outcome = None
+            else:
+                if not waiter.evicted:
+                    waiter.cancelled = True
+                    self._waiting -= 1
+                outcome = "preempted" if waiter.evicted else "timeout"
+                self._count_shed(waiter.priority, outcome)
+                retry_after = self._retry_after(self._waiting)
+            depths = self._depths()
+        self._changed(depths)
+        if outcome is not None:
+            self._shed(waiter.priority, outcome)
+            raise Overloaded(outcome, retry_after)
+        return time.monotonic()
+
+    def _evict_below(self, priority):
+        """Saca de la cola la última petición de menos prioridad que `priority` (con el lock)"""
+        candidates = [waiter for waiter in self._queue if not waiter.cancelled and waiter.priority > priority]
+        if not candidates:
+            return None
+        victim = max(candidates)
+        victim.cancelled = True
+        victim.evicted = True
+        self._waiting -= 1
+        return victim
+
+    def _estimate_wait(self, ahead):
+        if self._hold_ewma is None:
+            return None
+        return (ahead + 1) / self.max_concurrent * self._hold_ewma
+
+    def _retry_after(self, queued):
+        """Segundos hasta que la cola actual debería haberse vaciado (mínimo 1)"""
+        estimate = self._estimate_wait(queued) or 0.0
+        return max(1, math.ceil(estimate))
+
+    def _depths(self):
+        depths = {priority: 0 for priority in PRIORITY_NAMES}
+        for waiter in self._queue:
+            if not waiter.cancelled:
+                depths[waiter.priority] = depths.get(waiter.priority, 0) + 1
+        return depths
+
+    def _count_shed(self, priority, reason):
+        key = f"{PRIORITY_NAMES.get(priority, priority)}:{reason}"
+        self._stats["shed"][key] = self._stats["shed"].get(key, 0) + 1
+
+    def _shed(self, priority, reason):
+        if self.on_shed is not None:
+            self.on_shed(PRIORITY_NAMES.get(priority, str(priority)), reason)
+
+    def _changed(self, depths):
+        if self.on_change is not None:
+            self.on_change({PRIORITY_NAMES[priority]: depth for priority, depth in depths.items()}, self._active)
@@ -1,13 +1,35 @@
 import os
+import io
+import json
+import time
+import base64
+import uuid
 import requests
-import tempfile
-import shutil
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
 from datetime import datetime
-import soundfile as sf
-import numpy as np
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, has_request_context, g
 from dotenv import load_dotenv
 
+from audio_cache import AudioCache, make_cache_key
+from audio_store import AudioStore
+from azure_client import AzureHTTPClient, UPSTREAM_FAILURE_CODES
+from endpoint_pool import AzureEndpoint, EndpointPool, parse_endpoints
+from azure_auth import TokenProvider
+from admission import PRIORITIES, AdmissionController, Overloaded, admission_context, bind_context
+from circuit_breaker import CircuitBreaker
+from hedging import HedgePolicy
+from health_monitor import HealthMonitor
+from voice_catalog import VoiceCatalog
+from debug_writer import DebugAudioWriter
+from audio_formats import (FORMATS, DEFAULT_FORMAT, audio_metadata, encode_local, is_joinable,
+                           join_segments, stream_prefix)
+from audio_processing import parse_postprocess_options, process_audio, supports_processing
+from text_segmentation import split_text
+from singleflight import SingleFlight, FileKeyLocks
+from slow_profiler import SlowRequestProfiler
+import metrics
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -15,32 +37,295 @@ app = Flask(__name__)
 # Configuración del servicio
 AZURE_TTS_KEY = os.environ.get("AZURE_TTS_KEY")
 AZURE_TTS_REGION = os.environ.get("AZURE_TTS_REGION")
+AZURE_TTS_ENDPOINT = os.getenv("AZURE_TTS_ENDPOINT", "")
+# Varias regiones/claves con failover: "region:clave[@url],..." (sustituye a las tres anteriores)
+AZURE_TTS_ENDPOINTS = os.getenv("AZURE_TTS_ENDPOINTS", "")
 DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "es-ES")
 DEFAULT_VOICE = os.getenv("DEFAULT_VOICE", "Abril")
+# Formato de salida por defecto (ver audio_formats.FORMATS)
+DEFAULT_OUTPUT_FORMAT = os.getenv("DEFAULT_OUTPUT_FORMAT", DEFAULT_FORMAT)
 DEBUG_AUDIO = os.getenv("DEBUG_AUDIO", "true").lower() == "true"
+# Captura de audio de debug: muestreo (1 de cada N), cola y retención
+DEBUG_AUDIO_SAMPLE_EVERY = int(os.getenv("DEBUG_AUDIO_SAMPLE_EVERY", 1))
+DEBUG_AUDIO_QUEUE_SIZE = int(os.getenv("DEBUG_AUDIO_QUEUE_SIZE", 64))
+DEBUG_AUDIO_MAX_FILES = int(os.getenv("DEBUG_AUDIO_MAX_FILES", 1000))
+DEBUG_AUDIO_MAX_MB = int(os.getenv("DEBUG_AUDIO_MAX_MB", 500))
+
+# Configuración de la caché de síntesis
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_MB = int(os.getenv("CACHE_MAX_MB", 128))
+CACHE_DIR = os.getenv("CACHE_DIR", "")
+# Límites del almacén persistente en disco (0 = sin límite)
+AUDIO_STORE_MAX_MB = int(os.getenv("AUDIO_STORE_MAX_MB", 1024))
+AUDIO_STORE_MAX_AGE_DAYS = float(os.getenv("AUDIO_STORE_MAX_AGE_DAYS", 30))
+AUDIO_STORE_SWEEP_INTERVAL = float(os.getenv("AUDIO_STORE_SWEEP_INTERVAL", 300))
+
+# Profiler por muestreo de las peticiones lentas (activable en caliente, ver /debug/profiler)
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_DIR = os.getenv("PROFILER_DIR", "/app/profiles")
+PROFILER_THRESHOLD_MS = float(os.getenv("PROFILER_THRESHOLD_MS", 1000))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+PROFILER_MAX_DUMPS = int(os.getenv("PROFILER_MAX_DUMPS", 200))
+
+# Control de admisión: síntesis simultáneas contra Azure por worker, cola
+# acotada por prioridad y espera máxima en cola de cada síntesis cuando la
+# petición no trae X-Request-Deadline-Ms (0 = sin límite)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 16))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", 10000))
+
+# Coalescencia de síntesis idénticas en vuelo
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+COALESCE_ACROSS_WORKERS = os.getenv("COALESCE_ACROSS_WORKERS", "false").lower() == "true"
+
+# Configuración del cliente HTTP hacia Azure
+AZURE_POOL_SIZE = int(os.getenv("AZURE_POOL_SIZE", 10))
+AZURE_CONNECT_TIMEOUT = float(os.getenv("AZURE_CONNECT_TIMEOUT", 3.05))
+AZURE_READ_TIMEOUT = float(os.getenv("AZURE_READ_TIMEOUT", 15))
+AZURE_MAX_RETRIES = int(os.getenv("AZURE_MAX_RETRIES", 2))
+AZURE_RETRY_BACKOFF = float(os.getenv("AZURE_RETRY_BACKOFF", 0.3))
+
+# Enrutado entre endpoints: suavizado de la EWMA, enfriamiento tras un fallo
+# y cada cuánto se vuelve a probar un endpoint sin tráfico
+AZURE_ENDPOINT_EWMA_ALPHA = float(os.getenv("AZURE_ENDPOINT_EWMA_ALPHA", 0.2))
+AZURE_ENDPOINT_COOLDOWN = float(os.getenv("AZURE_ENDPOINT_COOLDOWN", 5))
+AZURE_ENDPOINT_MAX_COOLDOWN = float(os.getenv("AZURE_ENDPOINT_MAX_COOLDOWN", 60))
+AZURE_ENDPOINT_EXPLORE_INTERVAL = float(os.getenv("AZURE_ENDPOINT_EXPLORE_INTERVAL", 30))
+
+# Autenticación: "key" envía la clave en cada síntesis; "token" la canjea por un
+# token bearer (issueToken) que se renueva en segundo plano antes de caducar
+AZURE_AUTH_MODE = os.getenv("AZURE_AUTH_MODE", "key").lower()
+AZURE_TOKEN_REFRESH = float(os.getenv("AZURE_TOKEN_REFRESH", 540))
+AZURE_TOKEN_LIFETIME = float(os.getenv("AZURE_TOKEN_LIFETIME", 600))
+AZURE_TOKEN_RETRY = float(os.getenv("AZURE_TOKEN_RETRY", 10))
+
+# Circuit breaker: con al menos MIN_CALLS síntesis en la ventana y una proporción
+# de fallos (o de síntesis más lentas que SLOW_MS, 0 = sin umbral) de FAILURE_RATIO
+# se rechazan las síntesis durante OPEN_SECONDS antes de volver a probar Azure
+AZURE_CIRCUIT_ENABLED = os.getenv("AZURE_CIRCUIT_ENABLED", "true").lower() == "true"
+AZURE_CIRCUIT_WINDOW = float(os.getenv("AZURE_CIRCUIT_WINDOW", 30))
+AZURE_CIRCUIT_MIN_CALLS = int(os.getenv("AZURE_CIRCUIT_MIN_CALLS", 20))
+AZURE_CIRCUIT_FAILURE_RATIO = float(os.getenv("AZURE_CIRCUIT_FAILURE_RATIO", 0.5))
+AZURE_CIRCUIT_SLOW_MS = float(os.getenv("AZURE_CIRCUIT_SLOW_MS", 5000))
+AZURE_CIRCUIT_OPEN_SECONDS = float(os.getenv("AZURE_CIRCUIT_OPEN_SECONDS", 10))
+AZURE_CIRCUIT_MAX_CALLS = int(os.getenv("AZURE_CIRCUIT_MAX_CALLS", 1000))
+
+# Hedging: segunda petición a Azure si la primera no responde en el percentil
+# QUANTILE de la latencia observada, como mucho para una fracción BUDGET de las síntesis
+AZURE_HEDGE_ENABLED = os.getenv("AZURE_HEDGE_ENABLED", "false").lower() == "true"
+AZURE_HEDGE_QUANTILE = float(os.getenv("AZURE_HEDGE_QUANTILE", 0.95))
+AZURE_HEDGE_BUDGET = float(os.getenv("AZURE_HEDGE_BUDGET", 0.05))
+AZURE_HEDGE_MIN_DELAY_MS = float(os.getenv("AZURE_HEDGE_MIN_DELAY_MS", 50))
+
+# Estado de salud refrescado en segundo plano
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", 30))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 5))
+HEALTH_WINDOW_SECONDS = float(os.getenv("HEALTH_WINDOW_SECONDS", 300))
+HEALTH_MIN_SUCCESS_RATIO = float(os.getenv("HEALTH_MIN_SUCCESS_RATIO", 0.5))
+HEALTH_MAX_SAMPLES = int(os.getenv("HEALTH_MAX_SAMPLES", 1000))
+
+# Catálogo de voces obtenido de Azure (snapshot local para arrancar sin conexión). Por defecto
+# se guarda en el almacén de CACHE_DIR, que es un volumen y sobrevive a recrear el contenedor
+VOICE_CATALOG_SNAPSHOT = os.getenv("VOICE_CATALOG_SNAPSHOT",
+                                   os.path.join(CACHE_DIR or os.path.dirname(os.path.abspath(__file__)),
+                                                "voice_catalog.json"))
+VOICE_CATALOG_REFRESH = float(os.getenv("VOICE_CATALOG_REFRESH", 3600))
+VOICE_LOCALES = [prefix.strip() for prefix in os.getenv("VOICE_LOCALES", "es").split(",") if prefix.strip()]
+
+# Tamaño de los chunks reenviados en modo streaming
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 4096))
+
+# Configuración del modo de textos largos (segmentación + síntesis en paralelo)
+LONG_TEXT_THRESHOLD = int(os.getenv("LONG_TEXT_THRESHOLD", 400))
+LONG_TEXT_MAX_SEGMENT = int(os.getenv("LONG_TEXT_MAX_SEGMENT", 250))
+LONG_TEXT_WORKERS = int(os.getenv("LONG_TEXT_WORKERS", 4))
+SENTENCE_SILENCE_MS = int(os.getenv("SENTENCE_SILENCE_MS", 150))
+
+# Configuración del endpoint de síntesis por lotes
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
 
 # Configuración del servidor Flask
 FLASK_HOST = os.getenv("FLASK_HOST", "0.0.0.0")
 FLASK_PORT = int(os.getenv("FLASK_PORT", 5000))
 
-if not AZURE_TTS_KEY or not AZURE_TTS_REGION:
+if not AZURE_TTS_ENDPOINTS and (not AZURE_TTS_KEY or not AZURE_TTS_REGION):
     raise Exception("Azure TTS credentials not found in environment variables.")
 
-# Crear directorio para audio de debug
-DEBUG_DIR = "/app/debug_audio"
-if DEBUG_AUDIO and not os.path.exists(DEBUG_DIR):
-    os.makedirs(DEBUG_DIR, exist_ok=True)
+if AZURE_AUTH_MODE not in ("key", "token"):
+    raise Exception(f"Unsupported AZURE_AUTH_MODE '{AZURE_AUTH_MODE}' (supported: key, token)")
+
+if DEFAULT_OUTPUT_FORMAT not in FORMATS:
+    raise Exception(f"Unsupported DEFAULT_OUTPUT_FORMAT '{DEFAULT_OUTPUT_FORMAT}' (supported: {', '.join(FORMATS)})")
+
+# Endpoints de Azure TTS (AZURE_TTS_ENDPOINT permite apuntar a un stub local)
+azure_endpoints = EndpointPool(
+    parse_endpoints(AZURE_TTS_ENDPOINTS) if AZURE_TTS_ENDPOINTS
+    else [AzureEndpoint(AZURE_TTS_REGION, AZURE_TTS_KEY, AZURE_TTS_ENDPOINT or None)],
+    alpha=AZURE_ENDPOINT_EWMA_ALPHA,
+    cooldown=AZURE_ENDPOINT_COOLDOWN,
+    max_cooldown=AZURE_ENDPOINT_MAX_COOLDOWN,
+    explore_interval=AZURE_ENDPOINT_EXPLORE_INTERVAL,
+)
+
+# Cliente HTTP con pool de conexiones keep-alive compartido por el worker.
+# Con varios endpoints no se reintenta contra el mismo: se pasa al siguiente
+azure_client = AzureHTTPClient(
+    pool_size=AZURE_POOL_SIZE,
+    connect_timeout=AZURE_CONNECT_TIMEOUT,
+    read_timeout=AZURE_READ_TIMEOUT,
+    max_retries=AZURE_MAX_RETRIES if len(azure_endpoints) == 1 else 0,
+    backoff_factor=AZURE_RETRY_BACKOFF,
+)
+
+# Tokens bearer por endpoint; el hilo de renovación arranca con la primera síntesis
+auth_tokens = None
+if AZURE_AUTH_MODE == "token":
+    auth_tokens = TokenProvider(
+        azure_client,
+        azure_endpoints.endpoints,
+        refresh_interval=AZURE_TOKEN_REFRESH,
+        lifetime=AZURE_TOKEN_LIFETIME,
+        retry_interval=AZURE_TOKEN_RETRY,
+        timeout=HEALTH_CHECK_TIMEOUT,
+        on_refresh=lambda endpoint, ok, seconds: metrics.observe_token_refresh(endpoint.name, ok, seconds),
+        on_tick=metrics.observe_token_ages,
+    )
+
+def probe_azure():
+    """Comprobación ligera de conectividad con Azure TTS (lista de voces)"""
+    endpoint = azure_endpoints.preferred()
+    test_url = f"{endpoint.base_url}/cognitiveservices/voices/list"
+    headers = {"Ocp-Apim-Subscription-Key": endpoint.key}
+    response = azure_client.get(test_url, headers=headers, timeout=HEALTH_CHECK_TIMEOUT)
+    response.raise_for_status()
+
+# Síntesis rechazadas al momento mientras Azure falla (la caché se sigue sirviendo)
+circuit_breaker = None
+if AZURE_CIRCUIT_ENABLED:
+    circuit_breaker = CircuitBreaker(
+        window=AZURE_CIRCUIT_WINDOW,
+        min_calls=AZURE_CIRCUIT_MIN_CALLS,
+        failure_ratio=AZURE_CIRCUIT_FAILURE_RATIO,
+        slow_threshold=AZURE_CIRCUIT_SLOW_MS / 1000 if AZURE_CIRCUIT_SLOW_MS > 0 else None,
+        open_seconds=AZURE_CIRCUIT_OPEN_SECONDS,
+        max_calls=AZURE_CIRCUIT_MAX_CALLS,
+        on_change=metrics.observe_circuit,
+        on_reject=metrics.observe_circuit_rejected,
+    )
+print(f"[*] Circuit breaker de Azure: {'ACTIVADO' if circuit_breaker else 'DESACTIVADO'}")
+
+# Peticiones de cobertura contra la cola de latencia de Azure. Los intentos se
+# lanzan en hilos propios para poder esperar al primero que responda
+hedging = None
+hedge_executor = None
+if AZURE_HEDGE_ENABLED:
+    hedging = HedgePolicy(
+        quantile=AZURE_HEDGE_QUANTILE,
+        budget=AZURE_HEDGE_BUDGET,
+        min_delay=AZURE_HEDGE_MIN_DELAY_MS / 1000,
+        on_hedge=metrics.observe_hedge,
+    )
+    hedge_executor = ThreadPoolExecutor(max_workers=AZURE_POOL_SIZE * 4, thread_name_prefix="azure-hedge")
+    print(f"[*] Hedging contra Azure: p{AZURE_HEDGE_QUANTILE * 100:g}, "
+          f"hasta el {AZURE_HEDGE_BUDGET * 100:g}% de las síntesis")
+
+# El hilo de refresco arranca con la primera consulta, ya dentro del worker
+health_monitor = HealthMonitor(
+    probe_azure,
+    interval=HEALTH_CHECK_INTERVAL,
+    window=HEALTH_WINDOW_SECONDS,
+    min_success_ratio=HEALTH_MIN_SUCCESS_RATIO,
+    max_samples=HEALTH_MAX_SAMPLES,
+)
+
+# Audio de debug: se escribe en segundo plano con cola acotada y retención
+DEBUG_DIR = os.getenv("DEBUG_DIR", "/app/debug_audio")
+debug_writer = None
+if DEBUG_AUDIO:
+    debug_writer = DebugAudioWriter(
+        DEBUG_DIR,
+        queue_size=DEBUG_AUDIO_QUEUE_SIZE,
+        sample_every=DEBUG_AUDIO_SAMPLE_EVERY,
+        max_files=DEBUG_AUDIO_MAX_FILES,
+        max_bytes=DEBUG_AUDIO_MAX_MB * 1024 * 1024,
+    )
 
 print(f"[*] Iniciando Azure TTS Service")
 print(f"[*] Host: {FLASK_HOST}:{FLASK_PORT}")
-print(f"[*] Región: {AZURE_TTS_REGION}")
+print(f"[*] Región: {', '.join(endpoint.name for endpoint in azure_endpoints.endpoints)}")
+print(f"[*] Autenticación con Azure: {'token (issueToken)' if auth_tokens else 'clave'}")
 print(f"[*] Idioma por defecto: {DEFAULT_LANGUAGE}")
 print(f"[*] Voz por defecto: {DEFAULT_VOICE}")
 print(f"[*] Debug de audio: {'ACTIVADO' if DEBUG_AUDIO else 'DESACTIVADO'}")
 if DEBUG_AUDIO:
-    print(f"[*] Directorio de debug: {DEBUG_DIR}")
+    print(f"[*] Directorio de debug: {DEBUG_DIR} (1 de cada {DEBUG_AUDIO_SAMPLE_EVERY} peticiones, "
+          f"máx. {DEBUG_AUDIO_MAX_FILES} ficheros / {DEBUG_AUDIO_MAX_MB} MB)")
+
+try:
+    slow_profiler = SlowRequestProfiler(
+        PROFILER_DIR,
+        enabled=PROFILER_ENABLED,
+        threshold_ms=PROFILER_THRESHOLD_MS,
+        interval_ms=PROFILER_INTERVAL_MS,
+        max_dumps=PROFILER_MAX_DUMPS,
+    )
+    print(f"[*] Profiler de peticiones lentas: {'ACTIVADO' if slow_profiler.enabled else 'DESACTIVADO'} "
+          f"({PROFILER_DIR}, umbral {slow_profiler.threshold_ms:g} ms)")
+except OSError as e:
+    slow_profiler = None
+    print(f"[!] Profiler de peticiones lentas no disponible ({PROFILER_DIR}): {e}")
+
+# Límite de síntesis simultáneas contra Azure con cola por prioridad
+admission = None
+if ADMISSION_ENABLED:
+    admission = AdmissionController(
+        max_concurrent=ADMISSION_MAX_CONCURRENT,
+        max_queue=ADMISSION_MAX_QUEUE,
+        max_wait=ADMISSION_MAX_WAIT_MS / 1000,
+        on_shed=metrics.observe_shed,
+        on_change=metrics.observe_admission,
+    )
+print(f"[*] Control de admisión: {'ACTIVADO' if admission else 'DESACTIVADO'}")
+if admission:
+    print(f"[*] Síntesis simultáneas contra Azure: {ADMISSION_MAX_CONCURRENT} por worker, "
+          f"cola de {ADMISSION_MAX_QUEUE}, espera máxima {ADMISSION_MAX_WAIT_MS:g} ms")
 
-# Configuración de voces disponibles en Azure TTS para español
+# Pool acotado para sintetizar en paralelo los segmentos de textos largos
+segment_executor = ThreadPoolExecutor(max_workers=LONG_TEXT_WORKERS, thread_name_prefix="segment")
+
+# Caché de audio sintetizado (memoria + almacén persistente en disco opcional)
+audio_store = None
+if CACHE_ENABLED and CACHE_DIR:
+    audio_store = AudioStore(
+        CACHE_DIR,
+        max_bytes=AUDIO_STORE_MAX_MB * 1024 * 1024,
+        max_age=AUDIO_STORE_MAX_AGE_DAYS * 86400,
+        sweep_interval=AUDIO_STORE_SWEEP_INTERVAL,
+    )
+audio_cache = AudioCache(CACHE_MAX_MB * 1024 * 1024, audio_store) if CACHE_ENABLED else None
+
+print(f"[*] Caché de síntesis: {'ACTIVADA' if CACHE_ENABLED else 'DESACTIVADA'}")
+if CACHE_ENABLED:
+    print(f"[*] Caché en memoria: {CACHE_MAX_MB} MB, en disco: {CACHE_DIR or 'no'}"
+          f"{f' (máx. {AUDIO_STORE_MAX_MB} MB, {AUDIO_STORE_MAX_AGE_DAYS:g} días)' if audio_store else ''}")
+
+# Las peticiones idénticas en vuelo comparten una única llamada a Azure
+coalescer = SingleFlight() if COALESCE_ENABLED else None
+
+# Entre workers se coordina con locks de fichero junto a la caché en disco
+worker_locks = None
+if coalescer is not None and COALESCE_ACROSS_WORKERS:
+    if audio_cache is not None and CACHE_DIR:
+        worker_locks = FileKeyLocks(os.path.join(CACHE_DIR, ".locks"))
+    else:
+        print("[!] COALESCE_ACROSS_WORKERS requiere CACHE_DIR; solo se coalesce dentro del worker")
+
+print(f"[*] Coalescencia de peticiones: {'ACTIVADA' if coalescer else 'DESACTIVADA'}"
+      f"{' (entre workers)' if worker_locks else ''}")
+
+# Catálogo inicial de voces en español (hasta cargar el snapshot o el de Azure)
 AVAILABLE_VOICES = {
     'es-ES': {  # Español de España
         'female': ['Abril', 'Elvira', 'Esperanza', 'Estrella', 'Irene', 'Laia', 'Lia', 'Lola', 'Mar', 'Nia', 'Sol', 'Tania', 'Vega', 'Vera'],
@@ -58,9 +343,9 @@ AVAILABLE_VOICES = {
         'default': 'Elena'
     },
     'es-CO': {  # Español de Colombia
-        'female': [],  # Ximena no está disponible
+        'female': ['Salome'],
         'male': ['Gonzalo'],
-        'default': 'Gonzalo'  # Cambiado de Ximena a Gonzalo
+        'default': 'Salome'
     },
     'es-CL': {  # Español de Chile
         'female': ['Catalina'],
@@ -91,47 +376,47 @@ LANGUAGE_MAP = {
     'es-ve': 'es-VE'
 }
 
+def fetch_voice_list():
+    """Descarga la lista completa de voces de Azure TTS"""
+    endpoint = azure_endpoints.preferred()
+    url = f"{endpoint.base_url}/cognitiveservices/voices/list"
+    response = azure_client.get(url, headers={"Ocp-Apim-Subscription-Key": endpoint.key},
+                                timeout=HEALTH_CHECK_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+# Los diccionarios anteriores son solo el catálogo inicial: se sustituyen por
+# el snapshot local o, en cuanto se descarga, por el catálogo real de Azure
+voice_catalog = VoiceCatalog(
+    fetch_voice_list,
+    AVAILABLE_VOICES,
+    LANGUAGE_MAP,
+    DEFAULT_LANGUAGE,
+    DEFAULT_VOICE,
+    snapshot_path=VOICE_CATALOG_SNAPSHOT,
+    refresh_interval=VOICE_CATALOG_REFRESH,
+    locale_prefixes=VOICE_LOCALES,
+)
+print(f"[*] Catálogo de voces: {voice_catalog.index.total_voices} voces ({voice_catalog.index.source})")
+
 def get_optimal_voice_for_language(language, voice=None, gender_preference=None):
     """Selecciona la voz óptima según el idioma y preferencias"""
-    
-    # Normalizar idioma
-    language = LANGUAGE_MAP.get(language.lower(), language)
-    
-    # Obtener voces disponibles para el idioma
-    lang_voices = AVAILABLE_VOICES.get(language, AVAILABLE_VOICES['es-ES'])
-    
-    # Si se especifica una voz, validarla
-    if voice:
-        all_voices = lang_voices['female'] + lang_voices['male']
-        if voice in all_voices:
-            return voice
-    
-    # Si se especifica preferencia de género
-    if gender_preference in ['female', 'male'] and gender_preference in lang_voices:
-        recommended_voices = lang_voices[gender_preference]
-        if recommended_voices:
-            return recommended_voices[0]
-    
-    # Devolver la voz por defecto del idioma
-    return lang_voices.get('default', DEFAULT_VOICE)
+    return voice_catalog.resolve_voice(language, voice, gender_preference)
 
-def synthesize_with_azure_tts(text, language="es-ES", voice="Abril", speed=1.0):
-    """Sintetiza audio usando Azure TTS"""
-    try:
-        print(f"[DEBUG] Sintetizando con Azure TTS: lang={language}, voice={voice}, speed={speed}")
-        
-        tts_url = f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/v1"
+def clamp_speed(speed):
+    """Ajusta la velocidad al rango válido de SSML (0.5 a 2.0)"""
+    return max(0.5, min(2.0, speed))
 
-        headers = {
-            "Ocp-Apim-Subscription-Key": AZURE_TTS_KEY,
-            "Content-Type": "application/ssml+xml",
-            "X-Microsoft-OutputFormat": "audio-24khz-160kbitrate-mono-mp3",
-        }
+def native_format(output_format):
+    """Formato que se pide a Azure (los formatos locales se codifican a partir de otro)"""
+    return FORMATS[output_format].get("source", output_format)
 
-        # Ajustar velocidad para SSML (0.5 a 2.0 es el rango válido)
-        adjusted_speed = max(0.5, min(2.0, speed))
-        
-        ssml = f"""
+def build_ssml(text, language, voice, speed):
+    """Construye el documento SSML para Azure TTS"""
+    # Ajustar velocidad para SSML (0.5 a 2.0 es el rango válido)
+    adjusted_speed = clamp_speed(speed)
+    
+    return f"""
         <speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='{language}'>
             <voice name='{language}-{voice}Neural'>
                 <prosody rate='{adjusted_speed}'>{text}</prosody>
@@ -139,123 +424,724 @@ def synthesize_with_azure_tts(text, language="es-ES", voice="Abril", speed=1.0):
         </speak>
         """
 
-        response = requests.post(tts_url, headers=headers, data=ssml.encode('utf-8'))
+def azure_tts_headers(endpoint, output_format):
+    """Cabeceras de una petición de síntesis a Azure TTS"""
+    if auth_tokens is not None:
+        auth = auth_tokens.auth_headers(endpoint)
+    else:
+        auth = {"Ocp-Apim-Subscription-Key": endpoint.key}
+    return {
+        **auth,
+        "Content-Type": "application/ssml+xml",
+        "X-Microsoft-OutputFormat": output_format,
+    }
+
+def request_azure_tts(text, language, voice, speed, output_format, stream=False):
+    """Lanza la petición de síntesis a Azure TTS y devuelve la respuesta HTTP
+
+    Se prueba primero el endpoint más rápido y sano; ante throttling, errores
+    de Azure o timeouts se pasa al siguiente del pool. Con el circuito abierto
+    se lanza Overloaded sin llamar a Azure.
+    """
+    ssml = build_ssml(text, language, voice, speed).encode('utf-8')
+    probe = circuit_breaker.allow() if circuit_breaker is not None else False
+    start = time.perf_counter()
+    ok = False
+    try:
+        response, elapsed = request_endpoints(ssml, output_format, stream)
+        ok = response.status_code not in UPSTREAM_FAILURE_CODES
+    finally:
+        if circuit_breaker is not None:
+            circuit_breaker.record(ok, time.perf_counter() - start, probe)
+    # response.elapsed llega hasta las cabeceras; sin stream el cuerpo ya está descargado
+    ttfb = response.elapsed.total_seconds()
+    add_server_timing("azure_ttfb", ttfb)
+    if not stream:
+        add_server_timing("azure_download", max(0.0, elapsed - ttfb))
+    try:
         response.raise_for_status()
+    except requests.HTTPError:
+        # En streaming el cuerpo no se ha leído: sin cerrar, la conexión no vuelve al pool
+        response.close()
+        raise
+    return response
 
-        # Guardar temporalmente como MP3 y convertir a WAV
-        temp_mp3 = tempfile.mktemp(suffix=".mp3")
-        with open(temp_mp3, "wb") as f:
-            f.write(response.content)
-        
-        # Leer MP3 y convertir a arrays numpy
-        import librosa
-        audio_data, sample_rate = librosa.load(temp_mp3, sr=24000)
-        os.unlink(temp_mp3)
+def request_endpoints(ssml, output_format, stream):
+    """Síntesis con failover entre los endpoints del pool; devuelve (respuesta, segundos)"""
+    remaining = azure_endpoints.ordered()
+    hedge_delay = hedging.delay() if hedging is not None else None
+    while remaining:
+        endpoint = remaining.pop(0)
+        try:
+            if hedge_delay is not None:
+                # Solo se cubre el primer intento; la cobertura va al siguiente endpoint
+                backup = remaining[0] if remaining else endpoint
+                response, elapsed, endpoint, hedged = hedged_attempt(endpoint, backup, hedge_delay,
+                                                                     output_format, ssml, stream)
+                if hedged and backup in remaining:
+                    remaining.remove(backup)
+                hedge_delay = None
+            else:
+                response, elapsed = attempt_endpoint(endpoint, output_format, ssml, stream)
+        except requests.RequestException as e:
+            if not remaining:
+                raise
+            print(f"[!] Azure TTS ({endpoint.name}) sin respuesta: {e}; se prueba otro endpoint")
+            continue
+        if response.status_code in UPSTREAM_FAILURE_CODES and remaining:
+            print(f"[!] Azure TTS ({endpoint.name}) respondió {response.status_code}; se prueba otro endpoint")
+            response.close()
+            continue
+        return response, elapsed
+
+def attempt_endpoint(endpoint, output_format, ssml, stream):
+    """Un intento contra un endpoint, registrado en el pool; devuelve (respuesta, segundos)"""
+    start = time.perf_counter()
+    try:
+        response = post_synthesis(endpoint, output_format, ssml, stream)
+    except requests.RequestException:
+        record_upstream(None, time.perf_counter() - start, endpoint)
+        raise
+    elapsed = time.perf_counter() - start
+    record_upstream(response.status_code, elapsed, endpoint, response.headers.get("Retry-After"))
+    if hedging is not None and response.status_code not in UPSTREAM_FAILURE_CODES:
+        hedging.observe(response.elapsed.total_seconds())
+    return response, elapsed
+
+def hedged_attempt(endpoint, backup, delay, output_format, ssml, stream):
+    """Intento contra endpoint con cobertura en backup si no responde en `delay` segundos
+
+    Devuelve (respuesta, segundos, endpoint que respondió, si se lanzó la cobertura).
+    """
+    primary = hedge_executor.submit(attempt_endpoint, endpoint, output_format, ssml, stream)
+    try:
+        return (*primary.result(timeout=delay), endpoint, False)
+    except FutureTimeout:
+        pass
+    if not hedging.try_hedge():
+        return (*primary.result(), endpoint, False)
+
+    print(f"[DEBUG] Azure TTS ({endpoint.name}) sin respuesta en {delay * 1000:.0f} ms; cobertura en {backup.name}")
+    hedge = hedge_executor.submit(attempt_endpoint, backup, output_format, ssml, stream)
+    attempts = {primary: endpoint, hedge: backup}
+    fallback = error = None
+    for future in as_completed(attempts):
+        try:
+            response, elapsed = future.result()
+        except requests.RequestException as e:
+            error = e
+            continue
+        if response.status_code not in UPSTREAM_FAILURE_CODES:
+            # La otra petición sigue en curso: su respuesta se cierra al llegar
+            for other in attempts:
+                if other is not future:
+                    other.add_done_callback(close_attempt)
+            hedging.record(future is hedge)
+            return response, elapsed, attempts[future], True
+        if fallback is not None:
+            fallback[0].close()
+        fallback = (response, elapsed, attempts[future])
+
+    hedging.record(False)
+    if fallback is not None:
+        return (*fallback, True)
+    raise error
+
+def close_attempt(future):
+    """Cierra la respuesta de un intento que ya no se usa"""
+    if future.exception() is None:
+        future.result()[0].close()
+
+def post_synthesis(endpoint, output_format, ssml, stream=False):
+    """POST de síntesis a un endpoint; si Azure rechaza el token se repite con la clave"""
+    url = f"{endpoint.base_url}/cognitiveservices/v1"
+    headers = azure_tts_headers(endpoint, output_format)
+    response = azure_client.post(url, headers=headers, data=ssml, stream=stream)
+    if response.status_code == 401 and "Authorization" in headers:
+        response.close()
+        auth_tokens.invalidate(endpoint)
+        response = azure_client.post(url, headers=azure_tts_headers(endpoint, output_format), data=ssml, stream=stream)
+    return response
+
+def record_upstream(status_code, latency, endpoint, retry_after=None):
+    """Registra un intento de síntesis en Azure (status_code None si no hubo respuesta)"""
+    # Las síntesis reales alimentan el enrutado, el estado de salud y las métricas
+    azure_endpoints.record(endpoint, status_code, latency, retry_after)
+    health_monitor.record(status_code is not None and status_code not in UPSTREAM_FAILURE_CODES, latency)
+    metrics.observe_upstream(status_code, latency, endpoint.name)
+
+# Prioridad por defecto de cada endpoint (la cabecera X-Priority la sustituye)
+ENDPOINT_PRIORITIES = {"/synthesize": "interactive", "/synthesize_json": "normal", "/synthesize_batch": "bulk"}
+
+def admission_ticket(path, headers):
+    """(prioridad, plazo) de una petición a partir de su endpoint y de X-Priority / X-Request-Deadline-Ms
+
+    El plazo es absoluto (time.monotonic()); sin cabecera es None y cada
+    síntesis espera en cola como mucho ADMISSION_MAX_WAIT_MS.
+    """
+    default_priority = ENDPOINT_PRIORITIES.get(path, "normal")
+    priority = PRIORITIES.get(headers.get("X-Priority", default_priority).lower(), PRIORITIES[default_priority])
+    try:
+        budget_ms = float(headers["X-Request-Deadline-Ms"])
+    except (KeyError, ValueError):
+        return priority, None
+    return priority, time.monotonic() + max(0.0, budget_ms) / 1000
+
+def acquire_upstream_slot():
+    """Espera un hueco para llamar a Azure; devuelve el token (None sin control de admisión)"""
+    if admission is None:
+        return None
+    with timed("queue"):
+        return admission.acquire()
+
+def release_upstream_slot(token):
+    if token is not None:
+        admission.release(token)
+
+def synthesize_with_azure_tts(text, language="es-ES", voice="Abril", speed=1.0, output_format=DEFAULT_FORMAT):
+    """Sintetiza audio usando Azure TTS y devuelve los bytes tal cual (formato nativo de Azure)"""
+    try:
+        print(f"[DEBUG] Sintetizando con Azure TTS: lang={language}, voice={voice}, speed={speed}")
         
-        print(f"[DEBUG] Audio generado: {len(audio_data)} muestras a {sample_rate}Hz")
+        azure_format = FORMATS[output_format]["azure"]
+        slot = acquire_upstream_slot()
+        try:
+            response = request_azure_tts(text, language, voice, speed, azure_format)
+            audio_bytes = response.content
+        finally:
+            release_upstream_slot(slot)
+        print(f"[DEBUG] Audio generado: {len(audio_bytes)} bytes ({azure_format})")
         
-        return audio_data, sample_rate
+        return audio_bytes
         
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"[!] Error en Azure TTS: {e}")
         raise e
 
-@app.route("/health", methods=["GET"])
-def health():
-    """Endpoint de salud"""
+def stream_with_azure_tts(text, language="es-ES", voice="Abril", speed=1.0, output_format=DEFAULT_FORMAT):
+    """Sintetiza en streaming: devuelve un generador de chunks según llegan de Azure"""
     try:
-        # Verificar conectividad con Azure TTS
-        test_url = f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/voices/list"
-        headers = {"Ocp-Apim-Subscription-Key": AZURE_TTS_KEY}
-        response = requests.get(test_url, headers=headers, timeout=5)
-        azure_available = response.status_code == 200
-    except:
-        azure_available = False
+        print(f"[DEBUG] Sintetizando en streaming con Azure TTS: lang={language}, voice={voice}, speed={speed}")
+
+        # Se abre la respuesta antes de devolver el generador para que los
+        # errores de Azure lleguen al cliente como un 500 normal. El hueco
+        # contra Azure se ocupa hasta terminar de reenviar el audio
+        slot = acquire_upstream_slot()
+        try:
+            response = request_azure_tts(text, language, voice, speed, FORMATS[output_format]["stream"], stream=True)
+        except Exception:
+            release_upstream_slot(slot)
+            raise
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"[!] Error en Azure TTS (streaming): {e}")
+        raise e
+
+    def generate():
+        try:
+            # En los formatos WAV se pide el flujo raw y se antepone una cabecera propia
+            prefix = stream_prefix(output_format)
+            if prefix:
+                yield prefix
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+            release_upstream_slot(slot)
+
+    return generate()
+
+def synthesis_cache_key(text, language, voice, speed, output_format=DEFAULT_FORMAT):
+    """Clave de caché de una síntesis"""
+    return make_cache_key(text, language, voice, clamp_speed(speed), output_format)
+
+def is_audio_cached(text, language, voice, speed, output_format=DEFAULT_FORMAT):
+    """Indica si la síntesis ya está en la caché"""
+    if audio_cache is None:
+        return False
+    return audio_cache.contains(synthesis_cache_key(text, language, voice, speed, native_format(output_format)))
+
+def get_cached_audio(text, language, voice, speed, output_format=DEFAULT_FORMAT):
+    """Devuelve (audio_bytes, metadata, cache_status) de un formato nativo consultando primero la caché"""
+    cache_key = synthesis_cache_key(text, language, voice, speed, output_format)
+
+    if audio_cache is not None:
+        cached = audio_cache.get(cache_key)
+        if cached is not None:
+            audio_bytes, metadata, tier = cached
+            print(f"[DEBUG] Caché HIT ({tier}): {cache_key[:12]}")
+            return audio_bytes, metadata, f"HIT-{tier}"
+
+    if coalescer is None:
+        audio_bytes = synthesize_with_azure_tts(text, language, voice, speed, output_format)
+        metadata = store_synthesized_audio(cache_key, audio_bytes, output_format)
+        return audio_bytes, metadata, "MISS"
+
+    def fetch():
+        if worker_locks is None:
+            return fetch_once(cache_key, text, language, voice, speed, output_format)
+        # Con plazo (X-Request-Deadline-Ms) no se espera al otro worker más allá de él
+        with worker_locks.hold(cache_key, admission_context.get()[1]):
+            return fetch_once(cache_key, text, language, voice, speed, output_format)
+
+    (audio_bytes, metadata, cache_status), shared = coalescer.do(cache_key, fetch)
+    if shared:
+        print(f"[DEBUG] Síntesis coalescida: {cache_key[:12]}")
+        return audio_bytes, metadata, "COALESCED"
+    return audio_bytes, metadata, cache_status
+
+def fetch_once(cache_key, text, language, voice, speed, output_format):
+    """Llama a Azure salvo que otra petición (u otro worker) acabe de dejar el audio en caché"""
+    if audio_cache is not None and audio_cache.contains(cache_key):
+        cached = audio_cache.get(cache_key)
+        if cached is not None:
+            audio_bytes, metadata, tier = cached
+            cross_worker = tier == "disk" and worker_locks is not None
+            coalescer.record("cross_worker_coalesced" if cross_worker else "coalesced")
+            return audio_bytes, metadata, "COALESCED"
+
+    coalescer.record("upstream_calls")
+    audio_bytes = synthesize_with_azure_tts(text, language, voice, speed, output_format)
+    metadata = store_synthesized_audio(cache_key, audio_bytes, output_format)
+    return audio_bytes, metadata, "MISS"
+
+def store_synthesized_audio(cache_key, audio_bytes, output_format=DEFAULT_FORMAT):
+    """Calcula los metadatos del audio recibido de Azure y lo guarda en la caché"""
+    # Solo se leen cabeceras: el audio no se decodifica
+    with timed("decode"):
+        metadata = audio_metadata(output_format, audio_bytes)
+
+    if audio_cache is not None:
+        audio_cache.put(cache_key, audio_bytes, metadata)
+
+    return metadata
+
+# Clave del entorno WSGI con los tiempos de síntesis asíncrona de los segmentos
+PREFETCH_ENVIRON_KEY = "azure_tts.prefetch"
+# Clave del entorno WSGI que marca las peticiones delegadas por async_app.py
+ASYNC_ENVIRON_KEY = "azure_tts.async"
+
+def synthesis_segments(text, split_sentences=None, output_format=DEFAULT_FORMAT):
+    """Textos que se sintetizan por separado para una petición (uno si no se segmenta)"""
+    # Solo los formatos de muestras se pueden unir sin decodificar
+    if not is_joinable(native_format(output_format)):
+        return [text]
+    if split_sentences is None:
+        split_sentences = len(text) > LONG_TEXT_THRESHOLD
+    if not split_sentences:
+        return [text]
+
+    segments = split_text(text, LONG_TEXT_MAX_SEGMENT)
+    return segments if len(segments) > 1 else [text]
+
+def get_long_text_audio(segments, language, voice, speed, silence_ms, output_format=DEFAULT_FORMAT):
+    """Sintetiza los segmentos de un texto largo en paralelo y los une en orden"""
+    def synthesize_segment(segment):
+        start = time.perf_counter()
+        result = get_cached_audio(segment, language, voice, speed, output_format)
+        metrics.observe_cache(result[2])
+        return result, time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    results = list(segment_executor.map(bind_context(synthesize_segment), segments))
+    parallel_time = time.perf_counter() - wall_start
+    add_server_timing("segments", parallel_time)
+    serial_time = sum(elapsed for _, elapsed in results)
+    all_cached = all(status.startswith("HIT") for (_, _, status), _ in results)
+
+    # En modo asíncrono (async_app.py) los segmentos se sintetizan antes de
+    # llegar a Flask y los tiempos reales se reciben en el entorno WSGI
+    prefetch = request.environ.get(PREFETCH_ENVIRON_KEY) if has_request_context() else None
+    if prefetch:
+        serial_time, parallel_time = prefetch["serial_time"], prefetch["parallel_time"]
+        all_cached = False
+
+    # Unir las muestras de cada segmento con silencio entre frases
+    with timed("join"):
+        audio_bytes, duration = join_segments(output_format, [audio for (audio, _, _), _ in results], silence_ms)
+    metadata = {
+        "sample_rate": FORMATS[output_format]["sample_rate"],
+        "duration": duration,
+        "segments": len(segments),
+        "parallel_speedup": round(serial_time / parallel_time, 2) if parallel_time else 1.0,
+    }
+
+    print(f"[DEBUG] Texto largo: {len(segments)} segmentos, "
+          f"{parallel_time * 1000:.0f} ms (speedup {metadata['parallel_speedup']}x)")
+    return audio_bytes, metadata, "HIT" if all_cached else "MISS"
+
+def locate_stored_audio(params):
+    """Ruta y metadatos del audio en el almacén en disco, si la petición se sirve tal cual desde él"""
+    output_format = params["output_format"]
+    if audio_cache is None or "source" in FORMATS[output_format] or params["postprocess"]:
+        return None
+    if len(synthesis_segments(params["text"], params["split_sentences"], output_format)) > 1:
+        return None
+    cache_key = synthesis_cache_key(params["text"], params["language"], params["voice"], params["speed"],
+                                    output_format)
+    return audio_cache.locate(cache_key)
+
+def get_synthesized_audio(text, language, voice, speed, split_sentences=None, silence_ms=None,
+                          output_format=DEFAULT_FORMAT, postprocess=None):
+    """Obtiene el audio completo, segmentando los textos largos si procede
+
+    La caché guarda siempre el audio de Azure: el post-procesado se aplica
+    después, solo si la petición lo pide.
+    """
+    source = FORMATS[output_format].get("source")
+    if source:
+        # Formato que Azure no ofrece: se codifica a partir del nativo (que sí se cachea)
+        audio_bytes, metadata, cache_status = get_synthesized_audio(
+            text, language, voice, speed, split_sentences, silence_ms, source, postprocess)
+        with timed("encode"):
+            encoded = encode_local(output_format, audio_bytes)
+        return encoded, {**metadata, "sample_rate": FORMATS[output_format]["sample_rate"]}, cache_status
+
+    segments = synthesis_segments(text, split_sentences, output_format)
+    if len(segments) > 1:
+        if silence_ms is None:
+            silence_ms = SENTENCE_SILENCE_MS
+        audio_bytes, metadata, cache_status = get_long_text_audio(segments, language, voice, speed, silence_ms,
+                                                                  output_format)
+    else:
+        audio_bytes, metadata, cache_status = get_cached_audio(text, language, voice, speed, output_format)
+        metrics.observe_cache(cache_status)
+
+    if postprocess:
+        with timed("postprocess"):
+            audio_bytes, duration = process_audio(output_format, audio_bytes, postprocess)
+        metadata = {**metadata, "duration": duration}
+    return audio_bytes, metadata, cache_status
+
+def parse_bool(value):
+    """Interpreta flags booleanos enviados como JSON o como query string"""
+    if isinstance(value, str):
+        return value.lower() in ("true", "1", "yes")
+    return bool(value)
+
+def parse_synthesis_request(data):
+    """Valida el cuerpo de una petición de síntesis y resuelve sus parámetros
+
+    Lanza ValueError si falta el texto o algún campo no es válido.
+    """
+    if not data or "text" not in data:
+        raise ValueError("No text provided")
+    for key in ("text", "language", "voice", "gender_preference", "output_format"):
+        if data.get(key) is not None and not isinstance(data[key], str):
+            raise ValueError(f"{key} must be a string")
+
+    text = data.get("text", "").strip()
+    if not text:
+        raise ValueError("Empty text")
+
+    # Obtener parámetros
+    language = data.get("language", DEFAULT_LANGUAGE)
+    requested_voice = data.get("voice")
+    speed = float(data.get("speed", 1.0))
+    gender_preference = data.get("gender_preference")
     
+    # Normalizar idioma
+    language = voice_catalog.normalize_language(language)
+    
+    # Seleccionar voz óptima
+    with timed("voice"):
+        voice = get_optimal_voice_for_language(language, requested_voice, gender_preference)
+
+    output_format = data.get("output_format") or DEFAULT_OUTPUT_FORMAT
+    if output_format not in FORMATS:
+        raise ValueError(f"Unsupported output_format '{output_format}' (supported: {', '.join(FORMATS)})")
+
+    split_sentences, silence_ms = parse_long_text_options(data)
+    postprocess = parse_postprocess_options(data.get("postprocess"))
+    if postprocess and not supports_processing(output_format):
+        raise ValueError(f"postprocess is not available for output_format '{output_format}' "
+                         f"(use a WAV, raw or FLAC format)")
+    return {
+        "text": text,
+        "language": language,
+        "voice": voice,
+        "speed": speed,
+        "split_sentences": split_sentences,
+        "silence_ms": silence_ms,
+        "output_format": output_format,
+        "postprocess": postprocess,
+    }
+
+def synthesize_params(params):
+    """Obtiene el audio para unos parámetros ya resueltos por parse_synthesis_request"""
+    return get_synthesized_audio(
+        params["text"], params["language"], params["voice"], params["speed"],
+        params["split_sentences"], params["silence_ms"], params["output_format"], params["postprocess"])
+
+def build_synthesis_result(params, audio_bytes, metadata, include_audio=True):
+    """Construye el diccionario de respuesta de /synthesize_json"""
+    result = {
+        "success": True,
+        "text": params["text"],
+        "language": params["language"],
+        "voice": params["voice"],
+        "audio_duration": metadata["duration"],
+        "sample_rate": metadata["sample_rate"],
+        "model": "azure-tts",
+        "speed": params["speed"],
+        "region": azure_endpoints.preferred().region,
+        "audio_format": params["output_format"],
+        "audio_size_bytes": len(audio_bytes)
+    }
+
+    if include_audio:
+        # Audio en Base64
+        with timed("base64"):
+            result["audio_data"] = base64.b64encode(audio_bytes).decode('utf-8')
+
+    if "segments" in metadata:
+        result["segments"] = metadata["segments"]
+        result["parallel_speedup"] = metadata["parallel_speedup"]
+
+    return result
+
+def parse_long_text_options(data):
+    """Lee las opciones del modo de textos largos: (split_sentences, silence_ms)"""
+    split_sentences = data.get("split_sentences")
+    if split_sentences is not None:
+        split_sentences = parse_bool(split_sentences)
+    silence_ms = data.get("sentence_silence_ms")
+    if silence_ms is not None:
+        silence_ms = max(0, int(silence_ms))
+    return split_sentences, silence_ms
+
+# Modos de respuesta de /synthesize_json según la cabecera Accept
+RESPONSE_MODES = {
+    "application/json": "json",
+    "multipart/mixed": "multipart",
+    **{fmt["mimetype"]: "binary" for fmt in FORMATS.values()},
+}
+
+def negotiate_response_mode():
+    """Elige el modo de respuesta por ?response_mode= o por la cabecera Accept"""
+    requested = request.args.get("response_mode")
+    if requested in RESPONSE_MODES.values():
+        return requested
+
+    best = request.accept_mimetypes.best_match(list(RESPONSE_MODES), default="application/json")
+    return RESPONSE_MODES[best]
+
+def multipart_part(boundary, content_type, body, headers=None):
+    """Genera las piezas de una parte multipart sin copiar el cuerpo"""
+    lines = [f"--{boundary}", f"Content-Type: {content_type}", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    yield ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+    yield body
+    yield b"\r\n"
+
+def add_cache_headers(response, cache_status):
+    """Añade las cabeceras de estado de caché a la respuesta"""
+    hit, _, tier = cache_status.partition("-")
+    response.headers["X-Cache"] = hit
+    if tier:
+        response.headers["X-Cache-Tier"] = tier
+    return response
+
+def add_server_timing(name, seconds):
+    """Acumula la duración de una etapa en la cabecera Server-Timing de la petición en curso"""
+    # Los hilos auxiliares (segmentos, lotes) no tienen contexto de petición
+    if has_request_context() and "server_timing" in g:
+        g.server_timing[name] = g.server_timing.get(name, 0.0) + seconds
+
+@contextmanager
+def timed(stage):
+    """Mide una etapa interna: histograma de /metrics y Server-Timing de la petición"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe_stage(stage, elapsed)
+        add_server_timing(stage, elapsed)
+
+def count_audio_out(endpoint, output_format, chunks):
+    """Reenvía los chunks de un flujo contando los bytes de audio enviados"""
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        metrics.observe_audio_out(endpoint, output_format, sent)
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.server_timing = {}
+    g.metrics_endpoint = request.endpoint or "unknown"
+    metrics.IN_FLIGHT.labels(g.metrics_endpoint).inc()
+    g.profile = slow_profiler.begin() if slow_profiler is not None else None
+    # Prioridad y plazo de las síntesis contra Azure de esta petición
+    admission_context.set(admission_ticket(request.path, request.headers))
+
+@app.after_request
+def record_request_metrics(response):
+    # Los endpoints de síntesis dejan la voz y el idioma resueltos en g
+    endpoint = g.metrics_endpoint
+    elapsed = time.perf_counter() - g.request_start
+    language, voice = voice_catalog.metric_labels(g.get("language", ""), g.get("voice", ""))
+    metrics.REQUESTS.labels(endpoint, voice, language, str(response.status_code)).inc()
+    metrics.REQUEST_LATENCY.labels(endpoint).observe(elapsed)
+
+    # En modo asíncrono la síntesis se hizo antes de llegar a Flask
+    prefetch = request.environ.get(PREFETCH_ENVIRON_KEY)
+    if prefetch:
+        add_server_timing("azure_async", prefetch["parallel_time"])
+    timings = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in g.server_timing.items()]
+    timings.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+
+    # En modo asíncrono el cuerpo se genera en otros hilos del pool, y este
+    # pasa a atender otras peticiones: se deja de muestrear aquí
+    if g.profile is not None and request.environ.get(ASYNC_ENVIRON_KEY):
+        slow_profiler.detach(g.profile)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # En streaming se ejecuta al terminar de enviar el cuerpo
+    if "metrics_endpoint" in g:
+        metrics.IN_FLIGHT.labels(g.metrics_endpoint).dec()
+        if g.profile is not None:
+            slow_profiler.end(g.profile, g.metrics_endpoint)
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """Síntesis rechazada por el control de admisión: 503 inmediato con Retry-After"""
+    print(f"[!] Petición rechazada ({e.reason}): {request.path}")
+    body = {"error": str(e), "reason": e.reason}
+    if request.path == "/synthesize_json":
+        body = {"success": False, **body}
+    response = jsonify(body)
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Métricas en formato Prometheus (agregadas de todos los workers)"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Endpoint de salud (estado cacheado, sin llamar a Azure)"""
+    state = health_monitor.snapshot()
     return jsonify({
-        'status': 'ok' if azure_available else 'degraded',
+        'status': state['status'],
         'model': 'azure-tts',
-        'region': AZURE_TTS_REGION,
-        'azure_available': azure_available,
+        'region': azure_endpoints.preferred().region,
+        'azure_available': state['azure_available'],
         'default_language': DEFAULT_LANGUAGE,
-        'default_voice': DEFAULT_VOICE
+        'default_voice': DEFAULT_VOICE,
+        'source': state['source'],
+        'last_check_age_seconds': state['last_check_age_seconds'],
+        'upstream_latency_ms': state['upstream_latency_ms'],
+        'probe': state['probe'],
+        'recent_syntheses': state['recent_syntheses'],
+        'circuit': circuit_breaker.state if circuit_breaker is not None else None,
+        'endpoints': azure_endpoints.stats()
     })
 
 @app.route("/voices", methods=["GET"])
 def get_voices():
     """Obtener voces disponibles"""
     language = request.args.get('language', 'all')
-    
+    voice_catalog.ensure_started()
+    index = voice_catalog.index
+
+    # Las respuestas se serializan una vez por versión del catálogo
     if language == "all":
-        return jsonify({
-            "voices_by_language": AVAILABLE_VOICES,
-            "language_map": LANGUAGE_MAP,
-            "default_language": DEFAULT_LANGUAGE,
-            "default_voice": DEFAULT_VOICE,
-            "total_voices": sum(len(lang_data['female']) + len(lang_data['male']) 
-                              for lang_data in AVAILABLE_VOICES.values()),
-            "model": "azure-tts"
-        })
-    else:
-        # Normalizar idioma
-        normalized_lang = LANGUAGE_MAP.get(language.lower(), language)
-        voices_data = AVAILABLE_VOICES.get(normalized_lang, {})
-        
-        return jsonify({
-            "language": normalized_lang,
-            "voices": voices_data,
-            "total": len(voices_data.get('female', [])) + len(voices_data.get('male', [])),
-            "model": "azure-tts"
-        })
+        return Response(index.all_response, mimetype="application/json")
+
+    normalized_lang = index.language_map.get(language.lower(), language)
+    body = index.locale_responses.get(normalized_lang)
+    if body is None:
+        return jsonify({"language": normalized_lang, "voices": {}, "total": 0, "model": "azure-tts"})
+    return Response(body, mimetype="application/json")
 
 @app.route("/synthesize", methods=["POST"])
 def synthesize():
-    """Endpoint principal de síntesis - devuelve archivo WAV"""
+    """Endpoint principal de síntesis - devuelve el archivo de audio (WAV por defecto)"""
     try:
         data = request.get_json()
         
-        if not data or "text" not in data:
-            return jsonify({"error": "No text provided"}), 400
-
-        text = data.get("text", "").strip()
-        if not text:
-            return jsonify({"error": "Empty text"}), 400
-
-        # Obtener parámetros
-        language = data.get("language", DEFAULT_LANGUAGE)
-        requested_voice = data.get("voice")
-        speed = float(data.get("speed", 1.0))
-        gender_preference = data.get("gender_preference")
-        
-        # Normalizar idioma
-        language = LANGUAGE_MAP.get(language.lower(), language)
+        try:
+            with timed("parse"):
+                params = parse_synthesis_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        text, language, voice, speed = params["text"], params["language"], params["voice"], params["speed"]
+        output_format = params["output_format"]
+        fmt = FORMATS[output_format]
+        g.voice, g.language = voice, language
         
-        # Seleccionar voz óptima
-        voice = get_optimal_voice_for_language(language, requested_voice, gender_preference)
+        stream = parse_bool(data.get("stream", request.args.get("stream", False)))
         
-        print(f"[*] Sintetizando (Azure TTS): '{text[:50]}...' [Lang: {language}, Voz: {voice}, Speed: {speed}]")
+        print(f"[*] Sintetizando (Azure TTS): '{text[:50]}...' [Lang: {language}, Voz: {voice}, Speed: {speed}, "
+              f"Formato: {output_format}, Stream: {stream}]")
 
-        # Síntesis con Azure TTS
-        audio_data, sample_rate = synthesize_with_azure_tts(text, language, voice, speed)
-        
-        # Crear archivo temporal WAV
-        temp_path = tempfile.mktemp(suffix=".wav")
-        sf.write(temp_path, audio_data, sample_rate)
-
-        # Guardar audio para debug si está activado
-        if DEBUG_AUDIO:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-            debug_filename = f"azure_{voice}_{timestamp}.wav"
-            debug_path = os.path.join(DEBUG_DIR, debug_filename)
-            shutil.copy2(temp_path, debug_path)
-            print(f"[DEBUG] Audio guardado: {debug_filename}")
-
-        # Enviar el archivo de audio
-        return send_file(temp_path, 
-                        mimetype="audio/wav", 
+        download_name = f"azure_{voice}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt['extension']}"
+
+        # Modo streaming: se reenvían los chunks de Azure sin mantener el clip
+        # completo en memoria (las entradas ya cacheadas, los formatos que se
+        # codifican localmente y el audio post-procesado se sirven completos)
+        if (stream and "stream" in fmt and not params["postprocess"]
+                and not is_audio_cached(text, language, voice, speed, output_format)):
+            chunks = count_audio_out("synthesize", output_format,
+                                     stream_with_azure_tts(text, language, voice, speed, output_format))
+            response = Response(stream_with_context(chunks), mimetype=fmt["mimetype"])
+            response.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+            metrics.observe_cache("MISS")
+            return add_cache_headers(response, "MISS")
+
+        # Audio en el almacén en disco: se envía por ruta (sendfile) sin
+        # leerlo en la memoria del worker
+        stored = locate_stored_audio(params)
+        if stored is not None:
+            audio_path, metadata = stored
+            print(f"[DEBUG] Sirviendo desde el almacén en disco: {os.path.basename(audio_path)}")
+            if debug_writer is not None:
+                with timed("debug_write"):
+                    debug_writer.submit(voice, source_path=audio_path, extension=fmt["extension"])
+            response = send_file(audio_path, mimetype=fmt["mimetype"], as_attachment=True,
+                                 download_name=download_name, conditional=False, etag=False)
+            metrics.observe_audio_out("synthesize", output_format, response.content_length or 0)
+            metrics.observe_cache("HIT-disk")
+            return add_cache_headers(response, "HIT-disk")
+
+        # Síntesis con Azure TTS (o audio en caché)
+        audio_bytes, metadata, cache_status = synthesize_params(params)
+
+        # Encolar el audio para debug si está activado (el mismo buffer que se envía)
+        if debug_writer is not None:
+            with timed("debug_write"):
+                debug_writer.submit(voice, audio_bytes, extension=fmt["extension"])
+        metrics.observe_audio_out("synthesize", output_format, len(audio_bytes))
+
+        # Enviar el audio desde memoria
+        response = send_file(io.BytesIO(audio_bytes),
+                        mimetype=fmt["mimetype"], 
                         as_attachment=True,
-                        download_name=f"azure_{voice}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
+                        download_name=download_name)
+        if "segments" in metadata:
+            response.headers["X-Segments"] = str(metadata["segments"])
+            response.headers["X-Parallel-Speedup"] = str(metadata["parallel_speedup"])
+        return add_cache_headers(response, cache_status)
 
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"[!] Error en síntesis: {e}")
         return jsonify({"error": str(e)}), 500
@@ -266,75 +1152,60 @@ def synthesize_json():
     try:
         data = request.get_json()
         
-        if not data or "text" not in data:
-            return jsonify({"error": "No text provided"}), 400
-
-        text = data.get("text", "").strip()
-        if not text:
-            return jsonify({"error": "Empty text"}), 400
-
-        # Obtener parámetros
-        language = data.get("language", DEFAULT_LANGUAGE)
-        requested_voice = data.get("voice")
-        speed = float(data.get("speed", 1.0))
-        gender_preference = data.get("gender_preference")
-        
-        # Normalizar idioma
-        language = LANGUAGE_MAP.get(language.lower(), language)
-        
-        # Seleccionar voz óptima
-        voice = get_optimal_voice_for_language(language, requested_voice, gender_preference)
+        try:
+            with timed("parse"):
+                params = parse_synthesis_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        text, language, voice = params["text"], params["language"], params["voice"]
+        fmt = FORMATS[params["output_format"]]
+        g.voice, g.language = voice, language
         
         print(f"[*] Sintetizando JSON (Azure TTS): '{text[:50]}...' [Lang: {language}, Voice: {voice}]")
 
-        # Síntesis con Azure TTS
-        audio_data, sample_rate = synthesize_with_azure_tts(text, language, voice, speed)
-        
-        # Calcular duración
-        duration = len(audio_data) / sample_rate
+        # Síntesis con Azure TTS (o audio en caché)
+        audio_bytes, metadata, cache_status = synthesize_params(params)
 
-        # Guardar audio para debug si está activado
+        # Encolar el audio para debug si está activado (el mismo buffer que se envía)
         debug_filename = None
-        if DEBUG_AUDIO:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-            debug_filename = f"azure_{voice}_{timestamp}.wav"
-            debug_path = os.path.join(DEBUG_DIR, debug_filename)
-            sf.write(debug_path, audio_data, sample_rate)
-            print(f"[DEBUG] Audio guardado: {debug_filename}")
-
-        # Convertir audio a Base64 para incluir en la respuesta JSON
-        import base64
-        import io
-        
-        # Guardar audio en buffer de memoria
-        audio_buffer = io.BytesIO()
-        sf.write(audio_buffer, audio_data, sample_rate, format='WAV')
-        audio_buffer.seek(0)
-        
-        # Convertir a Base64
-        audio_base64 = base64.b64encode(audio_buffer.getvalue()).decode('utf-8')
-        
-        response_data = {
-            "success": True,
-            "text": text,
-            "language": language,
-            "voice": voice,
-            "audio_duration": duration,
-            "sample_rate": sample_rate,
-            "model": "azure-tts",
-            "speed": speed,
-            "region": AZURE_TTS_REGION,
-            "audio_data": audio_base64,  # Audio en Base64
-            "audio_format": "wav",
-            "audio_size_bytes": len(audio_buffer.getvalue())
-        }
+        if debug_writer is not None:
+            with timed("debug_write"):
+                debug_filename = debug_writer.submit(voice, audio_bytes, extension=fmt["extension"])
+        metrics.observe_audio_out("synthesize_json", params["output_format"], len(audio_bytes))
+
+        # Modo de respuesta negociado: JSON con Base64 (por defecto),
+        # multipart (metadatos JSON + audio binario) o audio binario con
+        # los metadatos en cabeceras
+        response_mode = negotiate_response_mode()
+        response_data = build_synthesis_result(params, audio_bytes, metadata,
+                                               include_audio=(response_mode == "json"))
         
-        if DEBUG_AUDIO and debug_filename:
+        if debug_filename:
             response_data["debug_audio_file"] = debug_filename
             response_data["debug_audio_url"] = f"/debug/audio/{debug_filename}"
 
-        return jsonify(response_data)
+        if response_mode == "multipart":
+            boundary = uuid.uuid4().hex
+            metadata_json = json.dumps(response_data, ensure_ascii=False).encode("utf-8")
+            parts = [
+                *multipart_part(boundary, "application/json", metadata_json, {"Content-ID": "<metadata>"}),
+                *multipart_part(boundary, fmt["mimetype"], audio_bytes, {"Content-ID": "<audio>"}),
+                f"--{boundary}--\r\n".encode("utf-8"),
+            ]
+            response = Response(parts, mimetype=f"multipart/mixed; boundary={boundary}")
+        elif response_mode == "binary":
+            response = Response(audio_bytes, mimetype=fmt["mimetype"])
+            # El texto se omite de las cabeceras: puede ser largo y no ASCII
+            header_metadata = {k: v for k, v in response_data.items() if k != "text"}
+            response.headers["X-Synthesis-Metadata"] = json.dumps(header_metadata)
+        else:
+            response = jsonify(response_data)
 
+        return add_cache_headers(response, cache_status)
+
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"[!] Error en síntesis JSON: {e}")
         return jsonify({
@@ -342,6 +1213,147 @@ def synthesize_json():
             "error": str(e)
         }), 500
 
+@app.route("/synthesize_batch", methods=["POST"])
+def synthesize_batch():
+    """Síntesis por lotes: devuelve cada resultado en NDJSON o multipart según termina"""
+    data = request.get_json(silent=True)
+    items = data.get("items") if isinstance(data, dict) else None
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "No items provided"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items (max {BATCH_MAX_ITEMS})"}), 400
+
+    output = data.get("format", "ndjson")
+    if output not in ("ndjson", "multipart"):
+        return jsonify({"error": "Unsupported format (use 'ndjson' or 'multipart')"}), 400
+
+    try:
+        concurrency = int(data.get("concurrency", BATCH_MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid concurrency"}), 400
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+    # Validar y deduplicar: los elementos idénticos comparten una única síntesis
+    unique = {}
+    invalid = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Item must be an object")
+            params = parse_synthesis_request(item)
+        except (ValueError, TypeError) as e:
+            invalid.append((index, str(e)))
+            continue
+
+        key = (synthesis_cache_key(params["text"], params["language"], params["voice"], params["speed"],
+                                   params["output_format"]),
+               params["split_sentences"], params["silence_ms"],
+               json.dumps(params["postprocess"], sort_keys=True))
+        if key in unique:
+            unique[key][1].append(index)
+        else:
+            unique[key] = (params, [index])
+
+    print(f"[*] Lote de síntesis: {len(items)} elementos, {len(unique)} únicos, "
+          f"{len(invalid)} inválidos [Concurrencia: {concurrency}, Formato: {output}]")
+
+    boundary = uuid.uuid4().hex
+
+    def encode(result, audio_bytes=None, mimetype=None):
+        if output == "ndjson":
+            yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+            return
+
+        content_id = f"<item-{result['indices'][0]}>"
+        yield from multipart_part(boundary, "application/json",
+                                  json.dumps(result, ensure_ascii=False).encode("utf-8"),
+                                  {"Content-ID": content_id})
+        if audio_bytes is not None:
+            yield from multipart_part(boundary, mimetype, audio_bytes,
+                                      {"Content-ID": content_id.replace("item", "audio")})
+
+    def generate():
+        start = time.perf_counter()
+        failed = 0
+
+        for index, error in invalid:
+            failed += 1
+            yield from encode({"indices": [index], "success": False, "error": error})
+
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+        try:
+            synthesize_item = bind_context(synthesize_params)
+            futures = {executor.submit(synthesize_item, params): (params, indices)
+                       for params, indices in unique.values()}
+            for future in as_completed(futures):
+                params, indices = futures[future]
+                try:
+                    audio_bytes, metadata, cache_status = future.result()
+                except Exception as e:
+                    print(f"[!] Error en elemento del lote {indices}: {e}")
+                    failed += len(indices)
+                    error = {"indices": indices, "success": False, "error": str(e)}
+                    if isinstance(e, Overloaded):
+                        error["retry_after"] = e.retry_after
+                    yield from encode(error)
+                    continue
+
+                result = build_synthesis_result(params, audio_bytes, metadata,
+                                                include_audio=(output == "ndjson"))
+                result["indices"] = indices
+                result["cache"] = cache_status.partition("-")[0]
+                metrics.observe_audio_out("synthesize_batch", params["output_format"], len(audio_bytes))
+                yield from encode(result, audio_bytes if output == "multipart" else None,
+                                  FORMATS[params["output_format"]]["mimetype"])
+        finally:
+            # Si el cliente corta la conexión no se lanzan las síntesis pendientes
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        summary = {
+            "done": True,
+            "total": len(items),
+            "unique": len(unique),
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        if output == "ndjson":
+            yield (json.dumps(summary) + "\n").encode("utf-8")
+        else:
+            yield from multipart_part(boundary, "application/json", json.dumps(summary).encode("utf-8"),
+                                      {"Content-ID": "<summary>"})
+            yield f"--{boundary}--\r\n".encode("utf-8")
+
+    mimetype = "application/x-ndjson" if output == "ndjson" else f"multipart/mixed; boundary={boundary}"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Estadísticas de la caché de síntesis"""
+    coalescing = {"enabled": coalescer is not None}
+    if coalescer is not None:
+        coalescing.update(across_workers=worker_locks is not None, **coalescer.stats())
+
+    if audio_cache is None:
+        return jsonify({"enabled": False, "coalescing": coalescing})
+
+    return jsonify({"enabled": True, **audio_cache.stats(), "coalescing": coalescing})
+
+@app.route("/azure/stats", methods=["GET"])
+def azure_stats():
+    """Estadísticas del pool de conexiones hacia Azure"""
+    return jsonify({
+        "endpoints": [endpoint.base_url for endpoint in azure_endpoints.endpoints],
+        "auth": auth_tokens.stats() if auth_tokens is not None else "key",
+        "admission": admission.stats() if admission is not None else {"enabled": False},
+        "circuit": circuit_breaker.stats() if circuit_breaker is not None else {"enabled": False},
+        "hedging": hedging.stats() if hedging is not None else {"enabled": False},
+        **azure_client.connection_stats()
+    })
+
+# Tipo MIME de los ficheros de debug según su extensión
+DEBUG_MIMETYPES = {fmt["extension"]: fmt["mimetype"] for fmt in FORMATS.values()}
+
 @app.route("/debug/audio/<filename>", methods=["GET"])
 def get_debug_audio(filename):
     """Servir archivos de audio de debug"""
@@ -350,39 +1362,68 @@ def get_debug_audio(filename):
         if not os.path.exists(file_path):
             return jsonify({"error": "Debug audio file not found"}), 404
         
-        return send_file(file_path, mimetype="audio/wav")
+        return send_file(file_path, mimetype=DEBUG_MIMETYPES.get(os.path.splitext(filename)[1][1:], "audio/wav"))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/debug/audio", methods=["GET"])
 def list_debug_audio():
-    """Listar archivos de audio de debug disponibles"""
+    """Listar archivos de audio de debug (paginado, más recientes primero)"""
     try:
-        if not os.path.exists(DEBUG_DIR):
-            return jsonify({"debug_files": []})
-        
-        files = []
-        for filename in os.listdir(DEBUG_DIR):
-            if filename.endswith('.wav'):
-                file_path = os.path.join(DEBUG_DIR, filename)
-                stat = os.stat(file_path)
-                files.append({
-                    "filename": filename,
-                    "size": stat.st_size,
-                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "url": f"/debug/audio/{filename}"
-                })
-        
-        # Ordenar por fecha de creación (más reciente primero)
-        files.sort(key=lambda x: x['created'], reverse=True)
-        
+        if debug_writer is None:
+            return jsonify({"debug_files": [], "total": 0, "debug_enabled": False})
+
+        offset = max(0, request.args.get("offset", 0, type=int))
+        limit = min(500, max(1, request.args.get("limit", 50, type=int)))
+        files, total = debug_writer.page(offset, limit)
+
         return jsonify({
             "debug_files": files,
-            "total": len(files),
-            "debug_enabled": DEBUG_AUDIO
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "debug_enabled": DEBUG_AUDIO,
+            "writer": debug_writer.stats()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/debug/profiler", methods=["GET", "POST"])
+def debug_profiler():
+    """Estado del profiler de peticiones lentas; POST lo configura en todos los workers"""
+    if slow_profiler is None:
+        return jsonify({"error": "Profiler not available"}), 503
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        settings = {}
+        try:
+            if "enabled" in data:
+                settings["enabled"] = parse_bool(data["enabled"])
+            for key in ("threshold_ms", "interval_ms"):
+                if key in data:
+                    settings[key] = float(data[key])
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid profiler settings"}), 400
+        slow_profiler.configure(**settings)
+        print(f"[*] Profiler de peticiones lentas reconfigurado: {settings}")
+
+    dumps = slow_profiler.dumps()
+    return jsonify({
+        **slow_profiler.stats(),
+        "dumps": [{"filename": name, "url": f"/debug/profiler/{name}"} for name in dumps[:50]],
+        "total_dumps": len(dumps),
+    })
+
+@app.route("/debug/profiler/<filename>", methods=["GET"])
+def get_profile_dump(filename):
+    """Servir un volcado del profiler (pilas en formato collapsed)"""
+    if slow_profiler is None:
+        return jsonify({"error": "Profiler not available"}), 503
+    file_path = os.path.join(slow_profiler.directory, filename)
+    if not filename.endswith(".collapsed") or not os.path.exists(file_path):
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(file_path, mimetype="text/plain")
+
 if __name__ == "__main__":
     app.run(host=FLASK_HOST, port=FLASK_PORT) 
\ No newline at end of file
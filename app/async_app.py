@@ -0,0 +1,476 @@
+"""
+Punto de entrada asíncrono (aiohttp) del servicio.
+
+Las llamadas a Azure de /synthesize y /synthesize_json se hacen con un
+cliente HTTP asíncrono y el audio recibido se deja en la caché. El resto del
+trabajo (validación, codificación, Base64, debug) lo hace la aplicación Flask
+en un pool de hilos, de modo que todos los endpoints se mantienen sin
+duplicar lógica y un solo proceso atiende cientos de síntesis en vuelo.
+
+Uso:
+    gunicorn async_app:app --bind 0.0.0.0:5000 --worker-class aiohttp.GunicornWebWorker
+"""
+
+import asyncio
+import contextvars
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+import app as service
+import metrics
+from admission import Overloaded, admission_context
+from audio_formats import FORMATS, stream_prefix
+from azure_client import RETRY_STATUS_CODES, UPSTREAM_FAILURE_CODES
+from singleflight import AsyncSingleFlight
+
+# Hilos para el trabajo síncrono (Flask, codificación, E/S de disco)
+ASYNC_THREADS = int(os.getenv("ASYNC_THREADS", 32))
+# Conexiones simultáneas máximas hacia Azure por proceso
+ASYNC_AZURE_CONNECTIONS = int(os.getenv("ASYNC_AZURE_CONNECTIONS", 100))
+
+executor = ThreadPoolExecutor(max_workers=ASYNC_THREADS, thread_name_prefix="wsgi")
+
+
+class AsyncAzureClient:
+    """Cliente HTTP asíncrono hacia Azure con reintentos en 429/5xx"""
+
+    def __init__(self, connections, connect_timeout, read_timeout, max_retries, backoff_factor):
+        self.connections = connections
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.session = None
+        # Síntesis idénticas en vuelo dentro del bucle de eventos
+        self.coalescer = AsyncSingleFlight(service.coalescer) if service.coalescer is not None else None
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def post(self, url, headers, data):
+        """POST con reintentos; devuelve la respuesta abierta (el llamante la libera)"""
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self.session.post(url, headers=headers, data=data)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                continue
+
+            if response.status in RETRY_STATUS_CODES and not last_attempt:
+                retry_after = response.headers.get("Retry-After")
+                response.release()
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = self.backoff_factor * (2 ** attempt)
+                await asyncio.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response
+
+    async def post_synthesis(self, endpoint, output_format, ssml):
+        """POST de síntesis a un endpoint; si Azure rechaza el token se repite con la clave"""
+        url = f"{endpoint.base_url}/cognitiveservices/v1"
+        headers = service.azure_tts_headers(endpoint, output_format)
+        try:
+            return await self.post(url, headers, ssml)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 401 or "Authorization" not in headers:
+                raise
+        service.auth_tokens.invalidate(endpoint)
+        return await self.post(url, service.azure_tts_headers(endpoint, output_format), ssml)
+
+    async def synthesize(self, text, language, voice, speed, output_format, stream=False):
+        """Pide la síntesis a Azure; con stream=True devuelve la respuesta sin leer
+
+        Igual que en modo síncrono, se pasa al siguiente endpoint del pool
+        ante throttling, errores de Azure o timeouts, y con el circuito
+        abierto se lanza Overloaded sin llamar a Azure.
+        """
+        ssml = service.build_ssml(text, language, voice, speed).encode("utf-8")
+        breaker = service.circuit_breaker
+        probe = breaker.allow() if breaker is not None else False
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = await self.request_endpoints(ssml, output_format)
+            ok = True
+        except aiohttp.ClientResponseError as e:
+            ok = e.status not in UPSTREAM_FAILURE_CODES
+            raise
+        finally:
+            if breaker is not None:
+                breaker.record(ok, time.perf_counter() - start, probe)
+        if stream:
+            return response
+        async with response:
+            return await response.read()
+
+    async def request_endpoints(self, ssml, output_format):
+        """Síntesis con failover entre los endpoints del pool; devuelve la respuesta abierta"""
+        remaining = service.azure_endpoints.ordered()
+        hedge_delay = service.hedging.delay() if service.hedging is not None else None
+        while remaining:
+            endpoint = remaining.pop(0)
+            try:
+                if hedge_delay is not None:
+                    # Solo se cubre el primer intento; la cobertura va al siguiente endpoint
+                    backup = remaining[0] if remaining else endpoint
+                    response, endpoint, hedged = await self.hedged_attempt(endpoint, backup, hedge_delay,
+                                                                           output_format, ssml)
+                    if hedged and backup in remaining:
+                        remaining.remove(backup)
+                    hedge_delay = None
+                else:
+                    response = await self.attempt(endpoint, output_format, ssml)
+            except aiohttp.ClientResponseError as e:
+                if not remaining or e.status not in UPSTREAM_FAILURE_CODES:
+                    raise
+                print(f"[!] Azure TTS ({endpoint.name}) respondió {e.status}; se prueba otro endpoint")
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not remaining:
+                    raise
+                print(f"[!] Azure TTS ({endpoint.name}) sin respuesta: {e!r}; se prueba otro endpoint")
+                continue
+            return response
+
+    async def attempt(self, endpoint, output_format, ssml):
+        """Un intento contra un endpoint, registrado en el pool"""
+        start = time.perf_counter()
+        try:
+            response = await self.post_synthesis(endpoint, output_format, ssml)
+        except aiohttp.ClientResponseError as e:
+            retry_after = e.headers.get("Retry-After") if e.headers else None
+            service.record_upstream(e.status, time.perf_counter() - start, endpoint, retry_after)
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            service.record_upstream(None, time.perf_counter() - start, endpoint)
+            raise
+        elapsed = time.perf_counter() - start
+        service.record_upstream(response.status, elapsed, endpoint)
+        if service.hedging is not None:
+            service.hedging.observe(elapsed)
+        return response
+
+    async def hedged_attempt(self, endpoint, backup, delay, output_format, ssml):
+        """Intento contra endpoint con cobertura en backup si no responde en `delay` segundos
+
+        Devuelve (respuesta, endpoint que respondió, si se lanzó la cobertura).
+        """
+        hedging = service.hedging
+        primary = asyncio.ensure_future(self.attempt(endpoint, output_format, ssml))
+        attempts = {primary: endpoint}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and hedging.try_hedge():
+                print(f"[DEBUG] Azure TTS ({endpoint.name}) sin respuesta en {delay * 1000:.0f} ms; "
+                      f"cobertura en {backup.name}")
+                attempts[asyncio.ensure_future(self.attempt(backup, output_format, ssml))] = backup
+            hedged = len(attempts) > 1
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    winner = primary if primary in succeeded else succeeded[0]
+                    for task in succeeded:
+                        if task is not winner:
+                            task.result().release()
+                    if hedged:
+                        hedging.record(winner is not primary)
+                    return winner.result(), attempts[winner], hedged
+                error = next(iter(done)).exception()
+            if hedged:
+                hedging.record(False)
+            raise error
+        finally:
+            # La petición que pierde (o todas, si el cliente se fue) se cancela
+            for task in attempts:
+                task.cancel()
+
+
+async def acquire_upstream_slot():
+    """Hueco del control de admisión compartido con Flask (None si está desactivado)"""
+    if service.admission is None:
+        return None
+    start = time.perf_counter()
+    try:
+        return await service.admission.acquire_async()
+    finally:
+        metrics.observe_stage("queue", time.perf_counter() - start)
+
+
+class InMemoryFileWrapper:
+    """wsgi.file_wrapper que entrega el fichero en un solo bloque (evita saltos de hilo)"""
+
+    def __init__(self, file, buffer_size=8192):
+        self.file = file
+
+    def __iter__(self):
+        yield self.file.read()
+
+    def close(self):
+        self.file.close()
+
+
+def build_environ(request, body):
+    """Construye el entorno WSGI de una petición aiohttp"""
+    host, _, port = request.host.partition(":")
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": request.path,
+        "QUERY_STRING": request.query_string,
+        "SERVER_NAME": host,
+        "SERVER_PORT": port or ("443" if request.secure else "80"),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.file_wrapper": InMemoryFileWrapper,
+        service.ASYNC_ENVIRON_KEY: True,
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace("-", "_")
+        if key == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif key != "CONTENT_LENGTH":
+            key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def call_flask(request, body, header_overrides=None, extra_environ=None):
+    """Ejecuta la aplicación Flask en el pool de hilos y reenvía su respuesta"""
+    loop = asyncio.get_running_loop()
+    state = {}
+
+    # Todas las llamadas de una misma respuesta comparten contexto: los
+    # generadores con stream_with_context necesitan ver el contexto de Flask
+    # aunque cada paso se ejecute en un hilo distinto del pool
+    context = contextvars.copy_context()
+
+    def run(func, *args):
+        return loop.run_in_executor(executor, context.run, func, *args)
+
+    def start_response(status, headers, exc_info=None):
+        state["status"] = status
+        state["headers"] = headers
+        return lambda data: None
+
+    environ = build_environ(request, body)
+    environ.update(extra_environ or {})
+    app_iter = await run(service.app, environ, start_response)
+    try:
+        iterator = iter(app_iter)
+        chunk = await run(next, iterator, None)
+
+        status_code, _, reason = state["status"].partition(" ")
+        response = web.StreamResponse(status=int(status_code), reason=reason)
+        for name, value in state["headers"]:
+            response.headers.add(name, value)
+        for name, value in (header_overrides or {}).items():
+            if value is None:
+                response.headers.popall(name, None)
+            else:
+                response.headers[name] = value
+        await response.prepare(request)
+
+        # Los generadores (p. ej. /synthesize_batch) se reenvían según producen
+        while chunk is not None:
+            if chunk:
+                await response.write(chunk)
+            chunk = await run(next, iterator, None)
+        await response.write_eof()
+        return response
+    finally:
+        close = getattr(app_iter, "close", None)
+        if close is not None:
+            await run(close)
+
+
+async def prefetch_audio(azure, params):
+    """Sintetiza de forma asíncrona los segmentos que falten en la caché
+
+    Devuelve None si todo estaba en caché o los tiempos de la síntesis
+    (serie estimada y real en paralelo) si hubo que llamar a Azure.
+    """
+    language, voice, speed = params["language"], params["voice"], params["speed"]
+    # Los formatos locales se codifican en Flask a partir del nativo, que es el que se cachea
+    output_format = service.native_format(params["output_format"])
+    segments = service.synthesis_segments(params["text"], params["split_sentences"], output_format)
+    missing = [segment for segment in segments
+               if not service.is_audio_cached(segment, language, voice, speed, output_format)]
+    if not missing:
+        return None
+
+    semaphore = asyncio.Semaphore(service.LONG_TEXT_WORKERS)
+    loop = asyncio.get_running_loop()
+    coalescer = azure.coalescer
+
+    async def synthesize(segment, cache_key):
+        async with semaphore:
+            slot = await acquire_upstream_slot()
+            start = time.perf_counter()
+            try:
+                audio_bytes = await azure.synthesize(segment, language, voice, speed, FORMATS[output_format]["azure"])
+            finally:
+                service.release_upstream_slot(slot)
+            elapsed = time.perf_counter() - start
+        await loop.run_in_executor(executor, service.store_synthesized_audio, cache_key, audio_bytes, output_format)
+        return elapsed
+
+    async def fetch(segment):
+        cache_key = service.synthesis_cache_key(segment, language, voice, speed, output_format)
+        if coalescer is None:
+            return await synthesize(segment, cache_key)
+
+        async def leader():
+            service.coalescer.record("upstream_calls")
+            return await synthesize(segment, cache_key)
+
+        elapsed, _ = await coalescer.do(cache_key, leader)
+        return elapsed
+
+    print(f"[DEBUG] Sintetizando (async) {len(missing)} segmento(s): lang={language}, voice={voice}, speed={speed}")
+    start = time.perf_counter()
+    elapsed = await asyncio.gather(*(fetch(segment) for segment in missing))
+    return {"serial_time": sum(elapsed), "parallel_time": time.perf_counter() - start}
+
+
+async def stream_synthesis(request, azure, params):
+    """Modo streaming: reenvía los chunks de Azure según llegan"""
+    output_format = params["output_format"]
+    fmt = FORMATS[output_format]
+    # El hueco contra Azure se ocupa hasta terminar de reenviar el audio
+    slot = await acquire_upstream_slot()
+    metrics.observe_cache("MISS")
+    try:
+        upstream = await azure.synthesize(params["text"], params["language"], params["voice"],
+                                          params["speed"], fmt["stream"], stream=True)
+        async with upstream:
+            filename = f"azure_{params['voice']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt['extension']}"
+            response = web.StreamResponse(headers={
+                "Content-Type": fmt["mimetype"],
+                "Content-Disposition": f"attachment; filename={filename}",
+                "X-Cache": "MISS",
+            })
+            await response.prepare(request)
+            prefix = stream_prefix(output_format)
+            if prefix:
+                await response.write(prefix)
+            async for chunk in upstream.content.iter_chunked(service.STREAM_CHUNK_SIZE):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+    finally:
+        service.release_upstream_slot(slot)
+
+
+async def synthesis_endpoint(request):
+    """/synthesize y /synthesize_json: E/S con Azure asíncrona, resto en Flask"""
+    body = await request.read()
+    azure = request.app["azure"]
+
+    try:
+        data = json.loads(body)
+        params = service.parse_synthesis_request(data)
+    except (ValueError, TypeError, AttributeError):
+        # Petición inválida: Flask genera la respuesta de error habitual
+        return await call_flask(request, body)
+
+    # Prioridad y plazo de las síntesis contra Azure (las tareas de prefetch heredan el contexto)
+    admission_context.set(service.admission_ticket(request.path, request.headers))
+    try:
+        if request.path == "/synthesize":
+            stream = service.parse_bool(data.get("stream", request.query.get("stream", False)))
+            if (stream and "stream" in FORMATS[params["output_format"]] and not params["postprocess"]
+                    and not service.is_audio_cached(params["text"], params["language"], params["voice"],
+                                                    params["speed"], params["output_format"])):
+                return await stream_synthesis(request, azure, params)
+
+        prefetch = await prefetch_audio(azure, params) if service.audio_cache is not None else None
+    except Overloaded as e:
+        print(f"[!] Petición rechazada ({e.reason}): {request.path}")
+        error = {"error": str(e), "reason": e.reason}
+        if request.path == "/synthesize_json":
+            error = {"success": False, **error}
+        return web.json_response(error, status=503, headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        print(f"[!] Error en Azure TTS (async): {e}")
+        error = {"error": str(e)}
+        if request.path == "/synthesize_json":
+            error = {"success": False, **error}
+        return web.json_response(error, status=500)
+
+    if prefetch is None:
+        return await call_flask(request, body)
+
+    # El audio se acaba de sintetizar: el acierto de caché de Flask es interno
+    return await call_flask(request, body,
+                            header_overrides={"X-Cache": "MISS", "X-Cache-Tier": None},
+                            extra_environ={service.PREFETCH_ENVIRON_KEY: prefetch})
+
+
+async def flask_endpoint(request):
+    """Resto de endpoints: se delegan en Flask dentro del pool de hilos"""
+    return await call_flask(request, await request.read())
+
+
+async def on_startup(application):
+    azure = AsyncAzureClient(
+        connections=ASYNC_AZURE_CONNECTIONS,
+        connect_timeout=service.AZURE_CONNECT_TIMEOUT,
+        read_timeout=service.AZURE_READ_TIMEOUT,
+        # Con varios endpoints el failover sustituye a los reintentos contra el mismo
+        max_retries=service.AZURE_MAX_RETRIES if len(service.azure_endpoints) == 1 else 0,
+        backoff_factor=service.AZURE_RETRY_BACKOFF,
+    )
+    await azure.start()
+    application["azure"] = azure
+
+
+async def on_cleanup(application):
+    await application["azure"].close()
+
+
+def create_app():
+    """Crea la aplicación aiohttp"""
+    application = web.Application()
+    application.router.add_post("/synthesize", synthesis_endpoint)
+    application.router.add_post("/synthesize_json", synthesis_endpoint)
+    application.router.add_route("*", "/{tail:.*}", flask_endpoint)
+    application.on_startup.append(on_startup)
+    application.on_cleanup.append(on_cleanup)
+    return application
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    print(f"[*] Modo asíncrono (aiohttp), {ASYNC_THREADS} hilos de trabajo")
+    web.run_app(app, host=service.FLASK_HOST, port=service.FLASK_PORT)
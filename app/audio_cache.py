@@ -0,0 +1,134 @@
+"""
+Caché de audio sintetizado direccionada por contenido.
+
+Nivel en memoria (LRU con desalojo por tamaño en bytes) y nivel opcional en
+disco (AudioStore) compartido por todos los workers de gunicorn.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def make_cache_key(text, language, voice, speed, output_format):
+    """Genera la clave de caché a partir de los parámetros normalizados"""
+    normalized_text = " ".join(text.split())
+    raw = json.dumps(
+        [normalized_text, language, voice, round(float(speed), 3), output_format],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Caché LRU de audio codificado con nivel opcional en disco"""
+
+    def __init__(self, max_bytes, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self._entries = OrderedDict()  # clave -> (audio_bytes, metadata)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def get(self, key):
+        """Devuelve (audio_bytes, metadata, nivel) o None si no está en caché"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[0], entry[1], "memory"
+
+        if self.store is not None:
+            entry = self.store.read(key)
+            if entry is not None:
+                audio_bytes, metadata = entry
+                with self._lock:
+                    self._store_memory(key, audio_bytes, metadata)
+                    self._stats["disk_hits"] += 1
+                return audio_bytes, metadata, "disk"
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def contains(self, key):
+        """Comprueba si la clave está en algún nivel sin contar acierto ni fallo"""
+        with self._lock:
+            if key in self._entries:
+                return True
+        if self.store is not None:
+            return self.store.contains(key)
+        return False
+
+    def locate(self, key):
+        """Devuelve (ruta, metadata) si la entrada se puede servir desde disco
+
+        Las entradas en memoria no se localizan (se sirven desde memoria) y
+        las de disco no se copian a memoria: se envían por ruta.
+        """
+        if self.store is None:
+            return None
+        with self._lock:
+            if key in self._entries:
+                return None
+        located = self.store.locate(key)
+        if located is not None:
+            with self._lock:
+                self._stats["disk_hits"] += 1
+        return located
+
+    def put(self, key, audio_bytes, metadata):
+        """Guarda el audio en memoria y, si está configurado, en disco"""
+        with self._lock:
+            self._store_memory(key, audio_bytes, metadata)
+            self._stats["stores"] += 1
+
+        if self.store is not None:
+            try:
+                self.store.write(key, audio_bytes, metadata)
+            except OSError as e:
+                print(f"[!] No se pudo escribir la caché en disco: {e}")
+
+    def stats(self):
+        """Estadísticas de uso de la caché"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["size_bytes"] = self._size
+
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["max_bytes"] = self.max_bytes
+        stats["disk_enabled"] = self.store is not None
+        if self.store is not None:
+            stats["disk"] = self.store.stats()
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+    def _store_memory(self, key, audio_bytes, metadata):
+        """Inserta en el nivel de memoria desalojando por tamaño (requiere el lock)"""
+        size = len(audio_bytes)
+        if size > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous[0])
+
+        self._entries[key] = (audio_bytes, metadata)
+        self._size += size
+
+        while self._size > self.max_bytes:
+            _, (evicted_bytes, _) = self._entries.popitem(last=False)
+            self._size -= len(evicted_bytes)
+            self._stats["evictions"] += 1
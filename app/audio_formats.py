@@ -0,0 +1,161 @@
+"""
+Formatos de salida de la síntesis.
+
+Cada formato se pide a Azure con su X-Microsoft-OutputFormat nativo siempre
+que existe, de modo que el audio se reenvía sin transcodificar. Solo los
+formatos que Azure no ofrece (FLAC) se codifican localmente a partir del
+WAV PCM nativo de la misma frecuencia, sin remuestrear. numpy y
+soundfile solo se importan en esa ruta (o en el master de gunicorn, ver
+gunicorn.conf.py): el resto de formatos no los necesita.
+"""
+
+import io
+import struct
+
+from audio_utils import parse_wav_header, build_wav_header
+
+DEFAULT_FORMAT = "wav"
+
+# container: wav (RIFF), raw (muestras sin cabecera), ogg, mp3 o flac (local)
+# codec: etiqueta WAVE del códec (1 PCM, 6 A-law, 7 μ-law) en los formatos de muestras
+# stream: formato que se pide a Azure en modo streaming (raw + cabecera propia en WAV)
+# source: formato nativo del que se codifica localmente
+FORMATS = {
+    "wav": {
+        "azure": "riff-24khz-16bit-mono-pcm", "stream": "raw-24khz-16bit-mono-pcm",
+        "container": "wav", "codec": 1, "bits": 16, "sample_rate": 24000,
+        "mimetype": "audio/wav", "extension": "wav",
+    },
+    "wav-16khz": {
+        "azure": "riff-16khz-16bit-mono-pcm", "stream": "raw-16khz-16bit-mono-pcm",
+        "container": "wav", "codec": 1, "bits": 16, "sample_rate": 16000,
+        "mimetype": "audio/wav", "extension": "wav",
+    },
+    "wav-8khz": {
+        "azure": "riff-8khz-16bit-mono-pcm", "stream": "raw-8khz-16bit-mono-pcm",
+        "container": "wav", "codec": 1, "bits": 16, "sample_rate": 8000,
+        "mimetype": "audio/wav", "extension": "wav",
+    },
+    "mulaw-8khz": {
+        "azure": "riff-8khz-8bit-mono-mulaw", "stream": "raw-8khz-8bit-mono-mulaw",
+        "container": "wav", "codec": 7, "bits": 8, "sample_rate": 8000,
+        "mimetype": "audio/wav", "extension": "wav",
+    },
+    "alaw-8khz": {
+        "azure": "riff-8khz-8bit-mono-alaw", "stream": "raw-8khz-8bit-mono-alaw",
+        "container": "wav", "codec": 6, "bits": 8, "sample_rate": 8000,
+        "mimetype": "audio/wav", "extension": "wav",
+    },
+    "raw-mulaw-8khz": {
+        "azure": "raw-8khz-8bit-mono-mulaw", "stream": "raw-8khz-8bit-mono-mulaw",
+        "container": "raw", "codec": 7, "bits": 8, "sample_rate": 8000,
+        "mimetype": "audio/basic", "extension": "ulaw",
+    },
+    "ogg-opus": {
+        "azure": "ogg-24khz-16bit-mono-opus", "stream": "ogg-24khz-16bit-mono-opus",
+        "container": "ogg", "sample_rate": 24000,
+        "mimetype": "audio/ogg", "extension": "ogg",
+    },
+    "mp3": {
+        "azure": "audio-24khz-48kbitrate-mono-mp3", "stream": "audio-24khz-48kbitrate-mono-mp3",
+        "container": "mp3", "sample_rate": 24000, "bitrate": 48000,
+        "mimetype": "audio/mpeg", "extension": "mp3",
+    },
+    "flac": {
+        "source": "wav", "container": "flac", "sample_rate": 24000,
+        "mimetype": "audio/flac", "extension": "flac",
+    },
+    "flac-16khz": {
+        "source": "wav-16khz", "container": "flac", "sample_rate": 16000,
+        "mimetype": "audio/flac", "extension": "flac",
+    },
+}
+
+# Valor de silencio de una muestra de 8 bits según el códec
+SILENCE_BYTE = {1: 0x00, 6: 0xD5, 7: 0xFF}
+
+
+def is_joinable(name):
+    """Los formatos de muestras de tamaño fijo se pueden concatenar a nivel de bytes"""
+    return FORMATS[name]["container"] in ("wav", "raw")
+
+
+def audio_metadata(name, audio_bytes):
+    """Frecuencia de muestreo y duración del audio sin decodificarlo"""
+    fmt = FORMATS[name]
+    duration = None
+    if fmt["container"] == "wav":
+        wav_info = parse_wav_header(audio_bytes)
+        return {"sample_rate": wav_info["sample_rate"], "duration": wav_info["duration"]}
+    if fmt["container"] == "raw":
+        duration = len(audio_bytes) / (fmt["sample_rate"] * fmt["bits"] // 8)
+    elif fmt["container"] == "ogg":
+        duration = ogg_opus_duration(audio_bytes)
+    elif fmt["container"] == "mp3":
+        duration = len(audio_bytes) * 8 / fmt["bitrate"]
+    return {"sample_rate": fmt["sample_rate"], "duration": duration}
+
+
+def ogg_opus_duration(audio_bytes):
+    """Duración de un Ogg Opus a partir de la posición de la última página"""
+    last_page = audio_bytes.rfind(b"OggS")
+    head = audio_bytes.find(b"OpusHead")
+    if last_page < 0 or head < 0 or last_page + 14 > len(audio_bytes):
+        return None
+    granule = struct.unpack_from("<q", audio_bytes, last_page + 6)[0]
+    pre_skip = struct.unpack_from("<H", audio_bytes, head + 10)[0]
+    # Opus cuenta siempre las posiciones a 48 kHz
+    return max(0, granule - pre_skip) / 48000
+
+
+def stream_prefix(name):
+    """Cabecera que se antepone al flujo raw de Azure (solo formatos WAV)"""
+    fmt = FORMATS[name]
+    if fmt["container"] != "wav":
+        return b""
+    return build_wav_header(fmt["sample_rate"], bits_per_sample=fmt["bits"], format_tag=fmt["codec"])
+
+
+def join_segments(name, parts, silence_ms):
+    """Une los audios de varios segmentos con silencio entre ellos, sin decodificar
+
+    Devuelve (audio_bytes, duración).
+    """
+    fmt = FORMATS[name]
+    samples = []
+    block_align = sample_rate = None
+    for audio_bytes in parts:
+        if fmt["container"] == "wav":
+            info = parse_wav_header(audio_bytes)
+            block_align, sample_rate = info["block_align"], info["sample_rate"]
+            start, size = info["data_offset"], info["data_size"]
+        else:
+            block_align, sample_rate = fmt["bits"] // 8, fmt["sample_rate"]
+            start, size = 0, len(audio_bytes)
+        samples.append(memoryview(audio_bytes)[start:start + size])
+
+    silence_value = SILENCE_BYTE[fmt["codec"]] if fmt["bits"] == 8 else 0
+    silence = bytes([silence_value]) * (int(sample_rate * silence_ms / 1000) * block_align)
+    data = silence.join(samples)
+    duration = len(data) / block_align / sample_rate
+
+    if fmt["container"] == "raw":
+        return data, duration
+    header = build_wav_header(sample_rate, bits_per_sample=fmt["bits"],
+                              data_size=len(data), format_tag=fmt["codec"])
+    return header + data, duration
+
+
+def encode_local(name, wav_bytes):
+    """Codifica localmente un formato que Azure no ofrece a partir de su WAV PCM 16 bits de origen"""
+    import numpy as np
+    import soundfile as sf
+
+    fmt = FORMATS[name]
+    info = parse_wav_header(wav_bytes)
+    start = info["data_offset"]
+    samples = np.frombuffer(wav_bytes, dtype="<i2", count=info["data_size"] // 2, offset=start)
+
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, info["sample_rate"], format=fmt["container"].upper(), subtype="PCM_16")
+    return buffer.getvalue()
@@ -0,0 +1,335 @@
+"""
+Post-procesado opcional del audio sintetizado.
+
+Se activa por petición con el objeto "postprocess" y se aplica en este
+orden: recorte del silencio inicial y final, ganancia, normalización de
+sonoridad (RMS en dBFS o integrada en LUFS según ITU-R BS.1770), limitador
+de picos con anticipación y fundidos de entrada y salida. Todo son
+operaciones vectorizadas de numpy sobre el clip completo, sin bucles por
+muestra: el filtro K de la medida LUFS se aplica en el dominio de la
+frecuencia y el limitador usa mínimos y medias móviles.
+
+Solo se procesan los formatos de muestras (WAV/raw PCM de 16 bits, μ-law y
+A-law); FLAC se procesa en el WAV del que se codifica. Sin opciones el audio
+no pasa por aquí y se envía tal cual.
+"""
+
+import math
+from functools import lru_cache
+
+from audio_formats import FORMATS, is_joinable
+from audio_utils import build_wav_header, parse_wav_header
+
+# Objetivo de sonoridad por defecto de cada normalización
+DEFAULT_TARGETS = {"rms": -20.0, "lufs": -16.0}
+DEFAULT_SILENCE_THRESHOLD_DB = -50.0
+# Techo del limitador cuando la petición sube el nivel y no indica otro
+DEFAULT_PEAK_LIMIT_DB = -1.0
+# Tramos de 10 ms para detectar el silencio; se conservan 20 ms de margen
+TRIM_FRAME_MS = 10
+TRIM_PADDING_MS = 20
+LIMITER_LOOKAHEAD_MS = 5
+
+OPTION_KEYS = ("normalize", "target", "trim_silence", "silence_threshold_db", "fade_in_ms", "fade_out_ms",
+               "gain_db", "peak_limit_db")
+
+
+def supports_processing(name):
+    """Indica si un formato de salida admite post-procesado"""
+    return is_joinable(name) or "source" in FORMATS[name]
+
+
+def parse_postprocess_options(options):
+    """Valida el objeto "postprocess" de una petición; None si no pide nada
+
+    Lanza ValueError si alguna opción no es válida.
+    """
+    if not options:
+        return None
+    if not isinstance(options, dict):
+        raise ValueError("postprocess must be an object")
+    unknown = sorted(set(options) - set(OPTION_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown postprocess option(s): {', '.join(unknown)} (supported: {', '.join(OPTION_KEYS)})")
+
+    parsed = {}
+    normalize = options.get("normalize")
+    if normalize:
+        if normalize not in DEFAULT_TARGETS:
+            raise ValueError("postprocess.normalize must be 'rms' or 'lufs'")
+        parsed["normalize"] = normalize
+        parsed["target"] = float(options.get("target", DEFAULT_TARGETS[normalize]))
+    if str(options.get("trim_silence", False)).lower() in ("true", "1", "yes"):
+        parsed["trim_silence"] = True
+        parsed["silence_threshold_db"] = float(options.get("silence_threshold_db", DEFAULT_SILENCE_THRESHOLD_DB))
+    for key in ("fade_in_ms", "fade_out_ms"):
+        value = float(options.get(key) or 0)
+        if value < 0:
+            raise ValueError(f"postprocess.{key} must be >= 0")
+        if value:
+            parsed[key] = value
+    gain = float(options.get("gain_db") or 0)
+    if gain:
+        parsed["gain_db"] = gain
+
+    limit = options.get("peak_limit_db")
+    if limit is not None:
+        parsed["peak_limit_db"] = min(0.0, float(limit))
+    elif normalize or gain > 0:
+        parsed["peak_limit_db"] = DEFAULT_PEAK_LIMIT_DB
+    return parsed or None
+
+
+def process_audio(name, audio_bytes, options):
+    """Aplica el post-procesado a un audio de un formato de muestras
+
+    Devuelve (audio_bytes, duración).
+    """
+    import numpy as np
+
+    fmt = FORMATS[name]
+    if fmt["container"] == "wav":
+        info = parse_wav_header(audio_bytes)
+        sample_rate, start, size = info["sample_rate"], info["data_offset"], info["data_size"]
+    else:
+        sample_rate, start, size = fmt["sample_rate"], 0, len(audio_bytes)
+
+    if fmt["bits"] == 16:
+        samples = np.frombuffer(audio_bytes, dtype="<i2", count=size // 2, offset=start).astype(np.float32)
+    else:
+        samples = G711_DECODE[fmt["codec"]]()[np.frombuffer(audio_bytes, dtype=np.uint8, count=size, offset=start)]
+    signal = samples * np.float32(1 / 32768)
+
+    signal = process_samples(signal, sample_rate, options)
+
+    pcm = np.clip(np.round(signal * 32768), -32768, 32767).astype("<i2")
+    data = pcm.tobytes() if fmt["bits"] == 16 else G711_ENCODE[fmt["codec"]](pcm).tobytes()
+    duration = len(pcm) / sample_rate
+    if fmt["container"] == "raw":
+        return data, duration
+    header = build_wav_header(sample_rate, bits_per_sample=fmt["bits"], data_size=len(data),
+                              format_tag=fmt["codec"])
+    return header + data, duration
+
+
+def process_samples(signal, sample_rate, options):
+    """Cadena de post-procesado sobre muestras float32 en [-1, 1]"""
+    if options.get("trim_silence"):
+        signal = trim_silence(signal, sample_rate, options["silence_threshold_db"])
+    if options.get("gain_db"):
+        signal = signal * db_to_gain(options["gain_db"])
+    if options.get("normalize") == "rms":
+        signal = normalize(signal, options["target"], rms_db(signal))
+    elif options.get("normalize") == "lufs":
+        signal = normalize(signal, options["target"], integrated_loudness(signal, sample_rate))
+    if "peak_limit_db" in options:
+        signal = limit_peaks(signal, sample_rate, db_to_gain(options["peak_limit_db"]))
+    if options.get("fade_in_ms") or options.get("fade_out_ms"):
+        signal = fade(signal, sample_rate, options.get("fade_in_ms", 0), options.get("fade_out_ms", 0))
+    return signal
+
+
+def db_to_gain(db):
+    return 10 ** (db / 20)
+
+
+def normalize(signal, target, level):
+    """Lleva el nivel medido al objetivo (el silencio completo se deja como está)"""
+    if level is None:
+        return signal
+    return signal * db_to_gain(target - level)
+
+
+def rms_db(signal):
+    """Nivel RMS en dBFS (None si el clip es silencio)"""
+    import numpy as np
+
+    if not len(signal):
+        return None
+    power = float(np.mean(np.square(signal, dtype=np.float64)))
+    return 10 * math.log10(power) if power > 0 else None
+
+
+def trim_silence(signal, sample_rate, threshold_db):
+    """Recorta el silencio inicial y final: tramos de 10 ms por debajo del umbral (dBFS)"""
+    import numpy as np
+
+    frame = max(1, sample_rate * TRIM_FRAME_MS // 1000)
+    frames = len(signal) // frame
+    if not frames:
+        return signal
+    power = np.mean(np.square(signal[:frames * frame].reshape(frames, frame), dtype=np.float64), axis=1)
+    voiced = np.flatnonzero(power > 10 ** (threshold_db / 10))
+    if not len(voiced):
+        return signal
+    padding = sample_rate * TRIM_PADDING_MS // 1000
+    begin = max(0, voiced[0] * frame - padding)
+    end = min(len(signal), (voiced[-1] + 1) * frame + padding)
+    return signal[begin:end]
+
+
+def fade(signal, sample_rate, fade_in_ms, fade_out_ms):
+    """Fundidos de entrada y salida con rampa de medio coseno"""
+    import numpy as np
+
+    signal = signal.copy()
+    for ms, head in ((fade_in_ms, True), (fade_out_ms, False)):
+        length = min(len(signal), int(sample_rate * ms / 1000))
+        if not length:
+            continue
+        ramp = (0.5 - 0.5 * np.cos(np.linspace(0.0, np.pi, length, dtype=np.float32))).astype(np.float32)
+        if head:
+            signal[:length] *= ramp
+        else:
+            signal[-length:] *= ramp[::-1]
+    return signal
+
+
+def limit_peaks(signal, sample_rate, ceiling):
+    """Limitador con anticipación: ninguna muestra supera `ceiling` y la ganancia cambia de forma suave
+
+    La ganancia necesaria en cada muestra se extiende con un mínimo móvil y
+    se suaviza con una media móvil de la misma anchura, así que nunca es
+    mayor que la necesaria en ninguna muestra.
+    """
+    import numpy as np
+
+    peak = float(np.max(np.abs(signal))) if len(signal) else 0.0
+    if peak <= ceiling:
+        return signal
+    half = max(1, sample_rate * LIMITER_LOOKAHEAD_MS // 1000 // 2)
+    width = 2 * half + 1
+    needed = np.minimum(1.0, ceiling / np.maximum(np.abs(signal), 1e-9))
+    padded = np.pad(needed, 2 * half, constant_values=1.0)
+    envelope = moving_min(padded, width)
+    cumulative = np.concatenate(([0.0], np.cumsum(envelope, dtype=np.float64)))
+    gain = ((cumulative[width:] - cumulative[:-width]) / width).astype(np.float32)
+    return np.clip(signal * gain, -ceiling, ceiling)
+
+
+def moving_min(values, width):
+    """Mínimo de cada ventana values[i:i + width] con O(n log width) operaciones vectorizadas"""
+    import numpy as np
+
+    result = values
+    span = 1
+    while span * 2 <= width:
+        result = np.minimum(result[:-span], result[span:])
+        span *= 2
+    if span < width:
+        # Dos ventanas de potencia de dos solapadas cubren la anchura pedida
+        result = np.minimum(result[:len(result) - (width - span)], result[width - span:])
+    return result
+
+
+def integrated_loudness(signal, sample_rate):
+    """Sonoridad integrada en LUFS (ITU-R BS.1770: filtro K, bloques de 400 ms y puertas)
+
+    None si todo el clip queda por debajo de la puerta absoluta.
+    """
+    import numpy as np
+
+    if not len(signal):
+        return None
+    # Filtro K aplicado en frecuencia: respuesta compleja de los dos biquads
+    size = 1 << (2 * len(signal) - 1).bit_length()
+    spectrum = np.fft.rfft(signal, size)
+    z = np.exp(-1j * np.linspace(0.0, np.pi, len(spectrum)))
+    for b, a in k_weighting(sample_rate):
+        spectrum *= (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    weighted = np.fft.irfft(spectrum, size)[:len(signal)]
+
+    block = int(0.4 * sample_rate)
+    step = block // 4
+    cumulative = np.concatenate(([0.0], np.cumsum(np.square(weighted))))
+    if len(signal) < block:
+        powers = np.array([cumulative[-1] / len(signal)])
+    else:
+        starts = np.arange(0, len(signal) - block + 1, step)
+        powers = (cumulative[starts + block] - cumulative[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(powers)
+    gated = powers[loudness > -70.0]
+    if not len(gated):
+        return None
+    relative_gate = -0.691 + 10 * math.log10(float(np.mean(gated))) - 10.0
+    gated = powers[(loudness > -70.0) & (loudness > relative_gate)]
+    return -0.691 + 10 * math.log10(float(np.mean(gated)))
+
+
+def k_weighting(sample_rate):
+    """Coeficientes (b, a) del shelving de +4 dB y del paso alto RLB del filtro K"""
+    # Estante de agudos: +4 dB a partir de ~1,5 kHz
+    gain = 10 ** (4.0 / 40)
+    w0 = 2 * math.pi * 1500.0 / sample_rate
+    alpha = math.sin(w0) / (2 * (1 / math.sqrt(2)))
+    cos_w0, root = math.cos(w0), 2 * math.sqrt(gain) * alpha
+    shelf = (
+        (gain * ((gain + 1) + (gain - 1) * cos_w0 + root),
+         -2 * gain * ((gain - 1) + (gain + 1) * cos_w0),
+         gain * ((gain + 1) + (gain - 1) * cos_w0 - root)),
+        ((gain + 1) - (gain - 1) * cos_w0 + root,
+         2 * ((gain - 1) - (gain + 1) * cos_w0),
+         (gain + 1) - (gain - 1) * cos_w0 - root),
+    )
+    # Paso alto de 38 Hz
+    w0 = 2 * math.pi * 38.0 / sample_rate
+    alpha = math.sin(w0) / (2 * 0.5)
+    cos_w0 = math.cos(w0)
+    high_pass = (
+        ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2),
+        (1 + alpha, -2 * cos_w0, 1 - alpha),
+    )
+    return shelf, high_pass
+
+
+# G.711: tablas de decodificación de 256 entradas y codificación vectorizada
+
+@lru_cache(maxsize=None)
+def ulaw_table():
+    import numpy as np
+
+    code = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (code >> 4) & 0x07
+    magnitude = ((((code & 0x0F) << 3) + 0x84) << exponent) - 0x84
+    return np.where(code & 0x80, -magnitude, magnitude).astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def alaw_table():
+    import numpy as np
+
+    code = np.arange(256, dtype=np.int32) ^ 0x55
+    exponent = (code >> 4) & 0x07
+    mantissa = code & 0x0F
+    magnitude = np.where(exponent == 0, (mantissa << 4) + 8,
+                         ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0))
+    return np.where(code & 0x80, magnitude, -magnitude).astype(np.float32)
+
+
+def ulaw_encode(pcm):
+    import numpy as np
+
+    pcm = pcm.astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), 8159) + 0x21
+    segment = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), magnitude)
+    code = np.where(segment >= 8, 0x7F, (np.minimum(segment, 7) << 4) | ((magnitude >> (segment + 1)) & 0x0F))
+    return (code ^ mask).astype(np.uint8)
+
+
+def alaw_encode(pcm):
+    import numpy as np
+
+    pcm = pcm.astype(np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    pcm = np.where(pcm >= 0, pcm, -pcm - 1)
+    segment = np.searchsorted(np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]), pcm)
+    mantissa = np.where(segment < 2, pcm >> 1, pcm >> np.maximum(segment, 1)) & 0x0F
+    code = np.where(segment >= 8, 0x7F, (np.minimum(segment, 7) << 4) | mantissa)
+    return (code ^ mask).astype(np.uint8)
+
+
+G711_DECODE = {7: ulaw_table, 6: alaw_table}
+G711_ENCODE = {7: ulaw_encode, 6: alaw_encode}
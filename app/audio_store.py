@@ -0,0 +1,215 @@
+"""
+Almacén persistente de audio en disco, compartido por los workers.
+
+Directorio direccionado por contenido (<dir>/<ab>/<clave>.audio + .json)
+que sobrevive a los reinicios del contenedor. Las entradas se sirven por
+ruta (sendfile) sin cargarlas en la memoria de cada worker. Las escrituras
+son atómicas y un barrido periódico desaloja por antigüedad y tamaño total.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Las lecturas solo actualizan la fecha de último uso si es más antigua que esto
+TOUCH_INTERVAL = 3600
+# Ficheros temporales huérfanos (escrituras interrumpidas) que se pueden borrar
+STALE_TMP_SECONDS = 3600
+
+
+class AudioStore:
+    """Almacén de audio en disco con escrituras atómicas y desalojo por tamaño/antigüedad"""
+
+    def __init__(self, directory, max_bytes=0, max_age=0, sweep_interval=300.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._written_since_sweep = 0
+        self._stats = {
+            "entries": None,
+            "size_bytes": None,
+            "last_sweep_at": None,
+            "evicted_age": 0,
+            "evicted_size": 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self, key):
+        """Rutas (audio, metadatos) de una clave, repartidas en subdirectorios"""
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".audio", base + ".json"
+
+    def contains(self, key):
+        return os.path.exists(self.paths(key)[0])
+
+    def locate(self, key):
+        """Devuelve (ruta_audio, metadata) de una entrada completa o None"""
+        audio_path, meta_path = self.paths(key)
+        try:
+            mtime = os.stat(audio_path).st_mtime
+            with open(meta_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # La fecha de modificación hace de último uso para el desalojo
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(audio_path, (now, now))
+            except OSError:
+                pass
+        return audio_path, metadata
+
+    def read(self, key):
+        """Devuelve (audio_bytes, metadata) o None"""
+        located = self.locate(key)
+        if located is None:
+            return None
+        try:
+            with open(located[0], "rb") as f:
+                return f.read(), located[1]
+        except OSError:
+            return None
+
+    def write(self, key, audio_bytes, metadata):
+        """Guarda una entrada de forma atómica"""
+        # Los metadatos se escriben antes que el audio: la presencia del
+        # fichero de audio indica que la entrada está completa
+        audio_path, meta_path = self.paths(key)
+        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+        self._atomic_write(meta_path, json.dumps(metadata).encode("utf-8"))
+        self._atomic_write(audio_path, audio_bytes)
+
+        self.ensure_started()
+        with self._lock:
+            self._written_since_sweep += len(audio_bytes)
+            # Si se escribe mucho entre barridos se adelanta el siguiente
+            if self.max_bytes and self._written_since_sweep > self.max_bytes // 10:
+                self._written_since_sweep = 0
+                self._wakeup.set()
+
+    def ensure_started(self):
+        """Arranca el hilo de barrido (una vez por proceso, tras el fork de gunicorn)"""
+        if self.sweep_interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="audio-store-sweep", daemon=True).start()
+
+    def sweep(self):
+        """Desaloja entradas caducadas y, si se supera el tamaño máximo, las menos usadas
+
+        Solo un worker barre a la vez; los demás se saltan el barrido.
+        """
+        lock_fd = os.open(os.path.join(self.directory, ".sweep.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            return self._sweep_locked()
+        finally:
+            os.close(lock_fd)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(directory=self.directory, max_bytes=self.max_bytes, max_age_seconds=self.max_age)
+        return stats
+
+    def _sweep_locked(self):
+        now = time.time()
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir() or shard.name.startswith("."):
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(".tmp"):
+                    if now - stat.st_mtime > STALE_TMP_SECONDS:
+                        self._remove(entry.path)
+                elif entry.name.endswith(".audio"):
+                    meta_path = entry.path[:-len(".audio")] + ".json"
+                    try:
+                        meta_size = os.stat(meta_path).st_size
+                    except OSError:
+                        meta_size = 0
+                    entries.append((stat.st_mtime, stat.st_size + meta_size, entry.path, meta_path))
+
+        evicted_age = evicted_size = 0
+        if self.max_age:
+            fresh = []
+            for entry in entries:
+                if now - entry[0] > self.max_age:
+                    self._remove_entry(entry)
+                    evicted_age += 1
+                else:
+                    fresh.append(entry)
+            entries = fresh
+
+        total = sum(size for _, size, _, _ in entries)
+        if self.max_bytes and total > self.max_bytes:
+            # Se baja al 90% del máximo para no barrer en cada escritura
+            target = self.max_bytes * 0.9
+            entries.sort()
+            while entries and total > target:
+                entry = entries.pop(0)
+                self._remove_entry(entry)
+                total -= entry[1]
+                evicted_size += 1
+
+        with self._lock:
+            self._stats.update(entries=len(entries), size_bytes=total, last_sweep_at=now)
+            self._stats["evicted_age"] += evicted_age
+            self._stats["evicted_size"] += evicted_size
+        if evicted_age or evicted_size:
+            print(f"[*] Almacén de audio: {evicted_age} entradas caducadas y {evicted_size} "
+                  f"desalojadas por tamaño ({total / (1024 * 1024):.1f} MB en uso)")
+        return {"entries": len(entries), "size_bytes": total,
+                "evicted_age": evicted_age, "evicted_size": evicted_size}
+
+    def _remove_entry(self, entry):
+        # Primero el audio: la entrada deja de verse antes de borrar los metadatos.
+        # Las respuestas que ya la están enviando conservan el fichero abierto.
+        _, _, audio_path, meta_path = entry
+        self._remove(audio_path)
+        self._remove(meta_path)
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[!] Error al barrer el almacén de audio: {e}")
+            self._wakeup.wait(self.sweep_interval)
+            self._wakeup.clear()
+
+    def _atomic_write(self, path, payload):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
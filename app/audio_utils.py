@@ -0,0 +1,61 @@
+"""
+Utilidades de audio: lectura y construcción de cabeceras WAV.
+"""
+
+import struct
+
+
+def parse_wav_header(audio_bytes):
+    """Lee la cabecera RIFF/WAV y devuelve sus parámetros sin decodificar el audio"""
+    if len(audio_bytes) < 12 or audio_bytes[:4] != b"RIFF" or audio_bytes[8:12] != b"WAVE":
+        raise ValueError("Audio is not a RIFF/WAVE stream")
+
+    info = {}
+    offset = 12
+    while offset + 8 <= len(audio_bytes):
+        chunk_id = audio_bytes[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", audio_bytes, offset + 4)[0]
+        body = offset + 8
+
+        if chunk_id == b"fmt ":
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", audio_bytes, body)
+            info.update(format_tag=format_tag, channels=channels, sample_rate=sample_rate,
+                        bits_per_sample=bits, block_align=block_align)
+        elif chunk_id == b"data":
+            # Algunos flujos llevan un tamaño de datos provisional (0 o STREAMING_DATA_SIZE)
+            available = len(audio_bytes) - body
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            info.update(data_offset=body, data_size=chunk_size)
+            break
+
+        offset = body + chunk_size + (chunk_size & 1)
+
+    if "sample_rate" not in info or "data_offset" not in info:
+        raise ValueError("Incomplete WAV header")
+
+    info["frames"] = info["data_size"] // info["block_align"]
+    info["duration"] = info["frames"] / info["sample_rate"]
+    return info
+
+
+# Tamaño de datos usado cuando la longitud final del flujo no se conoce
+STREAMING_DATA_SIZE = 0xFFFFFFFF
+
+
+def build_wav_header(sample_rate, channels=1, bits_per_sample=16, data_size=None, format_tag=1):
+    """Construye una cabecera WAV (PCM por defecto); sin data_size se usa la longitud de streaming"""
+    block_align = channels * bits_per_sample // 8
+    if data_size is None:
+        riff_size = data_size = STREAMING_DATA_SIZE
+    else:
+        riff_size = 36 + data_size
+
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, format_tag, channels, sample_rate,
+        sample_rate * block_align, block_align, bits_per_sample,
+        b"data", data_size,
+    )
+
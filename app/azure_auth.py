@@ -0,0 +1,142 @@
+"""
+Autenticación con tokens de acceso de Azure (issueToken) en lugar de la clave.
+
+Un hilo por worker canjea la clave de cada endpoint por un token bearer
+(válido 10 minutos) y lo renueva antes de que caduque. Las síntesis solo
+leen el último token: nunca esperan a obtenerlo. Si todavía no hay token,
+si caducó porque la renovación falla o si Azure lo rechaza (401), se
+envía la clave como hasta ahora y el hilo reintenta la renovación (una
+síntesis rechazada con el token se repite al momento con la clave).
+"""
+
+import os
+import threading
+import time
+
+# Cada cuánto se revisan los tokens y se publica su edad
+TICK_INTERVAL = 5.0
+
+
+class TokenProvider:
+    """Tokens bearer por endpoint, renovados en segundo plano"""
+
+    def __init__(self, client, endpoints, refresh_interval=540.0, lifetime=600.0, retry_interval=10.0,
+                 timeout=5.0, on_refresh=None, on_tick=None):
+        self.client = client
+        self.endpoints = list(endpoints)
+        self.refresh_interval = refresh_interval
+        self.lifetime = lifetime
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.on_refresh = on_refresh  # (endpoint, ok, segundos)
+        self.on_tick = on_tick        # ({endpoint: edad del token en segundos o None})
+        self._tokens = {}   # nombre del endpoint -> (token, instante de emisión)
+        self._due = {}      # nombre del endpoint -> próxima renovación
+        self._stats = {endpoint.name: {"refreshes": 0, "failures": 0, "last_refresh_ms": None,
+                                       "last_error": None} for endpoint in self.endpoints}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def auth_headers(self, endpoint):
+        """Cabecera de autenticación para una síntesis (el token si es válido, si no la clave)"""
+        self.ensure_started()
+        with self._lock:
+            current = self._tokens.get(endpoint.name)
+        if current is not None and time.monotonic() - current[1] < self.lifetime:
+            return {"Authorization": f"Bearer {current[0]}"}
+        return {"Ocp-Apim-Subscription-Key": endpoint.key}
+
+    def invalidate(self, endpoint):
+        """Descarta el token de un endpoint (Azure lo rechazó) y pide renovarlo ya"""
+        with self._lock:
+            if self._tokens.pop(endpoint.name, None) is None:
+                return
+            self._due[endpoint.name] = 0.0
+        print(f"[!] Token de Azure rechazado ({endpoint.name}); se usa la clave hasta renovarlo")
+        self._wakeup.set()
+
+    def ensure_started(self):
+        """Arranca el hilo de renovación (una vez por proceso, tras el fork de gunicorn)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Los tokens del master no se heredan: cada worker obtiene los suyos
+            self._tokens.clear()
+            self._due.clear()
+        threading.Thread(target=self._run, name="azure-token", daemon=True).start()
+
+    def ages(self):
+        """Edad en segundos del token de cada endpoint (None si se está usando la clave)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = dict(self._tokens)
+        ages = {}
+        for endpoint in self.endpoints:
+            current = tokens.get(endpoint.name)
+            age = now - current[1] if current is not None else None
+            ages[endpoint.name] = age if age is not None and age < self.lifetime else None
+        return ages
+
+    def stats(self):
+        ages = self.ages()
+        with self._lock:
+            return [
+                {
+                    "endpoint": endpoint.name,
+                    "auth": "token" if ages[endpoint.name] is not None else "key",
+                    "token_age_seconds": round(ages[endpoint.name], 1) if ages[endpoint.name] is not None else None,
+                    **self._stats[endpoint.name],
+                }
+                for endpoint in self.endpoints
+            ]
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            for endpoint in self.endpoints:
+                with self._lock:
+                    due = self._due.get(endpoint.name, 0.0)
+                if due <= now:
+                    self._refresh(endpoint)
+            if self.on_tick is not None:
+                self.on_tick(self.ages())
+            with self._lock:
+                next_due = min(self._due.values(), default=now)
+            self._wakeup.wait(max(0.0, min(TICK_INTERVAL, next_due - time.monotonic())))
+            self._wakeup.clear()
+
+    def _refresh(self, endpoint):
+        start = time.perf_counter()
+        try:
+            response = self.client.post(endpoint.token_url, headers={"Ocp-Apim-Subscription-Key": endpoint.key},
+                                        data=b"", timeout=self.timeout)
+            response.raise_for_status()
+            token = response.text.strip()
+            if not token:
+                raise ValueError("empty token")
+            error = None
+        except Exception as e:
+            error = str(e)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            stats = self._stats[endpoint.name]
+            stats["last_refresh_ms"] = round(elapsed * 1000, 1)
+            if error is None:
+                self._tokens[endpoint.name] = (token, time.monotonic() - elapsed)
+                self._due[endpoint.name] = time.monotonic() + self.refresh_interval
+                stats["refreshes"] += 1
+                stats["last_error"] = None
+            else:
+                # El token anterior sigue valiendo hasta caducar; después se usa la clave
+                self._due[endpoint.name] = time.monotonic() + self.retry_interval
+                stats["failures"] += 1
+                stats["last_error"] = error
+        if error is not None:
+            print(f"[!] No se pudo renovar el token de Azure ({endpoint.name}): {error}")
+        if self.on_refresh is not None:
+            self.on_refresh(endpoint, error is None, elapsed)
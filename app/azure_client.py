@@ -0,0 +1,76 @@
+"""
+Cliente HTTP compartido para las llamadas a Azure TTS.
+
+Mantiene un pool de conexiones keep-alive por worker, aplica timeouts de
+conexión/lectura y reintenta con backoff las respuestas 429/5xx respetando
+la cabecera Retry-After.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Respuestas que indican un problema de Azure (o de credenciales), no de la petición
+UPSTREAM_FAILURE_CODES = RETRY_STATUS_CODES + (401, 403)
+
+
+class AzureHTTPClient:
+    """Sesión HTTP con pool de conexiones y reintentos para Azure"""
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=15.0,
+                 max_retries=2, backoff_factor=0.3):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def post(self, url, **kwargs):
+        """POST usando el pool compartido"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        """GET usando el pool compartido"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def connection_stats(self):
+        """Conexiones abiertas frente a peticiones que reutilizaron una conexión"""
+        opened = 0
+        requests_made = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests_made += pool.num_requests
+
+        return {
+            "connections_opened": opened,
+            "connections_reused": max(0, requests_made - opened),
+            "requests": requests_made,
+            "pool_size": self.pool_size,
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+        }
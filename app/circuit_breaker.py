@@ -0,0 +1,143 @@
+"""
+Circuit breaker de las síntesis contra Azure TTS.
+
+Se registra el resultado de cada síntesis (tras el failover entre
+endpoints) en una ventana de tiempo. Cuando hay bastantes síntesis
+recientes y la proporción de fallos (errores de Azure, timeouts o
+respuestas más lentas que slow_threshold) alcanza failure_ratio, el
+circuito se abre: durante open_seconds las síntesis se rechazan al momento
+con Overloaded en lugar de esperar cada una su timeout de red. El audio en
+caché se sigue sirviendo, porque la caché se consulta antes de llamar a
+Azure. Pasado ese tiempo el circuito queda semiabierto y deja pasar
+half_open_probes síntesis de prueba: si salen bien se cierra y si fallan se
+vuelve a abrir.
+
+La ventana guarda como mucho las últimas max_calls síntesis y lleva la
+cuenta de fallos al añadir y al expirar, así que record() cuesta lo mismo
+con cualquier volumen de tráfico.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+from admission import Overloaded
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    """Corta las llamadas a Azure mientras falla y prueba su recuperación"""
+
+    def __init__(self, window=30.0, min_calls=20, failure_ratio=0.5, slow_threshold=None, open_seconds=10.0,
+                 half_open_probes=1, max_calls=1000, on_change=None, on_reject=None):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_threshold = slow_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.on_change = on_change    # (nuevo estado)
+        self.on_reject = on_reject    # ()
+        self.state = CLOSED
+        self._outcomes = deque()      # (instante, fallo) de las síntesis recientes
+        self._max_calls = max(1, max_calls)
+        self._failures = 0            # fallos en _outcomes
+        self._open_until = 0.0
+        self._probes = 0              # síntesis de prueba en curso (semiabierto)
+        self._stats = {"opened": 0, "rejected": 0, "last_opened_reason": None}
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Deja pasar una síntesis o lanza Overloaded si el circuito está abierto
+
+        Devuelve True si es una síntesis de prueba (circuito semiabierto), que
+        se pasa después a record().
+        """
+        now = time.monotonic()
+        with self._lock:
+            changed = None
+            if self.state == OPEN and now >= self._open_until:
+                changed = self._transition(HALF_OPEN)
+            probe = self.state == HALF_OPEN and self._probes < self.half_open_probes
+            if probe:
+                self._probes += 1
+            rejected = self.state != CLOSED and not probe
+            if rejected:
+                self._stats["rejected"] += 1
+                retry_after = max(1, math.ceil(self._open_until - now))
+        self._changed(changed)
+        if rejected:
+            if self.on_reject is not None:
+                self.on_reject()
+            raise Overloaded("circuit_open", retry_after)
+        return probe
+
+    def record(self, ok, latency, probe=False):
+        """Registra el resultado de una síntesis que pasó por allow()"""
+        failed = not ok or (self.slow_threshold is not None and latency > self.slow_threshold)
+        now = time.monotonic()
+        changed = None
+        with self._lock:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+                if self.state == HALF_OPEN:
+                    if failed:
+                        changed = self._open(now, "la síntesis de prueba falló")
+                    elif not self._probes:
+                        self._outcomes.clear()
+                        self._failures = 0
+                        changed = self._transition(CLOSED)
+            elif self.state == CLOSED:
+                if len(self._outcomes) >= self._max_calls:
+                    self._evict()
+                self._outcomes.append((now, failed))
+                self._failures += failed
+                self._trim(now)
+                calls = len(self._outcomes)
+                if calls >= self.min_calls and self._failures / calls >= self.failure_ratio:
+                    changed = self._open(now, f"{self._failures}/{calls} síntesis fallidas "
+                                              f"en {self.window:g} s")
+            # Con el circuito abierto o semiabierto solo cuentan las síntesis de prueba: el
+            # resto empezaron antes de abrirse
+        self._changed(changed)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            return {
+                "state": self.state,
+                "open_seconds_remaining": round(max(0.0, self._open_until - now), 1) if self.state == OPEN else 0.0,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": self._failures,
+                **self._stats,
+            }
+
+    def _open(self, now, reason):
+        self._open_until = now + self.open_seconds
+        self._stats["opened"] += 1
+        self._stats["last_opened_reason"] = reason
+        print(f"[!] Circuito de Azure abierto ({reason}); se rechazan las síntesis durante {self.open_seconds:g} s")
+        return self._transition(OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        if state == CLOSED:
+            print("[*] Circuito de Azure cerrado: la síntesis de prueba fue bien")
+        return state
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._evict()
+
+    def _evict(self):
+        _, failed = self._outcomes.popleft()
+        self._failures -= failed
+
+    def _changed(self, state):
+        if state is not None and self.on_change is not None:
+            self.on_change(state)
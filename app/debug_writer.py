@@ -0,0 +1,178 @@
+"""
+Escritura en segundo plano del audio de debug.
+
+Las peticiones solo encolan el buffer ya codificado (o la ruta del almacén
+en disco); un hilo lo escribe en el directorio de debug. La cola es acotada:
+si está llena, la captura se descarta y se cuenta. Se puede muestrear (1 de
+cada N peticiones) y se aplica un límite de ficheros y bytes.
+
+El directorio lo comparten todos los workers de gunicorn y hace de índice
+común: los nombres empiezan por el instante de escritura, así que ordenarlos
+es ordenarlos por antigüedad. El listado solo lee los nombres y consulta el
+tamaño de los ficheros de la página pedida. La retención (el límite es el
+del directorio completo) la aplica el hilo escritor cada RETENTION_EVERY
+ficheros o RETENTION_INTERVAL segundos, así que el directorio puede pasarse
+del límite en hasta RETENTION_EVERY ficheros por worker entre pasadas.
+"""
+
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Ficheros escritos por un worker entre pasadas de retención
+RETENTION_EVERY = 32
+# Segundos máximos entre pasadas mientras se escriben ficheros
+RETENTION_INTERVAL = 30.0
+
+
+def is_debug_file(name):
+    """Ficheros de debug: <instante>_azure_<voz>_<sufijo>.<ext> (o azure_<voz>_... de versiones anteriores)"""
+    return name.startswith("azure_") or (name[:8].isdigit() and "_azure_" in name)
+
+
+def age_order(name):
+    """Clave de orden del más antiguo al más reciente (los nombres antiguos van primero)"""
+    return name[:1].isdigit(), name
+
+
+class DebugAudioWriter:
+    """Cola acotada + hilo escritor + retención de los ficheros de debug"""
+
+    def __init__(self, directory, queue_size=64, sample_every=1, max_files=1000, max_bytes=0):
+        self.directory = directory
+        self.sample_every = max(1, sample_every)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._requests = 0
+        self._pending = 0          # ficheros escritos desde la última retención
+        self._retained_at = 0.0
+        self._stats = {"written": 0, "dropped": 0, "sampled_out": 0, "errors": 0, "deleted": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._enforce_retention()
+
+    def submit(self, voice, audio_bytes=None, source_path=None, extension="wav"):
+        """Encola una captura; devuelve el nombre de fichero o None si se descarta"""
+        with self._lock:
+            self._requests += 1
+            if self._requests % self.sample_every:
+                self._stats["sampled_out"] += 1
+                return None
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        # El sufijo evita que dos peticiones del mismo milisegundo se pisen
+        filename = f"{timestamp}_azure_{voice}_{uuid.uuid4().hex[:6]}.{extension}"
+        self.ensure_started()
+        try:
+            self._queue.put_nowait((filename, audio_bytes, source_path))
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return None
+        return filename
+
+    def flush(self):
+        """Espera a que se escriban todas las capturas encoladas"""
+        self._queue.join()
+
+    def ensure_started(self):
+        """Arranca el hilo escritor (una vez por proceso, tras el fork de gunicorn)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="debug-writer", daemon=True).start()
+
+    def page(self, offset=0, limit=50):
+        """Página de ficheros de todos los workers, del más reciente al más antiguo"""
+        names = self._names()
+        end = len(names) - offset
+        page = []
+        for name in reversed(names[max(0, end - limit):max(0, end)]):
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue  # Borrado por la retención de otro worker
+            page.append({
+                "filename": name,
+                "size": stat.st_size,
+                "created": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "url": f"/debug/audio/{name}",
+            })
+        return page, len(names)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(queued=self._queue.qsize(), sample_every=self.sample_every,
+                     max_files=self.max_files, max_bytes=self.max_bytes)
+        return stats
+
+    def _run(self):
+        while True:
+            filename, audio_bytes, source_path = self._queue.get()
+            try:
+                self._write(filename, audio_bytes, source_path)
+            except Exception as e:
+                print(f"[!] No se pudo guardar el audio de debug {filename}: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+            finally:
+                self._queue.task_done()
+
+    def _write(self, filename, audio_bytes, source_path):
+        path = os.path.join(self.directory, filename)
+        if source_path is not None:
+            shutil.copyfile(source_path, path)
+        else:
+            with open(path, "wb") as f:
+                f.write(audio_bytes)
+        with self._lock:
+            self._stats["written"] += 1
+        print(f"[DEBUG] Audio guardado: {filename}")
+        self._pending += 1
+        if self._pending >= RETENTION_EVERY or time.monotonic() - self._retained_at >= RETENTION_INTERVAL:
+            self._enforce_retention()
+
+    def _enforce_retention(self):
+        """Borra los ficheros más antiguos del directorio que exceden los límites"""
+        self._pending = 0
+        self._retained_at = time.monotonic()
+        names = self._names()
+        expired = names[:max(0, len(names) - self.max_files)] if self.max_files else []
+        if self.max_bytes:
+            # El límite de bytes sí necesita el tamaño de cada fichero: del más reciente al más antiguo
+            kept = names[len(expired):]
+            total = 0
+            for index in range(len(kept) - 1, -1, -1):
+                try:
+                    total += os.stat(os.path.join(self.directory, kept[index])).st_size
+                except OSError:
+                    continue
+                if total > self.max_bytes:
+                    expired += kept[:index + 1]
+                    break
+
+        deleted = 0
+        for name in expired:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+                deleted += 1
+            except OSError:
+                pass  # Otro worker lo borró antes
+        if deleted:
+            with self._lock:
+                self._stats["deleted"] += deleted
+
+    def _names(self):
+        """Nombres de los ficheros de debug, del más antiguo al más reciente (sin consultar su tamaño)"""
+        return sorted((name for name in os.listdir(self.directory) if is_debug_file(name)), key=age_order)
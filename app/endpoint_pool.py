@@ -0,0 +1,162 @@
+"""
+Pool de endpoints de Azure TTS (región + clave) con enrutado por latencia.
+
+Cada endpoint lleva una media móvil exponencial (EWMA) de la latencia de sus
+síntesis correctas y de su tasa de errores. Las peticiones se envían primero
+al endpoint sano con mejor puntuación y, si falla por throttling (429),
+error 5xx, credenciales o timeout, se pasa al siguiente. Un endpoint que
+falla queda en enfriamiento (Retry-After en los 429, backoff exponencial en
+el resto) y solo se usa como último recurso hasta que expira.
+
+Un endpoint que lleva tiempo sin recibir tráfico se vuelve a probar con una
+sola petición, para que una región que se recupera no quede relegada con una
+EWMA antigua.
+
+Formato de AZURE_TTS_ENDPOINTS (separado por comas):
+    region:clave                  -> https://<region>.tts.speech.microsoft.com
+    region:clave@http://host:port -> URL base explícita (p. ej. un stub local)
+"""
+
+import threading
+import time
+
+from azure_client import UPSTREAM_FAILURE_CODES
+
+
+class AzureEndpoint:
+    """Una región de Azure TTS con su clave y sus estadísticas de tráfico"""
+
+    def __init__(self, region, key, base_url=None, name=None):
+        self.region = region
+        self.name = name or region
+        self.key = key
+        self.base_url = (base_url or f"https://{region}.tts.speech.microsoft.com").rstrip("/")
+        # issueToken vive en el dominio general de la región (o en la URL explícita, p. ej. el stub)
+        self.token_url = (f"{self.base_url}/sts/v1.0/issueToken" if base_url
+                          else f"https://{region}.api.cognitive.microsoft.com/sts/v1.0/issueToken")
+        self.latency_ewma = None  # segundos, solo síntesis correctas
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.last_error = None
+
+
+class EndpointPool:
+    """Selección del endpoint más rápido y sano, con failover y enfriamiento"""
+
+    def __init__(self, endpoints, alpha=0.2, cooldown=5.0, max_cooldown=60.0, explore_interval=30.0):
+        if not endpoints:
+            raise ValueError("Azure endpoint pool is empty")
+        self.endpoints = list(endpoints)
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.explore_interval = explore_interval
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def ordered(self):
+        """Endpoints en orden de preferencia: los sanos por puntuación y después los que se enfrían"""
+        now = time.monotonic()
+        with self._lock:
+            ranking = self._rank(now)
+            # Se marca ya para que solo una petición explore un endpoint sin tráfico reciente
+            if ranking[0].cooldown_until <= now:
+                ranking[0].last_used = now
+        return ranking
+
+    def preferred(self):
+        """Endpoint al que iría ahora una síntesis (sondas de salud, catálogo de voces)"""
+        with self._lock:
+            return self._rank(time.monotonic())[0]
+
+    def record(self, endpoint, status_code, latency, retry_after=None):
+        """Registra un intento contra un endpoint (status_code None si no hubo respuesta)"""
+        failed = status_code is None or status_code in UPSTREAM_FAILURE_CODES
+        now = time.monotonic()
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.last_used = now
+            endpoint.error_ewma += self.alpha * ((1.0 if failed else 0.0) - endpoint.error_ewma)
+            if not failed:
+                endpoint.consecutive_failures = 0
+                endpoint.cooldown_until = 0.0
+                if endpoint.latency_ewma is None:
+                    endpoint.latency_ewma = latency
+                else:
+                    endpoint.latency_ewma += self.alpha * (latency - endpoint.latency_ewma)
+                return
+
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            endpoint.last_error = "timeout/connection" if status_code is None else f"HTTP {status_code}"
+            if status_code == 429:
+                endpoint.throttled += 1
+            delay = min(self.max_cooldown, self.cooldown * 2 ** (endpoint.consecutive_failures - 1))
+            if status_code == 429 and retry_after is not None:
+                try:
+                    delay = min(self.max_cooldown, max(0.0, float(retry_after)))
+                except ValueError:
+                    pass
+            endpoint.cooldown_until = now + delay
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": endpoint.name,
+                    "region": endpoint.region,
+                    "url": endpoint.base_url,
+                    "healthy": endpoint.cooldown_until <= now,
+                    "cooldown_seconds": round(max(0.0, endpoint.cooldown_until - now), 1),
+                    "latency_ewma_ms": (round(endpoint.latency_ewma * 1000, 1)
+                                        if endpoint.latency_ewma is not None else None),
+                    "error_rate_ewma": round(endpoint.error_ewma, 3),
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "throttled": endpoint.throttled,
+                    "last_error": endpoint.last_error,
+                }
+                for endpoint in self.endpoints
+            ]
+
+    def _rank(self, now):
+        available = [endpoint for endpoint in self.endpoints if endpoint.cooldown_until <= now]
+        cooling = [endpoint for endpoint in self.endpoints if endpoint.cooldown_until > now]
+        available.sort(key=lambda endpoint: self._score(endpoint, now))
+        cooling.sort(key=lambda endpoint: endpoint.cooldown_until)
+        return available + cooling
+
+    def _score(self, endpoint, now):
+        # Sin medidas (o sin tráfico reciente) se prueba antes que el resto
+        if endpoint.latency_ewma is None or now - endpoint.last_used > self.explore_interval:
+            return 0.0
+        # Los errores recientes penalizan aunque el endpoint ya no se esté enfriando
+        return endpoint.latency_ewma * (1.0 + 4.0 * endpoint.error_ewma)
+
+
+def parse_endpoints(spec):
+    """Lista de AzureEndpoint a partir de AZURE_TTS_ENDPOINTS"""
+    endpoints = []
+    seen = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        credentials, _, base_url = item.partition("@")
+        region, separator, key = credentials.partition(":")
+        if not separator or not region.strip() or not key.strip():
+            raise ValueError(f"Invalid Azure endpoint '{item}' (expected region:key[@url])")
+        region = region.strip()
+        # Varias claves de la misma región se distinguen por su posición
+        seen[region] = seen.get(region, 0) + 1
+        name = region if seen[region] == 1 else f"{region}#{seen[region]}"
+        endpoints.append(AzureEndpoint(region, key.strip(), base_url.strip() or None, name))
+    return endpoints
@@ -0,0 +1,42 @@
+"""
+Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo).
+
+El servicio no importa numpy ni soundfile al arrancar: solo los necesitan los
+formatos que se codifican localmente (FLAC). Con PRELOAD_AUDIO_LIBS=true se
+importan una vez en el master antes del fork, de modo que los workers los
+heredan ya cargados (páginas compartidas copy-on-write) y la primera petición
+que los usa no paga la importación.
+
+Con PROMETHEUS_MULTIPROC_DIR las métricas de los workers se agregan desde
+ese directorio (ver metrics.py): se vacía al arrancar para no mezclar datos
+de ejecuciones anteriores y se marcan los workers que terminan.
+"""
+
+import glob
+import os
+import time
+
+PRELOAD_AUDIO_LIBS = os.getenv("PRELOAD_AUDIO_LIBS", "true").lower() == "true"
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(server):
+    """Preparación en el master, antes de lanzar los workers"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.unlink(path)
+
+    if not PRELOAD_AUDIO_LIBS:
+        return
+    start = time.perf_counter()
+    import numpy  # noqa: F401
+    import soundfile  # noqa: F401
+    print(f"[*] Dependencias de audio precargadas en el master ({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+
+def child_exit(server, worker):
+    """Los gauges del worker que termina dejan de contar en /metrics"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,127 @@
+"""
+Estado de salud calculado en segundo plano.
+
+Un hilo comprueba Azure periódicamente con una petición ligera y /health
+devuelve el último resultado al instante. Las síntesis reales también se
+registran: si hay tráfico reciente, la disponibilidad se deriva de sus
+éxitos y fallos y se evita la comprobación sintética. Solo se guardan las
+últimas max_samples síntesis de la ventana, así que la memoria y el coste de
+/health no crecen con el tráfico.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+
+class HealthMonitor:
+    """Estado de Azure refrescado en segundo plano a partir de sondas y tráfico real"""
+
+    def __init__(self, probe, interval=30.0, window=300.0, min_success_ratio=0.5, max_samples=1000):
+        self.probe = probe
+        self.interval = interval
+        self.window = window
+        self.min_success_ratio = min_success_ratio
+        self._outcomes = deque(maxlen=max_samples)  # (instante, éxito, latencia_s) de síntesis reales
+        self._last_probe = None   # {"ok", "latency", "checked_at", "error"}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        """Arranca el hilo de refresco (una vez por proceso, tras el fork de gunicorn)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="health-monitor", daemon=True).start()
+
+    def record(self, ok, latency):
+        """Registra el resultado de una síntesis real contra Azure"""
+        now = time.time()
+        with self._lock:
+            self._outcomes.append((now, ok, latency))
+            self._trim(now)
+        self.ensure_started()
+
+    def snapshot(self):
+        """Último estado conocido, sin llamar a Azure"""
+        self.ensure_started()
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            outcomes = list(self._outcomes)
+            probe = dict(self._last_probe) if self._last_probe else None
+
+        successes = [latency for _, ok, latency in outcomes if ok]
+        failures = len(outcomes) - len(successes)
+        traffic = {
+            "window_seconds": self.window,
+            "successes": len(successes),
+            "failures": failures,
+            "success_ratio": round(len(successes) / len(outcomes), 3) if outcomes else None,
+            "p50_latency_ms": round(sorted(successes)[len(successes) // 2] * 1000, 1) if successes else None,
+            "last_success_age_seconds": (round(now - max(t for t, ok, _ in outcomes if ok), 1)
+                                         if successes else None),
+        }
+
+        if outcomes:
+            available = len(successes) / len(outcomes) >= self.min_success_ratio
+            source = "traffic"
+        elif probe is not None:
+            available = probe["ok"]
+            source = "probe"
+        else:
+            available = None
+            source = None
+
+        checks = [t for t, _, _ in outcomes[-1:]] + ([probe["checked_at"]] if probe else [])
+        if source == "traffic":
+            latency_ms = traffic["p50_latency_ms"]
+        else:
+            latency_ms = round(probe["latency"] * 1000, 1) if probe and probe["ok"] else None
+
+        return {
+            "status": "starting" if available is None else ("ok" if available else "degraded"),
+            "azure_available": available,
+            "source": source,
+            "last_check_age_seconds": round(now - max(checks), 1) if checks else None,
+            "upstream_latency_ms": latency_ms,
+            "probe": {
+                "age_seconds": round(now - probe["checked_at"], 1),
+                "ok": probe["ok"],
+                "latency_ms": round(probe["latency"] * 1000, 1),
+                "error": probe["error"],
+            } if probe else None,
+            "recent_syntheses": traffic,
+        }
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _recent_success(self, now):
+        with self._lock:
+            return any(ok and now - t < self.interval for t, ok, _ in self._outcomes)
+
+    def _run(self):
+        while True:
+            now = time.time()
+            # Con éxitos reales recientes la sonda sintética sobra
+            if not self._recent_success(now):
+                self._probe_once()
+            time.sleep(self.interval)
+
+    def _probe_once(self):
+        start = time.perf_counter()
+        try:
+            self.probe()
+            result = {"ok": True, "error": None}
+        except Exception as e:
+            print(f"[!] Health check de Azure fallido: {e}")
+            result = {"ok": False, "error": str(e)}
+        result.update(latency=time.perf_counter() - start, checked_at=time.time())
+        with self._lock:
+            self._last_probe = result
@@ -0,0 +1,81 @@
+"""
+Peticiones de cobertura (hedging) contra Azure TTS.
+
+Si una síntesis no ha respondido cuando se cumple el percentil observado
+(p95 por defecto) del tiempo hasta las cabeceras de Azure, se lanza una
+segunda petición igual (al siguiente endpoint del pool, o al mismo si solo
+hay uno) y se usa la primera que responda bien. Cada síntesis suma
+`budget` créditos y cada cobertura gasta uno, así que como mucho se duplica
+esa fracción de las síntesis (con ráfagas de hasta `burst` coberturas).
+"""
+
+import threading
+from collections import deque
+
+
+class HedgePolicy:
+    """Cuándo lanzar una petición de cobertura y cuántas se permiten"""
+
+    def __init__(self, quantile=0.95, budget=0.05, min_delay=0.05, burst=10.0, min_samples=20, window=500,
+                 on_hedge=None):
+        self.quantile = quantile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.burst = burst
+        self.min_samples = min_samples
+        self.on_hedge = on_hedge      # (resultado: "won", "lost" o "budget")
+        self._samples = deque(maxlen=window)
+        self._credit = burst
+        self._stats = {"syntheses": 0, "won": 0, "lost": 0, "over_budget": 0}
+        self._lock = threading.Lock()
+
+    def observe(self, latency):
+        """Registra el tiempo hasta las cabeceras de una respuesta correcta de Azure"""
+        with self._lock:
+            self._samples.append(latency)
+
+    def delay(self):
+        """Segundos que se espera antes de cubrir una síntesis que empieza (None si aún no hay muestras)"""
+        with self._lock:
+            self._stats["syntheses"] += 1
+            self._credit = min(self.burst, self._credit + self.budget)
+            return self._delay()
+
+    def try_hedge(self):
+        """Gasta un crédito para lanzar una cobertura; False si se agotó el presupuesto"""
+        with self._lock:
+            allowed = self._credit >= 1.0
+            if allowed:
+                self._credit -= 1.0
+            else:
+                self._stats["over_budget"] += 1
+        if not allowed and self.on_hedge is not None:
+            self.on_hedge("budget")
+        return allowed
+
+    def record(self, won):
+        """Resultado de una cobertura lanzada: won si respondió antes que la petición original"""
+        outcome = "won" if won else "lost"
+        with self._lock:
+            self._stats[outcome] += 1
+        if self.on_hedge is not None:
+            self.on_hedge(outcome)
+
+    def stats(self):
+        with self._lock:
+            delay = self._delay()
+            return {
+                "quantile": self.quantile,
+                "budget": self.budget,
+                "delay_ms": round(delay * 1000, 1) if delay is not None else None,
+                "samples": len(self._samples),
+                "credit": round(self._credit, 2),
+                "hedged": self._stats["won"] + self._stats["lost"],
+                **self._stats,
+            }
+
+    def _delay(self):
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return max(self.min_delay, ordered[int(self.quantile * (len(ordered) - 1))])
@@ -0,0 +1,138 @@
+"""
+Métricas Prometheus del servicio (/metrics).
+
+Con varios workers de gunicorn cada proceso escribe sus métricas en ficheros
+mmap de PROMETHEUS_MULTIPROC_DIR y /metrics agrega los de todos los workers
+(gunicorn.conf.py limpia el directorio al arrancar y marca los workers que
+terminan). Sin esa variable se usa el registro del propio proceso.
+
+El ratio de aciertos de caché se obtiene de tts_cache_lookups_total, p. ej.:
+    sum(rate(tts_cache_lookups_total{result=~"hit.*"}[5m])) / sum(rate(tts_cache_lookups_total[5m]))
+"""
+
+import os
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+# prometheus_client decide el modo multiproceso al importarse
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge,  # noqa: E402
+                               Histogram, generate_latest, multiprocess)
+from prometheus_client import REGISTRY  # noqa: E402
+
+# Etapas internas: de milisegundos (cabeceras, Base64) a cientos (codificación local)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+REQUESTS = Counter(
+    "tts_requests_total", "Peticiones HTTP atendidas",
+    ["endpoint", "voice", "language", "status"])
+REQUEST_LATENCY = Histogram(
+    "tts_request_duration_seconds", "Tiempo de respuesta por endpoint (hasta el primer byte en streaming)",
+    ["endpoint"])
+IN_FLIGHT = Gauge(
+    "tts_requests_in_flight", "Peticiones en curso",
+    ["endpoint"], multiprocess_mode="livesum")
+UPSTREAM_LATENCY = Histogram(
+    "tts_azure_request_duration_seconds", "Latencia de las síntesis en Azure TTS por endpoint",
+    ["endpoint", "outcome"], buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 20.0))
+STAGE_LATENCY = Histogram(
+    "tts_stage_duration_seconds", "Duración de las etapas internas de la síntesis",
+    ["stage"], buckets=STAGE_BUCKETS)
+AUDIO_BYTES = Counter(
+    "tts_audio_bytes_out_total", "Bytes de audio enviados a los clientes",
+    ["endpoint", "format"])
+CACHE_LOOKUPS = Counter(
+    "tts_cache_lookups_total", "Consultas a la caché de síntesis por resultado",
+    ["result"])
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "tts_admission_queue_depth", "Síntesis esperando hueco contra Azure por prioridad",
+    ["priority"], multiprocess_mode="livesum")
+ADMISSION_ACTIVE = Gauge(
+    "tts_admission_active", "Síntesis en curso contra Azure (huecos ocupados)",
+    multiprocess_mode="livesum")
+ADMISSION_SHED = Counter(
+    "tts_admission_shed_total", "Síntesis rechazadas con 503 por el control de admisión",
+    ["priority", "reason"])
+# 0 cerrado, 1 semiabierto, 2 abierto: el máximo entre los workers vivos
+CIRCUIT_STATE = Gauge(
+    "tts_azure_circuit_state", "Estado del circuit breaker de Azure (0 cerrado, 1 semiabierto, 2 abierto)",
+    multiprocess_mode="livemax")
+CIRCUIT_REJECTED = Counter(
+    "tts_azure_circuit_rejected_total", "Síntesis rechazadas con 503 con el circuito de Azure abierto")
+HEDGES = Counter(
+    "tts_azure_hedges_total", "Peticiones de cobertura a Azure (won, lost) y las descartadas por presupuesto (budget)",
+    ["outcome"])
+# Con AZURE_AUTH_MODE=token: el máximo entre los workers vivos avisa de un token sin renovar
+TOKEN_AGE = Gauge(
+    "tts_azure_token_age_seconds", "Edad del token de Azure en uso (+Inf mientras se usa la clave)",
+    ["endpoint"], multiprocess_mode="livemax")
+TOKEN_REFRESH_LATENCY = Histogram(
+    "tts_azure_token_refresh_duration_seconds", "Latencia de las renovaciones del token de Azure (issueToken)",
+    ["endpoint", "outcome"], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+def observe_stage(name, seconds):
+    """Registra la duración de una etapa interna (decode, encode, join, base64, debug_write...)"""
+    STAGE_LATENCY.labels(name).observe(seconds)
+
+
+def observe_upstream(status_code, latency, endpoint):
+    """Registra un intento de síntesis en Azure (status_code None si no hubo respuesta)"""
+    UPSTREAM_LATENCY.labels(endpoint, "error" if status_code is None else str(status_code)).observe(latency)
+
+
+def observe_cache(cache_status):
+    """Registra el resultado de una consulta a la caché ('HIT-memory', 'MISS', 'COALESCED'...)"""
+    CACHE_LOOKUPS.labels(cache_status.lower().replace("-", "_")).inc()
+
+
+def observe_token_refresh(endpoint, ok, seconds):
+    TOKEN_REFRESH_LATENCY.labels(endpoint, "ok" if ok else "error").observe(seconds)
+
+
+def observe_token_ages(ages):
+    """Publica la edad del token de cada endpoint (None = se usa la clave)"""
+    for endpoint, age in ages.items():
+        TOKEN_AGE.labels(endpoint).set(float("inf") if age is None else age)
+
+
+def observe_admission(depths, active):
+    """Publica la cola por prioridad y los huecos ocupados del control de admisión"""
+    for priority, depth in depths.items():
+        ADMISSION_QUEUE_DEPTH.labels(priority).set(depth)
+    ADMISSION_ACTIVE.set(active)
+
+
+def observe_shed(priority, reason):
+    ADMISSION_SHED.labels(priority, reason).inc()
+
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def observe_circuit(state):
+    CIRCUIT_STATE.set(CIRCUIT_STATES[state])
+
+
+def observe_circuit_rejected():
+    CIRCUIT_REJECTED.inc()
+
+
+def observe_hedge(outcome):
+    HEDGES.labels(outcome).inc()
+
+
+def observe_audio_out(endpoint, output_format, size):
+    AUDIO_BYTES.labels(endpoint, output_format).inc(size)
+
+
+def render():
+    """Devuelve (cuerpo, content_type) con las métricas de todos los workers"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
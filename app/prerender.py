@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pre-renderizado de frases fijas en la caché del servicio.
+
+Lee un manifiesto JSON (lista) o JSONL con objetos de la misma forma que el
+cuerpo de /synthesize_json y sintetiza con concurrencia acotada todo lo que
+falte en el almacén en disco (CACHE_DIR), que comparten todos los workers.
+Las entradas ya presentes se saltan, de modo que relanzar el comando tras
+un fallo continúa donde se quedó. Los elementos que fallen se escriben en
+--failures para poder reintentarlos.
+
+Uso:
+    CACHE_DIR=/app/audio_store python prerender.py manifest.jsonl --concurrency 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+os.environ.setdefault("DEBUG_AUDIO", "false")
+# La concurrencia la limita --concurrency: sin control de admisión no se descartan frases
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+import app as service  # noqa: E402
+
+
+def load_manifest(path):
+    """Devuelve la lista de elementos del manifiesto (JSON o JSONL)"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def is_prerendered(params):
+    """True si todos los segmentos de la petición ya están en caché"""
+    output_format = service.native_format(params["output_format"])
+    segments = service.synthesis_segments(params["text"], params["split_sentences"], output_format)
+    return all(service.is_audio_cached(segment, params["language"], params["voice"], params["speed"],
+                                       output_format)
+               for segment in segments)
+
+
+def render(params, retries):
+    """Sintetiza un elemento con reintentos; devuelve el número de bytes de audio"""
+    for attempt in range(retries + 1):
+        try:
+            audio_bytes, _, _ = service.synthesize_params(params)
+            return len(audio_bytes)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-renderiza un manifiesto de frases en la caché en disco")
+    parser.add_argument("manifest", help="Fichero JSON (lista) o JSONL con cuerpos de /synthesize_json")
+    parser.add_argument("--concurrency", type=int, default=8, help="Síntesis simultáneas contra Azure")
+    parser.add_argument("--retries", type=int, default=2, help="Reintentos por elemento")
+    parser.add_argument("--failures", default="prerender_failures.jsonl",
+                        help="Fichero JSONL donde se guardan los elementos fallidos")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Segundos entre informes de progreso")
+    args = parser.parse_args()
+
+    if service.audio_store is None:
+        print("[!] El pre-renderizado necesita el almacén en disco: define CACHE_ENABLED=true y CACHE_DIR")
+        return 2
+
+    items = load_manifest(args.manifest)
+    pending, invalid = [], []
+    for item in items:
+        try:
+            params = service.parse_synthesis_request(item)
+        except (ValueError, TypeError, AttributeError) as e:
+            invalid.append({**item, "error": str(e)} if isinstance(item, dict) else {"item": item, "error": str(e)})
+            continue
+        if not is_prerendered(params):
+            pending.append((item, params))
+
+    skipped = len(items) - len(pending) - len(invalid)
+    print(f"[*] Manifiesto: {len(items)} elementos, {skipped} ya en caché, {len(invalid)} inválidos, "
+          f"{len(pending)} pendientes (concurrencia {args.concurrency})")
+
+    failures = list(invalid)
+    done = rendered_bytes = 0
+    start = last_report = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {pool.submit(render, params, args.retries): item for item, params in pending}
+        for future in as_completed(futures):
+            done += 1
+            try:
+                rendered_bytes += future.result()
+            except Exception as e:
+                print(f"[!] Error en '{futures[future].get('text', '')[:50]}': {e}")
+                failures.append({**futures[future], "error": str(e)})
+
+            now = time.perf_counter()
+            if now - last_report >= args.progress_every or done == len(pending):
+                last_report = now
+                rate = done / (now - start)
+                eta = (len(pending) - done) / rate if rate else 0
+                print(f"[*] {done}/{len(pending)} ({done * 100 // len(pending)}%) · {rate:.1f} frases/s · "
+                      f"{rendered_bytes / (1024 * 1024):.1f} MB · errores {len(failures) - len(invalid)} · "
+                      f"ETA {eta:.0f}s")
+
+    elapsed = time.perf_counter() - start
+    if failures:
+        with open(args.failures, "w", encoding="utf-8") as f:
+            for failure in failures:
+                f.write(json.dumps(failure, ensure_ascii=False) + "\n")
+        print(f"[!] {len(failures)} elementos fallidos guardados en {args.failures} "
+              f"(relanzar con ese fichero para reintentarlos)")
+
+    print(f"[*] Pre-renderizado completado: {done - (len(failures) - len(invalid))} frases en {elapsed:.1f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Coalescencia de peticiones idénticas en vuelo (single-flight).
+
+Las peticiones concurrentes con la misma clave esperan a una única llamada a
+Azure y comparten su resultado. Opcionalmente se coordina entre workers de
+gunicorn con un lock de fichero por clave en el directorio de la caché en
+disco: claves distintas no se esperan entre sí.
+"""
+
+import asyncio
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from admission import Overloaded
+
+# Espera entre intentos del lock de fichero cuando la petición tiene plazo
+LOCK_POLL_MIN = 0.005
+LOCK_POLL_MAX = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplica llamadas concurrentes con la misma clave dentro del proceso"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"upstream_calls": 0, "coalesced": 0, "cross_worker_coalesced": 0}
+
+    def do(self, key, func):
+        """Ejecuta func una sola vez por clave en vuelo; devuelve (resultado, compartido)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self.record("coalesced")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def record(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def stats(self):
+        """Llamadas a Azure realizadas y ahorradas por coalescencia"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        stats["upstream_calls_saved"] = stats["coalesced"] + stats["cross_worker_coalesced"]
+        return stats
+
+
+class AsyncSingleFlight:
+    """Variante asyncio de SingleFlight; comparte contadores con una instancia síncrona"""
+
+    def __init__(self, stats_owner):
+        self._calls = {}
+        self._stats_owner = stats_owner
+
+    async def do(self, key, coro_func):
+        """Espera a la llamada en vuelo con la misma clave o la lanza; devuelve (resultado, compartido)"""
+        future = self._calls.get(key)
+        if future is not None:
+            self._stats_owner.record("coalesced")
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await coro_func()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita el aviso de excepción no recuperada si no hay seguidores
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+
+
+class FileKeyLocks:
+    """Un lock de fichero por clave para coordinar workers
+
+    El fichero se borra al soltar el lock (con el lock tomado) para que no
+    se acumulen; quien esperaba en el fichero borrado lo detecta al
+    conseguirlo y vuelve a abrir el actual.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def hold(self, key, deadline=None):
+        """Bloquea (exclusivo) la clave
+
+        Con deadline (instante de time.monotonic()) se reintenta sin bloquear
+        hasta el plazo y después se lanza Overloaded; sin él se espera a que
+        termine quien lo tiene.
+        """
+        path = os.path.join(self.directory, key[:2], f"{key}.lock")
+        fd = self._acquire(path, deadline)
+        try:
+            yield
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _acquire(self, path, deadline):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        delay = LOCK_POLL_MIN
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if deadline is None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            break
+                        except BlockingIOError:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                raise Overloaded("deadline", 1)
+                            time.sleep(min(delay, remaining))
+                            delay = min(delay * 2, LOCK_POLL_MAX)
+                held, current = os.fstat(fd), os.stat(path)
+                if (held.st_dev, held.st_ino) == (current.st_dev, current.st_ino):
+                    return fd
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                os.close(fd)
+                raise
+            # El fichero se borró mientras se esperaba: se suelta y se abre el nuevo
+            os.close(fd)
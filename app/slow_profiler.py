@@ -0,0 +1,195 @@
+"""
+Profiler por muestreo de las peticiones lentas.
+
+Mientras está activado, un hilo toma cada pocos milisegundos la pila de los
+hilos que están atendiendo una petición (sys._current_frames). Al terminar
+una petición que supera el umbral, sus muestras se escriben en el directorio
+de volcados en formato "collapsed stacks" (una pila por línea con su número
+de muestras), que se puede abrir con flamegraph.pl o speedscope.
+
+La configuración vive en <directorio>/profiler.json: cambiarla (a mano o con
+POST /debug/profiler) la aplica en todos los workers sin reiniciar.
+
+Se muestrea el hilo que ejecuta la petición en Flask. En el modo asíncrono
+(async_app.py) ese es el hilo del pool que ejecuta la llamada WSGI delegada,
+y solo hasta que la vista devuelve la respuesta: después el hilo atiende
+otras peticiones y detach() deja de muestrearlo. La parte en corrutinas
+(la síntesis previa contra Azure y el streaming directo) no se perfila,
+porque el bucle de eventos comparte un hilo entre todas las peticiones y su
+pila no es la de ninguna de ellas.
+"""
+
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+CONTROL_FILE = "profiler.json"
+# Cada cuánto se relee el fichero de control
+CONTROL_CHECK_INTERVAL = 1.0
+
+
+class SlowRequestProfiler:
+    """Muestreo de pilas de las peticiones en curso y volcado de las lentas"""
+
+    def __init__(self, directory, enabled=False, threshold_ms=1000, interval_ms=5, max_dumps=200):
+        self.directory = directory
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.max_dumps = max_dumps
+        self._lock = threading.Lock()
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._active = {}  # clave de la petición -> (ident del hilo, Counter de pilas)
+        self._keys = itertools.count()
+        self._control_mtime = None
+        self._control_checked = 0.0
+        self._stats = {"profiled": 0, "dumped": 0, "samples": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load_control()
+
+    def begin(self):
+        """Empieza a muestrear el hilo actual; devuelve un token o None si está desactivado"""
+        self._check_control()
+        if not self.enabled:
+            return None
+        self.ensure_started()
+        # Clave propia por petición: un hilo del pool puede empezar otra antes
+        # de que termine la anterior (respuestas en streaming del modo asíncrono)
+        key = next(self._keys)
+        samples = Counter()
+        with self._lock:
+            self._active[key] = (threading.get_ident(), samples)
+        self._wakeup.set()
+        return key, time.perf_counter(), samples
+
+    def detach(self, token):
+        """Deja de muestrear el hilo de la petición, que sigue contando para end()"""
+        if token is not None:
+            with self._lock:
+                self._active.pop(token[0], None)
+
+    def end(self, token, label):
+        """Deja de muestrear; si la petición fue lenta vuelca sus pilas y devuelve el fichero"""
+        if token is None:
+            return None
+        key, start, samples = token
+        with self._lock:
+            self._active.pop(key, None)
+            self._stats["profiled"] += 1
+            samples = Counter(samples)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms < self.threshold_ms or not samples:
+            return None
+        return self._dump(label, elapsed_ms, samples)
+
+    def configure(self, **settings):
+        """Guarda la configuración en el fichero de control (la aplican todos los workers)"""
+        control = {key: getattr(self, key) for key in ("enabled", "threshold_ms", "interval_ms")}
+        control.update({key: value for key, value in settings.items() if key in control})
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(control, f)
+        os.replace(tmp_path, os.path.join(self.directory, CONTROL_FILE))
+        self._load_control()
+
+    def dumps(self):
+        """Volcados existentes, del más reciente al más antiguo"""
+        names = [name for name in os.listdir(self.directory) if name.endswith(".collapsed")]
+        return sorted(names, reverse=True)
+
+    def ensure_started(self):
+        """Arranca el hilo de muestreo (una vez por proceso, tras el fork de gunicorn)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="slow-profiler", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active"] = len(self._active)
+        stats.update(enabled=self.enabled, threshold_ms=self.threshold_ms,
+                     interval_ms=self.interval_ms, directory=self.directory)
+        return stats
+
+    def _run(self):
+        while True:
+            self._check_control()
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                # Sin peticiones que muestrear se espera a la siguiente
+                self._wakeup.wait(CONTROL_CHECK_INTERVAL)
+                self._wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            stacks = [(samples, collapse_stack(frames[ident])) for ident, samples in active if ident in frames]
+            # Las muestras se suman con el lock: end() las copia con él antes de volcarlas
+            with self._lock:
+                for samples, stack in stacks:
+                    samples[stack] += 1
+                self._stats["samples"] += len(active)
+            time.sleep(self.interval_ms / 1000)
+
+    def _dump(self, label, elapsed_ms, samples):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        filename = f"{timestamp}_{label}_{elapsed_ms:.0f}ms.collapsed"
+        lines = [f"{stack} {count}" for stack, count in samples.most_common()]
+        try:
+            with open(os.path.join(self.directory, filename), "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"[!] No se pudo guardar el perfil {filename}: {e}")
+            return None
+        with self._lock:
+            self._stats["dumped"] += 1
+        print(f"[*] Petición lenta ({elapsed_ms:.0f} ms): perfil guardado en {filename}")
+
+        # Retención: solo se recorre el directorio al volcar (peticiones lentas)
+        for name in self.dumps()[self.max_dumps:]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return filename
+
+    def _check_control(self):
+        now = time.monotonic()
+        if now - self._control_checked >= CONTROL_CHECK_INTERVAL:
+            self._control_checked = now
+            self._load_control()
+
+    def _load_control(self):
+        path = os.path.join(self.directory, CONTROL_FILE)
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime == self._control_mtime:
+                return
+            with open(path, encoding="utf-8") as f:
+                control = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._control_mtime = mtime
+        self.enabled = bool(control.get("enabled", self.enabled))
+        self.threshold_ms = float(control.get("threshold_ms", self.threshold_ms))
+        self.interval_ms = max(1.0, float(control.get("interval_ms", self.interval_ms)))
+
+
+def collapse_stack(frame):
+    """Pila en formato collapsed: 'fichero:función;...' de la raíz a la hoja"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
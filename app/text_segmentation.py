@@ -0,0 +1,89 @@
+"""
+Segmentación de textos largos en español por frases y cláusulas.
+"""
+
+import re
+
+# Abreviaturas habituales que no cierran frase
+ABBREVIATIONS = {
+    "sr", "sra", "srta", "dr", "dra", "ud", "uds", "vd", "vds", "lic", "ing",
+    "prof", "etc", "pág", "págs", "núm", "nº", "art", "aprox", "tel", "av",
+    "avda", "dpto", "depto", "cía", "ej", "vol", "cap", "máx", "mín",
+}
+
+# Fin de frase: puntuación final seguida de espacio (y opcionalmente comillas o paréntesis)
+SENTENCE_END = re.compile(r"""([.!?…;]+["'»)\]]*)\s+""")
+
+# Límites de cláusula para frases demasiado largas
+CLAUSE_END = re.compile(r"""([,:—–]["'»)\]]*)\s+""")
+
+
+def _ends_with_abbreviation(fragment):
+    words = fragment.rstrip(".").rsplit(None, 1)
+    if not words:
+        return False
+    last = words[-1].lower().lstrip("¿¡(\"'«")
+    return last in ABBREVIATIONS or (len(last) == 1 and last.isalpha())
+
+
+def _split_with(pattern, text, check_abbreviations=False):
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        end = match.end(1)
+        fragment = text[start:end]
+        punctuation = match.group(1).rstrip("\"'»)]")
+        if check_abbreviations and punctuation == "." and _ends_with_abbreviation(fragment):
+            continue
+        pieces.append(fragment.strip())
+        start = match.end()
+    pieces.append(text[start:].strip())
+    return [piece for piece in pieces if piece]
+
+
+def _split_long(sentence, max_chars):
+    """Divide una frase larga por cláusulas y, si hace falta, por palabras"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+
+    parts = []
+    for clause in _split_with(CLAUSE_END, sentence):
+        if len(clause) <= max_chars:
+            parts.append(clause)
+            continue
+
+        current = ""
+        for word in clause.split():
+            if current and len(current) + 1 + len(word) > max_chars:
+                parts.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            parts.append(current)
+
+    # Reagrupar cláusulas cortas contiguas hasta el tamaño máximo
+    merged = []
+    for part in parts:
+        if merged and len(merged[-1]) + 1 + len(part) <= max_chars:
+            merged[-1] = f"{merged[-1]} {part}"
+        else:
+            merged.append(part)
+    return merged
+
+
+def split_text(text, max_chars=250, min_chars=40):
+    """Divide un texto en segmentos de como mucho max_chars respetando frases y cláusulas
+
+    Las frases más cortas que min_chars se agrupan con la siguiente para no
+    multiplicar las llamadas a Azure con fragmentos mínimos.
+    """
+    text = " ".join(text.split())
+    segments = []
+    for sentence in _split_with(SENTENCE_END, text, check_abbreviations=True):
+        for part in _split_long(sentence, max_chars):
+            if segments and len(segments[-1]) < min_chars and len(segments[-1]) + 1 + len(part) <= max_chars:
+                segments[-1] = f"{segments[-1]} {part}"
+            else:
+                segments.append(part)
+    return segments
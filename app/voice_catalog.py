@@ -0,0 +1,218 @@
+"""
+Catálogo de voces de Azure TTS.
+
+Se obtiene de voices/list, se guarda un snapshot en disco para arrancar sin
+conexión y se refresca en segundo plano. Cada versión del catálogo se indexa
+una sola vez (locale -> género -> voces, conjunto para validar voces, mapa de
+códigos cortos) junto con las respuestas de /voices ya serializadas.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def parse_voice_list(entries, locale_prefixes=()):
+    """Agrupa la respuesta de voices/list por locale y género con el nombre corto de cada voz"""
+    voices = {}
+    for entry in entries:
+        locale = entry.get("Locale", "")
+        short_name = entry.get("ShortName", "")
+        gender = entry.get("Gender", "").lower()
+        # El SSML usa '<locale>-<voz>Neural': solo sirven las voces neuronales
+        if not short_name.startswith(f"{locale}-") or not short_name.endswith("Neural"):
+            continue
+        if gender not in ("female", "male"):
+            continue
+        if locale_prefixes and not locale.lower().startswith(tuple(locale_prefixes)):
+            continue
+        name = short_name[len(locale) + 1:-len("Neural")]
+        voices.setdefault(locale, {"female": [], "male": []})[gender].append(name)
+    return voices
+
+
+class VoiceIndex:
+    """Versión inmutable del catálogo con sus índices y respuestas precalculadas"""
+
+    def __init__(self, voices, source, updated_at, default_language, default_voices, aliases):
+        self.source = source
+        self.updated_at = updated_at
+
+        self.voices = {}
+        for locale in sorted(voices):
+            female = sorted(voices[locale].get("female", []))
+            male = sorted(voices[locale].get("male", []))
+            if not female and not male:
+                continue
+            preferred = default_voices.get(locale)
+            if preferred not in female and preferred not in male:
+                preferred = female[0] if female else male[0]
+            self.voices[locale] = {"female": female, "male": male, "default": preferred}
+
+        self.voice_set = frozenset(
+            (locale, name)
+            for locale, data in self.voices.items()
+            for name in data["female"] + data["male"]
+        )
+        self.voice_names = frozenset(name for _, name in self.voice_set)
+        self.language_map = self._build_language_map(aliases)
+        # Locale al que se recurre si el solicitado no existe en el catálogo
+        self.default_language = default_language if default_language in self.voices else next(iter(self.voices))
+        self.total_voices = len(self.voice_set)
+
+        model = "azure-tts"
+        self.all_response = json.dumps({
+            "voices_by_language": self.voices,
+            "language_map": self.language_map,
+            "default_language": default_language,
+            "default_voice": default_voices.get(default_language),
+            "total_voices": self.total_voices,
+            "catalog_source": source,
+            "catalog_updated_at": updated_at,
+            "model": model,
+        }, sort_keys=True).encode("utf-8")
+        self.locale_responses = {
+            locale: json.dumps({
+                "language": locale,
+                "voices": data,
+                "total": len(data["female"]) + len(data["male"]),
+                "model": model,
+            }, sort_keys=True).encode("utf-8")
+            for locale, data in self.voices.items()
+        }
+
+    def _build_language_map(self, aliases):
+        language_map = {locale.lower(): locale for locale in self.voices}
+        for locale in self.voices:
+            language = locale.split("-")[0].lower()
+            # 'fr' -> 'fr-FR' si existe; si no, el primer locale del idioma
+            canonical = f"{language}-{language.upper()}"
+            language_map.setdefault(language, canonical if canonical in self.voices else locale)
+        for alias, locale in aliases.items():
+            if locale in self.voices:
+                language_map[alias.lower()] = locale
+        return dict(sorted(language_map.items()))
+
+
+class VoiceCatalog:
+    """Catálogo de voces con snapshot en disco y refresco en segundo plano"""
+
+    def __init__(self, fetch, builtin_voices, aliases, default_language, default_voice,
+                 snapshot_path=None, refresh_interval=3600.0, locale_prefixes=()):
+        self.fetch = fetch
+        self.aliases = aliases
+        self.default_language = default_language
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.locale_prefixes = tuple(prefix.lower() for prefix in locale_prefixes)
+        # Voz por defecto preferida de cada locale (si existe en el catálogo)
+        self.default_voices = {locale: data.get("default") for locale, data in builtin_voices.items()}
+        self.default_voices[default_language] = default_voice
+        self._lock = threading.Lock()
+        self._pid = None
+
+        snapshot = self._read_snapshot()
+        if snapshot is not None:
+            self.index = self._build(snapshot["voices"], "snapshot", snapshot["updated_at"])
+        else:
+            self.index = self._build(builtin_voices, "builtin", None)
+
+    def _build(self, voices, source, updated_at):
+        return VoiceIndex(voices, source, updated_at, self.default_language,
+                          self.default_voices, self.aliases)
+
+    def ensure_started(self):
+        """Arranca el hilo de refresco (una vez por proceso, tras el fork de gunicorn)"""
+        if self.refresh_interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="voice-catalog", daemon=True).start()
+
+    def refresh(self):
+        """Descarga el catálogo de Azure, lo indexa y guarda el snapshot"""
+        voices = parse_voice_list(self.fetch(), self.locale_prefixes)
+        if not voices:
+            raise ValueError("Azure devolvió un catálogo de voces vacío")
+        updated_at = time.time()
+        # Sustituir la referencia es atómico: las peticiones ven un índice completo
+        self.index = self._build(voices, "azure", updated_at)
+        self._write_snapshot({"updated_at": updated_at, "voices": voices})
+        print(f"[*] Catálogo de voces actualizado: {self.index.total_voices} voces, "
+              f"{len(self.index.voices)} locales")
+
+    def normalize_language(self, language):
+        """Resuelve códigos cortos ('es', 'es-mx') al locale del catálogo"""
+        return self.index.language_map.get(language.lower(), language)
+
+    def metric_labels(self, language, voice):
+        """Idioma y voz para las etiquetas de métricas: 'other' si no están en el catálogo
+
+        El idioma llega del cliente: sin esto cada valor inventado crearía una
+        serie nueva en Prometheus.
+        """
+        index = self.index
+        return (language if not language or language in index.voices else "other",
+                voice if not voice or voice in index.voice_names else "other")
+
+    def resolve_voice(self, language, voice=None, gender_preference=None):
+        """Selecciona la voz según el idioma y las preferencias"""
+        self.ensure_started()
+        index = self.index
+        language = index.language_map.get(language.lower(), language)
+        if language not in index.voices:
+            language = index.default_language
+
+        if voice and (language, voice) in index.voice_set:
+            return voice
+
+        lang_voices = index.voices[language]
+        if gender_preference in ("female", "male") and lang_voices[gender_preference]:
+            return lang_voices[gender_preference][0]
+
+        return lang_voices["default"]
+
+    def _run(self):
+        if not self._snapshot_is_fresh():
+            self._refresh_safely()
+        while True:
+            time.sleep(self.refresh_interval)
+            self._refresh_safely()
+
+    def _refresh_safely(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"[!] No se pudo actualizar el catálogo de voces ({self.index.source} en uso): {e}")
+
+    def _snapshot_is_fresh(self):
+        updated_at = self.index.updated_at
+        return updated_at is not None and time.time() - updated_at < self.refresh_interval
+
+    def _read_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            return snapshot if snapshot.get("voices") else None
+        except (OSError, ValueError) as e:
+            print(f"[!] Snapshot del catálogo de voces ilegible: {e}")
+            return None
+
+    def _write_snapshot(self, snapshot):
+        if not self.snapshot_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"[!] No se pudo guardar el snapshot del catálogo de voces: {e}")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Stub local del endpoint de Azure TTS para pruebas y benchmarks sin red.
+Devuelve audio sintético en el formato pedido en X-Microsoft-OutputFormat
+y permite simular la latencia del servicio (con jitter), el coste del
+handshake TLS, la generación progresiva del audio (chunks espaciados en el
+tiempo), una fracción de síntesis mucho más lentas (cola de latencia) y una
+tasa de errores (429 con Retry-After o 5xx). También emite
+tokens en /sts/v1.0/issueToken y acepta la clave o un token emitido por él.
+"""
+
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import soundfile as sf
+
+SECONDS_PER_CHAR = 0.06
+CHUNK_SIZE = 4800
+
+STUB_VOICES = [
+    {"ShortName": "es-ES-AbrilNeural", "Locale": "es-ES", "Gender": "Female"},
+    {"ShortName": "es-ES-ElviraNeural", "Locale": "es-ES", "Gender": "Female"},
+    {"ShortName": "es-ES-AlvaroNeural", "Locale": "es-ES", "Gender": "Male"},
+    {"ShortName": "es-MX-DaliaNeural", "Locale": "es-MX", "Gender": "Female"},
+    {"ShortName": "es-MX-JorgeNeural", "Locale": "es-MX", "Gender": "Male"},
+]
+
+
+def render_audio(output_format, duration):
+    """Genera un tono en el formato de salida de Azure indicado"""
+    match = re.search(r"(\d+)khz", output_format)
+    sample_rate = int(match.group(1)) * 1000 if match else 24000
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    samples = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+    subtype = "ULAW" if output_format.endswith("mulaw") else "ALAW" if output_format.endswith("alaw") else "PCM_16"
+    buffer = io.BytesIO()
+    if output_format.endswith("mp3"):
+        sf.write(buffer, samples, sample_rate, format="MP3")
+    elif output_format.endswith("opus"):
+        sf.write(buffer, samples, 48000 if sample_rate > 24000 else sample_rate, format="OGG", subtype="OPUS")
+    elif output_format.startswith("riff"):
+        sf.write(buffer, samples, sample_rate, format="WAV", subtype=subtype)
+    else:
+        sf.write(buffer, samples, sample_rate, format="RAW", subtype=subtype)
+    return buffer.getvalue()
+
+
+class AzureStubHandler(BaseHTTPRequestHandler):
+    """Responde como el endpoint REST de Azure TTS"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # Cada conexión nueva paga el coste simulado del handshake
+        config = self.server.stub_config
+        with self.server.stub_lock:
+            self.server.stub_stats["connections"] += 1
+        if config["handshake_ms"]:
+            time.sleep(config["handshake_ms"] / 1000.0)
+        super().setup()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type, chunk_delay_ms=0):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not chunk_delay_ms:
+            self.wfile.write(body)
+            return
+
+        for start in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[start:start + CHUNK_SIZE])
+            self.wfile.flush()
+            time.sleep(chunk_delay_ms / 1000.0)
+
+    def do_GET(self):
+        if self.path.endswith("/voices/list"):
+            self._send(200, json.dumps(STUB_VOICES).encode("utf-8"), "application/json")
+        else:
+            self._send(404, b"", "text/plain")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        ssml = self.rfile.read(length).decode("utf-8")
+
+        if self.path.endswith("/sts/v1.0/issueToken"):
+            if not self.headers.get("Ocp-Apim-Subscription-Key"):
+                self._send(401, b"", "text/plain")
+                return
+            token = uuid.uuid4().hex
+            with self.server.stub_lock:
+                self.server.stub_tokens.add(token)
+                self.server.stub_stats["tokens_issued"] += 1
+            self._send(200, token.encode("ascii"), "application/jwt")
+            return
+
+        if not self.path.endswith("/cognitiveservices/v1"):
+            self._send(404, b"", "text/plain")
+            return
+
+        authorization = self.headers.get("Authorization", "")
+        with self.server.stub_lock:
+            if authorization.startswith("Bearer "):
+                authorized = authorization[len("Bearer "):] in self.server.stub_tokens
+                self.server.stub_stats["bearer_requests"] += 1
+            else:
+                authorized = bool(self.headers.get("Ocp-Apim-Subscription-Key"))
+                self.server.stub_stats["key_requests"] += 1
+        if not authorized:
+            self._send(401, b"", "text/plain")
+            return
+
+        config = self.server.stub_config
+        with self.server.stub_lock:
+            self.server.stub_stats["requests"] += 1
+            # Un único generador con semilla: las ejecuciones son reproducibles
+            rng = self.server.stub_random
+            jitter_ms = rng.expovariate(1.0 / config["jitter_ms"]) if config["jitter_ms"] else 0.0
+            error = rng.random() < config["error_rate"]
+            slow_ms = config["slow_ms"] if rng.random() < config["slow_rate"] else 0.0
+            if error:
+                self.server.stub_stats["errors"] += 1
+        latency_ms = config["latency_ms"] + jitter_ms + slow_ms
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+
+        if error:
+            status = config["error_status"]
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        text = re.sub(r"<[^>]+>", "", ssml).strip()
+        duration = round(max(0.5, len(text) * SECONDS_PER_CHAR), 1)
+        output_format = self.headers.get("X-Microsoft-OutputFormat", "riff-24khz-16bit-mono-pcm")
+
+        cache_key = (output_format, duration)
+        audio = self.server.stub_audio.get(cache_key)
+        if audio is None:
+            audio = render_audio(output_format, duration)
+            self.server.stub_audio[cache_key] = audio
+
+        content_type = "audio/mpeg" if output_format.endswith("mp3") else "audio/x-wav"
+        self._send(200, audio, content_type, config["chunk_delay_ms"])
+
+
+def make_server(host="127.0.0.1", port=0, latency_ms=0, handshake_ms=0, chunk_delay_ms=0,
+                jitter_ms=0, error_rate=0.0, error_status=503, seed=0, slow_rate=0.0, slow_ms=0):
+    """Crea el servidor stub (port=0 elige un puerto libre)
+
+    jitter_ms es la media de un retardo exponencial que se suma a latency_ms
+    (cola larga como la de un servicio real); slow_rate es la fracción de
+    síntesis que tardan además slow_ms; error_rate es la fracción de
+    síntesis que responden error_status.
+    """
+    server = ThreadingHTTPServer((host, port), AzureStubHandler)
+    server.daemon_threads = True
+    server.stub_config = {
+        "latency_ms": latency_ms,
+        "handshake_ms": handshake_ms,
+        "chunk_delay_ms": chunk_delay_ms,
+        "jitter_ms": jitter_ms,
+        "error_rate": error_rate,
+        "error_status": error_status,
+        "slow_rate": slow_rate,
+        "slow_ms": slow_ms,
+    }
+    server.stub_stats = {"connections": 0, "requests": 0, "errors": 0,
+                         "tokens_issued": 0, "bearer_requests": 0, "key_requests": 0}
+    server.stub_tokens = set()
+    server.stub_random = random.Random(seed)
+    server.stub_lock = threading.Lock()
+    server.stub_audio = {}
+    return server
+
+
+def serve_in_thread(**kwargs):
+    """Arranca el stub en un hilo y devuelve (server, base_url)"""
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub local de Azure TTS")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--handshake-ms", type=float, default=0)
+    parser.add_argument("--chunk-delay-ms", type=float, default=0,
+                        help="Pausa entre chunks de audio para simular generación progresiva")
+    parser.add_argument("--jitter-ms", type=float, default=0,
+                        help="Media del retardo exponencial añadido a la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de síntesis que fallan")
+    parser.add_argument("--error-status", type=int, default=503, help="Código de los errores simulados (429, 500, 503...)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fracción de síntesis lentas")
+    parser.add_argument("--slow-ms", type=float, default=0, help="Retardo añadido a las síntesis lentas")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del jitter y los errores")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.handshake_ms, args.chunk_delay_ms,
+                         args.jitter_ms, args.error_rate, args.error_status, args.seed, args.slow_rate,
+                         args.slow_ms)
+    print(f"[*] Stub de Azure TTS escuchando en http://{args.host}:{args.port}")
+    print(f"[*] Usar AZURE_TTS_ENDPOINT=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ruta anterior (MP3 -> fichero temporal -> librosa -> WAV) frente a
+la ruta directa (RIFF PCM de Azure reenviado sin decodificar).
+Mide tiempo de CPU y pico de memoria por petición.
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from audio_utils import parse_wav_header  # noqa: E402
+from azure_stub import render_audio  # noqa: E402
+
+
+def legacy_path(mp3_bytes):
+    """Ruta anterior: MP3 a disco, decodificación con librosa y recodificación a WAV"""
+    import librosa
+
+    temp_mp3 = tempfile.mktemp(suffix=".mp3")
+    with open(temp_mp3, "wb") as f:
+        f.write(mp3_bytes)
+    audio_data, sample_rate = librosa.load(temp_mp3, sr=24000)
+    os.unlink(temp_mp3)
+
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, sample_rate, format="WAV")
+    return buffer.getvalue()
+
+
+def direct_path(riff_bytes):
+    """Ruta directa: solo se lee la cabecera WAV"""
+    parse_wav_header(riff_bytes)
+    return riff_bytes
+
+
+def measure(func, payload, iterations):
+    func(payload)  # calentamiento (imports y cachés)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        func(payload)
+    cpu_ms = (time.process_time() - cpu_start) * 1000 / iterations
+    wall_ms = (time.perf_counter() - wall_start) * 1000 / iterations
+
+    tracemalloc.start()
+    func(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, wall_ms, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duración del audio de prueba")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    mp3_bytes = render_audio("audio-24khz-160kbitrate-mono-mp3", args.seconds)
+    riff_bytes = render_audio("riff-24khz-16bit-mono-pcm", args.seconds)
+
+    print(f"[*] Audio de {args.seconds}s, {args.iterations} iteraciones")
+    print(f"{'ruta':<10} {'CPU/petición':>14} {'tiempo/petición':>17} {'pico memoria':>14}")
+    for name, func, payload in (("mp3", legacy_path, mp3_bytes), ("riff-pcm", direct_path, riff_bytes)):
+        cpu_ms, wall_ms, peak = measure(func, payload, args.iterations)
+        print(f"{name:<10} {cpu_ms:>11.2f} ms {wall_ms:>14.2f} ms {peak / 1024:>11.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
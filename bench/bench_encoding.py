@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark de /synthesize_json: JSON con Base64 frente a multipart y binario.
+Mide tamaño en la red, tiempo por petición y pico de memoria con el audio ya
+en caché, de modo que solo cuenta el coste de construir la respuesta.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from azure_stub import SECONDS_PER_CHAR, serve_in_thread  # noqa: E402
+
+MODES = {
+    "json (base64)": "application/json",
+    "multipart": "multipart/mixed",
+    "binario": "audio/wav",
+}
+
+
+def load_app(base_url):
+    os.environ.update(
+        AZURE_TTS_KEY="stub",
+        AZURE_TTS_REGION="stub",
+        AZURE_TTS_ENDPOINT=base_url,
+        DEBUG_AUDIO="false",
+    )
+    import app as service
+    return service.app.test_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duración del audio de prueba")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    _, base_url = serve_in_thread()
+    client = load_app(base_url)
+    payload = {"text": "a" * int(args.seconds / SECONDS_PER_CHAR)}
+    client.post("/synthesize_json", json=payload)  # llenar la caché
+
+    print(f"[*] Audio de {args.seconds}s, {args.iterations} iteraciones")
+    print(f"{'modo':<15} {'bytes':>10} {'tiempo/petición':>17} {'peticiones/s':>13} {'pico memoria':>14}")
+    for name, accept in MODES.items():
+        headers = {"Accept": accept}
+
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            response = client.post("/synthesize_json", json=payload, headers=headers)
+            size = len(response.data)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        client.post("/synthesize_json", json=payload, headers=headers).data
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        per_request_ms = elapsed * 1000 / args.iterations
+        print(f"{name:<15} {size:>10} {per_request_ms:>14.2f} ms {args.iterations / elapsed:>13.1f} "
+              f"{peak / 1024:>11.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark del enrutado entre varios endpoints de Azure (AZURE_TTS_ENDPOINTS).
+
+Arranca tres stubs locales: una región rápida, una lenta y una que responde
+siempre 429 (cuota agotada). Compara solo la región lenta con el pool de las
+tres y muestra cómo se reparte el tráfico según /health (un worker, para que
+las estadísticas por endpoint sean las de todo el servicio).
+"""
+
+import argparse
+import statistics
+
+import requests
+
+from load_test import percentile, run_load, start_service, start_stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--fast-ms", type=float, default=80)
+    parser.add_argument("--slow-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    stubs = {
+        "rapida": start_stub(args.fast_ms, jitter_ms=args.fast_ms / 4, seed=1),
+        "lenta": start_stub(args.slow_ms, jitter_ms=args.slow_ms / 4, seed=2),
+        "limitada": start_stub(args.fast_ms, error_rate=1.0, error_status=429, seed=3),
+    }
+    spec = {name: f"{name}:stub@{url}" for name, (_, url) in stubs.items()}
+    configs = {
+        "solo lenta": spec["lenta"],
+        "pool": ",".join(spec.values()),
+    }
+
+    try:
+        print(f"[*] {args.requests} peticiones, {args.concurrency} clientes; stubs: rápida {args.fast_ms:g} ms, "
+              f"lenta {args.slow_ms:g} ms, limitada (429)")
+        print(f"{'modo':<7} {'endpoints':<11} {'p50':>9} {'p95':>9} {'errores':>8}   reparto")
+        for mode in args.modes.split(","):
+            for name, endpoints in configs.items():
+                service, base_url = start_service(mode, stubs["lenta"][1], 1, {"AZURE_TTS_ENDPOINTS": endpoints})
+                try:
+                    latencies, errors, _ = run_load(base_url, args.concurrency, args.requests)
+                    health = requests.get(f"{base_url}/health", timeout=5).json()
+                finally:
+                    service.terminate()
+                    service.wait()
+                share = ", ".join(f"{endpoint['name']} {endpoint['requests']}" for endpoint in health["endpoints"])
+                p50 = statistics.median(latencies) if latencies else 0.0
+                print(f"{mode:<7} {name:<11} {p50:>6.0f} ms {percentile(latencies, 0.95):>6.0f} ms "
+                      f"{errors:>8}   {share}")
+    finally:
+        for process, _ in stubs.values():
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los formatos de salida de /synthesize.
+Con el audio ya en caché mide, para cada formato, el tamaño enviado, los
+bytes por segundo de audio y el tiempo de CPU por petición (los formatos
+nativos de Azure se reenvían tal cual; FLAC se codifica en cada petición).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from azure_stub import SECONDS_PER_CHAR, serve_in_thread  # noqa: E402
+
+
+def load_app(base_url):
+    os.environ.update(
+        AZURE_TTS_KEY="stub",
+        AZURE_TTS_REGION="stub",
+        AZURE_TTS_ENDPOINT=base_url,
+        DEBUG_AUDIO="false",
+    )
+    import app as service
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duración del audio de prueba")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    _, base_url = serve_in_thread()
+    service = load_app(base_url)
+    client = service.app.test_client()
+    text = "a" * int(args.seconds / SECONDS_PER_CHAR)
+
+    print(f"[*] Audio de {args.seconds}s, {args.iterations} iteraciones")
+    print(f"{'formato':<16} {'bytes':>10} {'bytes/s audio':>14} {'CPU/petición':>14} {'tiempo/petición':>17}")
+    for name in service.FORMATS:
+        payload = {"text": text, "output_format": name, "split_sentences": False}
+        client.post("/synthesize", json=payload)  # llenar la caché
+
+        cpu_start, start = time.process_time(), time.perf_counter()
+        for _ in range(args.iterations):
+            size = len(client.post("/synthesize", json=payload).data)
+        cpu_ms = (time.process_time() - cpu_start) * 1000 / args.iterations
+        wall_ms = (time.perf_counter() - start) * 1000 / args.iterations
+
+        print(f"{name:<16} {size:>10} {size / args.seconds:>14.0f} {cpu_ms:>11.2f} ms {wall_ms:>14.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
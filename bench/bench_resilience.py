@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark del hedging y del circuit breaker frente a Azure.
+
+Hedging: un stub con una pequeña fracción de síntesis mucho más lentas que
+la mediana (--slow-rate, --slow-ms). Compara p50/p95/p99 sin y con
+AZURE_HEDGE_ENABLED y cuánta carga extra generan las coberturas.
+
+Circuit breaker: un stub colgado (cada síntesis supera AZURE_READ_TIMEOUT).
+Sin breaker cada petición espera su timeout; con él, tras las primeras se
+rechazan al momento con 503 hasta la síntesis de prueba.
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_test import percentile, run_load, start_service, start_stub
+
+
+def bench_hedging(args):
+    stub, stub_url = start_stub(args.latency_ms, jitter_ms=args.latency_ms / 4, seed=1,
+                                slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    configs = {"sin hedging": {}, "hedging": {"AZURE_HEDGE_ENABLED": "true"}}
+    try:
+        print(f"[*] Hedging: {args.requests} peticiones, {args.concurrency} clientes; stub {args.latency_ms:g} ms, "
+              f"{args.slow_rate * 100:g}% de síntesis +{args.slow_ms:g} ms")
+        print(f"{'modo':<7} {'config':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'errores':>8}   coberturas")
+        for mode in args.modes.split(","):
+            for name, env in configs.items():
+                service, base_url = start_service(mode, stub_url, 1, env)
+                try:
+                    latencies, errors, _ = run_load(base_url, args.concurrency, args.requests)
+                    stats = requests.get(f"{base_url}/azure/stats", timeout=5).json()["hedging"]
+                finally:
+                    service.terminate()
+                    service.wait()
+                hedges = (f"{stats['hedged']} ({stats['won']} ganadas), +{stats['hedged'] / args.requests:.1%} "
+                          f"de carga, espera {stats['delay_ms']} ms") if "hedged" in stats else "-"
+                p50 = statistics.median(latencies) if latencies else 0.0
+                print(f"{mode:<7} {name:<12} {p50:>5.0f} ms {percentile(latencies, 0.95):>5.0f} ms "
+                      f"{percentile(latencies, 0.99):>5.0f} ms {errors:>8}   {hedges}")
+    finally:
+        stub.terminate()
+
+
+def bench_circuit(args):
+    stub, stub_url = start_stub(args.hang_ms)
+    configs = {"sin breaker": {"AZURE_CIRCUIT_ENABLED": "false"}, "breaker": {}}
+    env = {"AZURE_READ_TIMEOUT": str(args.timeout_ms / 1000), "AZURE_MAX_RETRIES": "0",
+           "AZURE_CIRCUIT_MIN_CALLS": "10"}
+
+    def one(base_url):
+        start = time.perf_counter()
+        response = requests.post(f"{base_url}/synthesize_json", timeout=60,
+                                 json={"text": f"Circuito {uuid.uuid4().hex[:8]}"})
+        return response.status_code, (time.perf_counter() - start) * 1000
+
+    try:
+        print(f"\n[*] Circuit breaker: Azure colgado ({args.hang_ms:g} ms), timeout {args.timeout_ms:g} ms, "
+              f"{args.circuit_requests} peticiones, {args.concurrency} clientes")
+        print(f"{'modo':<7} {'config':<12} {'total':>8} {'media':>9} {'503':>5}   estado")
+        for mode in args.modes.split(","):
+            for name, extra in configs.items():
+                service, base_url = start_service(mode, stub_url, 1, {**env, **extra})
+                try:
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                        results = list(pool.map(lambda _: one(base_url), range(args.circuit_requests)))
+                    elapsed = time.perf_counter() - start
+                    circuit = requests.get(f"{base_url}/azure/stats", timeout=5).json()["circuit"]
+                finally:
+                    service.terminate()
+                    service.wait()
+                rejected = sum(1 for status, _ in results if status == 503)
+                mean = statistics.mean(latency for _, latency in results)
+                state = (f"{circuit['state']}, {circuit['rejected']} rechazadas"
+                         if "state" in circuit else "-")
+                print(f"{mode:<7} {name:<12} {elapsed:>6.1f} s {mean:>6.0f} ms {rejected:>5}   {state}")
+    finally:
+        stub.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ms", type=float, default=1500)
+    parser.add_argument("--hang-ms", type=float, default=5000)
+    parser.add_argument("--timeout-ms", type=float, default=1000)
+    parser.add_argument("--circuit-requests", type=int, default=60)
+    parser.add_argument("--skip-circuit", action="store_true")
+    args = parser.parse_args()
+
+    bench_hedging(args)
+    if not args.skip_circuit:
+        bench_circuit(args)
+
+
+if __name__ == "__main__":
+    main()
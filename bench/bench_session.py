@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: conexión nueva por petición frente al pool keep-alive compartido.
+Usa el stub local de Azure con un coste de handshake simulado.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from azure_client import AzureHTTPClient  # noqa: E402
+from azure_stub import serve_in_thread  # noqa: E402
+
+SSML = (
+    "<speak version='1.0' xml:lang='es-ES'><voice name='es-ES-AbrilNeural'>"
+    "<prosody rate='1.0'>Hola, ¿en qué puedo ayudarte?</prosody></voice></speak>"
+).encode("utf-8")
+HEADERS = {
+    "Ocp-Apim-Subscription-Key": "stub",
+    "Content-Type": "application/ssml+xml",
+    "X-Microsoft-OutputFormat": "riff-24khz-16bit-mono-pcm",
+}
+
+
+def run(post, url, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = post(url, headers=HEADERS, data=SSML)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summary(name, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<24} media={statistics.mean(ordered):7.2f} ms  "
+          f"p50={statistics.median(ordered):7.2f} ms  p95={p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--handshake-ms", type=float, default=30)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    server, base_url = serve_in_thread(latency_ms=args.latency_ms, handshake_ms=args.handshake_ms)
+    url = f"{base_url}/cognitiveservices/v1"
+
+    fresh = run(lambda u, **kw: requests.post(u, timeout=10, **kw), url, args.iterations)
+    client = AzureHTTPClient()
+    pooled = run(client.post, url, args.iterations)
+
+    print(f"[*] {args.iterations} peticiones, handshake simulado {args.handshake_ms} ms, "
+          f"latencia {args.latency_ms} ms")
+    summary("requests.post", fresh)
+    summary("AzureHTTPClient", pooled)
+    print(f"[*] Ahorro medio por petición: {statistics.mean(fresh) - statistics.mean(pooled):.2f} ms")
+    print(f"[*] Pool: {client.connection_stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque: tiempo hasta que gunicorn responde (time-to-ready) y
+latencia de la primera petición de cada worker, con y sin la precarga de
+las dependencias de audio en el master (PRELOAD_AUDIO_LIBS, gunicorn.conf.py).
+La primera petición WAV no necesita numpy; la FLAC sí (codificación local).
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import requests
+
+from load_test import APP_DIR, free_port, service_env, start_stub
+
+CONFIGS = {
+    "sin precarga": {"PRELOAD_AUDIO_LIBS": "false"},
+    "precarga master": {"PRELOAD_AUDIO_LIBS": "true"},
+}
+
+
+def measure(stub_url, extra_env):
+    """Arranca un gunicorn de un worker y devuelve los tiempos en ms"""
+    port = free_port()
+    env = service_env(stub_url, extra_env)
+    base_url = f"http://127.0.0.1:{port}"
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "app:app"],
+                               cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                time.sleep(0.005)
+        timings = {"ready": (time.perf_counter() - start) * 1000}
+
+        for output_format in ("wav", "flac"):
+            payload = {"text": f"Primera petición {uuid.uuid4().hex[:8]}", "output_format": output_format}
+            request_start = time.perf_counter()
+            response = requests.post(f"{base_url}/synthesize", json=payload, timeout=60)
+            response.raise_for_status()
+            timings[output_format] = (time.perf_counter() - request_start) * 1000
+        return timings
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(latency_ms=0)
+    try:
+        print(f"[*] {args.runs} arranques por configuración (medianas)")
+        print(f"{'configuración':<17} {'time-to-ready':>14} {'1ª WAV':>10} {'1ª FLAC':>10}")
+        for name, extra_env in CONFIGS.items():
+            runs = [measure(stub_url, extra_env) for _ in range(args.runs)]
+            ready, wav, flac = (statistics.median(run[key] for run in runs) for key in ("ready", "wav", "flac"))
+            print(f"{name:<17} {ready:>11.0f} ms {wav:>7.1f} ms {flac:>7.1f} ms")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: throughput a concurrencia fija en los modos de servicio
+síncrono (gunicorn, worker sync) y asíncrono (gunicorn + worker aiohttp),
+contra el stub local de Azure. Cada petición usa un texto distinto para que
+todas lleguen a Azure (sin aciertos de caché).
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..", "app")
+
+SERVING_MODES = {
+    "sync": ["app:app"],
+    "async": ["async_app:app", "--worker-class", "aiohttp.GunicornWebWorker"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} no responde")
+
+
+def start_stub(latency_ms, jitter_ms=0, error_rate=0.0, seed=0, error_status=503, slow_rate=0.0, slow_ms=0):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "azure_stub.py"),
+         "--port", str(port), "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms),
+         "--error-rate", str(error_rate), "--error-status", str(error_status), "--seed", str(seed),
+         "--slow-rate", str(slow_rate), "--slow-ms", str(slow_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    wait_ready(f"{base_url}/cognitiveservices/voices/list")
+    return process, base_url
+
+
+def service_env(stub_url, extra_env=None):
+    """Entorno del servicio contra el stub, con sus datos en un directorio temporal
+
+    El catálogo de voces del stub y el almacén de audio no se escriben en
+    app/ (se borran al terminar el benchmark).
+    """
+    data_dir = tempfile.mkdtemp(prefix="azure_tts_bench_")
+    atexit.register(shutil.rmtree, data_dir, True)
+    return dict(
+        os.environ,
+        AZURE_TTS_KEY="stub",
+        AZURE_TTS_REGION="stub",
+        AZURE_TTS_ENDPOINT=stub_url,
+        DEBUG_AUDIO="false",
+        CACHE_DIR=os.path.join(data_dir, "audio_store"),
+        VOICE_CATALOG_SNAPSHOT=os.path.join(data_dir, "voice_catalog.json"),
+        **(extra_env or {}),
+    )
+
+
+def start_service(mode, stub_url, workers, extra_env=None):
+    port = free_port()
+    env = service_env(stub_url, extra_env)
+    command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(workers), *SERVING_MODES[mode]]
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    wait_ready(f"{base_url}/voices")
+    return process, base_url
+
+
+def run_load(base_url, concurrency, total, endpoint="/synthesize_json"):
+    """Lanza `total` peticiones con `concurrency` clientes; devuelve (latencias, errores, segundos)"""
+    sessions = {}
+
+    def one(index):
+        session = sessions.setdefault(index % concurrency, requests.Session())
+        payload = {"text": f"Mensaje de prueba {uuid.uuid4().hex[:8]}"}
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{base_url}{endpoint}", json=payload, timeout=120)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    return latencies, errors, elapsed
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(args.latency_ms)
+    print(f"[*] Latencia de Azure simulada: {args.latency_ms} ms, concurrencia {args.concurrency}, "
+          f"{args.requests} peticiones, {args.workers} worker(s)")
+    print(f"{'modo':<8} {'peticiones/s':>13} {'p50':>10} {'p95':>10} {'errores':>8}")
+    try:
+        for mode in args.modes.split(","):
+            service, base_url = start_service(mode, stub_url, args.workers)
+            try:
+                latencies, errors, elapsed = run_load(base_url, args.concurrency, args.requests)
+            finally:
+                service.terminate()
+                service.wait()
+            throughput = (args.requests - errors) / elapsed
+            p50 = statistics.median(latencies) if latencies else 0.0
+            print(f"{mode:<8} {throughput:>13.1f} {p50:>7.0f} ms {percentile(latencies, 0.95):>7.0f} ms {errors:>8}")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Generador de carga reproducible sin red.
+
+Arranca el stub local de Azure (latencia, jitter y tasa de errores
+configurables, con semilla) y el servicio con gunicorn en cada modo de
+servicio, reproduce una traza JSONL y mide throughput, latencias p50/p95/p99,
+errores y CPU/RSS de cada worker (leídos de /proc).
+
+Cada línea de la traza es un objeto:
+    {"endpoint": "/synthesize", "body": {"text": "...", "output_format": "mp3"}, "at": 0.25}
+"endpoint" es opcional (/synthesize_json por defecto) y "at" (segundos desde
+el inicio) solo se usa con --replay-timing. Una línea sin "body" se toma
+entera como cuerpo, igual que los manifiestos de prerender.py. La traza se
+repite hasta completar --requests.
+
+Carga en bucle cerrado (--concurrency N clientes) o abierto (--rps R): en
+bucle abierto cada latencia se mide desde el instante programado, de modo
+que incluye la espera si el servicio no da abasto.
+
+Con --json se guarda el resultado y con --baseline se compara con uno
+anterior: sale con código 1 si el throughput baja o el p95 sube más de
+--tolerance, para detectar regresiones en CI.
+
+Uso:
+    python bench/loadgen.py --modes sync,async --concurrency 32 --requests 500 \\
+        --latency-ms 150 --jitter-ms 50 --error-rate 0.01 --json result.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_test import BENCH_DIR, percentile, start_service, start_stub
+
+DEFAULT_TRACE = os.path.join(BENCH_DIR, "traces", "mixed.jsonl")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def load_trace(path):
+    """Devuelve la traza como lista de (instante, endpoint, cuerpo)"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = item["body"] if "body" in item else item
+            entries.append((float(item.get("at", 0.0)), item.get("endpoint", "/synthesize_json"), body))
+    return entries
+
+
+def expand_trace(trace, total, cold):
+    """Repite la traza hasta `total` peticiones; con cold cada texto es único (sin aciertos de caché)"""
+    span = max(at for at, _, _ in trace) + 1.0
+    for index in range(total):
+        at, endpoint, body = trace[index % len(trace)]
+        if cold:
+            body = {**body, "text": f"{body['text']} ({index})"}
+        yield at + (index // len(trace)) * span, endpoint, body
+
+
+class ResourceSampler:
+    """Muestrea de /proc el CPU acumulado y el RSS de los workers de un master de gunicorn"""
+
+    def __init__(self, master_pid, interval=0.2):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.workers = {}  # pid -> {"cpu_start", "cpu", "rss_peak"}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        for pid in [self.master_pid, *self._children()]:
+            usage = read_usage(pid)
+            if usage is None:
+                continue
+            cpu, rss = usage
+            worker = self.workers.setdefault(pid, {"cpu_start": cpu, "cpu": cpu, "rss_peak": rss})
+            worker["cpu"] = cpu
+            worker["rss_peak"] = max(worker["rss_peak"], rss)
+
+    def _children(self):
+        children = []
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == self.master_pid:
+                children.append(int(entry))
+        return children
+
+
+def read_usage(pid):
+    """(segundos de CPU, bytes de RSS) de un proceso o None si ya no existe"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # Tras el nombre: estado(0) ... utime(11) stime(12) ... rss(21)
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu, int(fields[21]) * PAGE_SIZE
+
+
+def run_trace(base_url, entries, concurrency=None, rps=None, replay_timing=False, max_in_flight=256):
+    """Lanza las peticiones; devuelve (resultados [(latencia_ms, ok)], segundos)"""
+    local = threading.local()
+
+    def one(scheduled, endpoint, body):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            response = session.post(f"{base_url}{endpoint}", json=body, timeout=120)
+            response.content
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - scheduled) * 1000, ok
+
+    start = time.perf_counter()
+    if concurrency:
+        # Bucle cerrado: cada cliente lanza la siguiente petición al terminar la anterior
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(lambda e=e: one(time.perf_counter(), e[1], e[2])) for e in entries]
+            results = [future.result() for future in futures]
+    else:
+        # Bucle abierto: las peticiones salen a su hora aunque el servicio se retrase
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            futures = []
+            for index, (at, endpoint, body) in enumerate(entries):
+                scheduled = start + (at if replay_timing else index / rps)
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(one, scheduled, endpoint, body))
+            results = [future.result() for future in futures]
+    return results, time.perf_counter() - start
+
+
+def summarize(mode, results, elapsed, sampler):
+    latencies = sorted(latency for latency, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    workers = [
+        {
+            "pid": pid,
+            "role": "master" if pid == sampler.master_pid else "worker",
+            "cpu_seconds": round(usage["cpu"] - usage["cpu_start"], 3),
+            "cpu_percent": round((usage["cpu"] - usage["cpu_start"]) / elapsed * 100, 1),
+            "rss_peak_mb": round(usage["rss_peak"] / (1024 * 1024), 1),
+        }
+        for pid, usage in sorted(sampler.workers.items())
+    ]
+    cpu_total = sum(worker["cpu_seconds"] for worker in workers)
+    return {
+        "mode": mode,
+        "requests": len(results),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round((len(results) - errors) / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 1) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "cpu_ms_per_request": round(cpu_total * 1000 / max(1, len(results)), 2),
+        "workers": workers,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lista de regresiones frente a un resultado anterior"""
+    previous = {result["mode"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(result["mode"])
+        if before is None:
+            continue
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{result['mode']}: throughput {before['throughput_rps']} -> {result['throughput_rps']} rps")
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['mode']}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga reproducible contra el stub local de Azure")
+    parser.add_argument("--trace", default=DEFAULT_TRACE, help="Traza JSONL a reproducir")
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10, help="Peticiones previas que no se miden")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, help="Clientes en bucle cerrado (por defecto 32)")
+    load.add_argument("--rps", type=float, help="Peticiones por segundo en bucle abierto")
+    load.add_argument("--replay-timing", action="store_true", help="Respetar los instantes 'at' de la traza")
+    parser.add_argument("--cold", action="store_true", help="Textos únicos: todas las peticiones llegan a Azure")
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Guardar el resultado en este fichero")
+    parser.add_argument("--baseline", help="Resultado anterior (--json) con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Regresión tolerada frente a --baseline")
+    args = parser.parse_args()
+    if not args.rps and not args.replay_timing and not args.concurrency:
+        args.concurrency = 32
+
+    trace = load_trace(args.trace)
+    entries = list(expand_trace(trace, args.requests, args.cold))
+    load_desc = (f"{args.concurrency} clientes" if args.concurrency
+                 else "instantes de la traza" if args.replay_timing else f"{args.rps:g} peticiones/s")
+    print(f"[*] Traza {os.path.basename(args.trace)} ({len(trace)} entradas), {args.requests} peticiones, "
+          f"{load_desc}, {args.workers} worker(s)")
+    print(f"[*] Stub: latencia {args.latency_ms:g} ms + jitter {args.jitter_ms:g} ms, "
+          f"errores {args.error_rate:.1%}, semilla {args.seed}")
+
+    stub, stub_url = start_stub(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    results = []
+    try:
+        for mode in args.modes.split(","):
+            service, base_url = start_service(mode, stub_url, args.workers)
+            try:
+                warmup = [(0.0, endpoint, {**body, "text": f"warmup {index}"})
+                          for index, (_, endpoint, body) in enumerate(entries[:args.warmup])]
+                run_trace(base_url, warmup, concurrency=max(1, min(args.workers, len(warmup))))
+
+                sampler = ResourceSampler(service.pid)
+                sampler.start()
+                outcomes, elapsed = run_trace(base_url, entries, args.concurrency, args.rps, args.replay_timing)
+                sampler.stop()
+            finally:
+                service.terminate()
+                service.wait()
+            results.append(summarize(mode, outcomes, elapsed, sampler))
+    finally:
+        stub.terminate()
+
+    print(f"{'modo':<8} {'peticiones/s':>13} {'p50':>9} {'p95':>9} {'p99':>9} {'errores':>8} {'CPU/petición':>13}")
+    for result in results:
+        print(f"{result['mode']:<8} {result['throughput_rps']:>13.1f} {result['p50_ms']:>6.0f} ms "
+              f"{result['p95_ms']:>6.0f} ms {result['p99_ms']:>6.0f} ms {result['errors']:>8} "
+              f"{result['cpu_ms_per_request']:>10.2f} ms")
+        for worker in result["workers"]:
+            print(f"    {worker['role']:<7} pid {worker['pid']:<8} CPU {worker['cpu_seconds']:>7.2f} s "
+                  f"({worker['cpu_percent']:>5.1f}%)  RSS pico {worker['rss_peak_mb']:>6.1f} MB")
+
+    report = {"config": vars(args), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[*] Resultado guardado en {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"[!] Regresión: {regression}")
+        if regressions:
+            return 1
+        print(f"[*] Sin regresiones frente a {args.baseline} (tolerancia {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
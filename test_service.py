@@ -10,10 +10,16 @@ import json
 import time
 import sys
 import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
+from unittest.mock import patch
 
 # Configuración del servicio
 SERVICE_URL = "http://localhost:5004"
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 def print_header(title):
     """Imprime un encabezado formateado"""
@@ -33,6 +39,42 @@ def print_info(message):
     """Imprime mensaje informativo"""
     print(f"ℹ️  {message}")
 
+def add_local_paths():
+    """Añade app/ y bench/ al sys.path para las pruebas en proceso"""
+    for name in ("bench", "app"):
+        path = os.path.join(ROOT_DIR, name)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+@contextmanager
+def in_process_service(stubs=None, debug_writer=None):
+    """Importa app contra stubs de Azure en hilos y restaura sus globales al salir
+
+    stubs: {nombre: argumentos de serve_in_thread}; por defecto un stub de 5 ms.
+    """
+    add_local_paths()
+    from azure_stub import serve_in_thread
+    os.environ.setdefault("AZURE_TTS_KEY", "stub")
+    os.environ.setdefault("AZURE_TTS_REGION", "stub")
+    os.environ.setdefault("VOICE_CATALOG_REFRESH", "0")
+    import app as service
+    from endpoint_pool import EndpointPool, parse_endpoints
+    
+    servers = []
+    try:
+        specs = []
+        for name, config in (stubs or {"stub": {"latency_ms": 5}}).items():
+            server, url = serve_in_thread(**config)
+            servers.append(server)
+            specs.append(f"{name}:stub@{url}")
+        with patch.multiple(service, azure_endpoints=EndpointPool(parse_endpoints(",".join(specs))),
+                            DEBUG_AUDIO=debug_writer is not None, debug_writer=debug_writer):
+            yield service
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
 def test_health_check():
     """Prueba el health check del servicio"""
     print_header("HEALTH CHECK")
@@ -49,6 +91,8 @@ def test_health_check():
         print_info(f"Azure disponible: {health_data['azure_available']}")
         print_info(f"Idioma por defecto: {health_data['default_language']}")
         print_info(f"Voz por defecto: {health_data['default_voice']}")
+        print_info(f"Origen del estado: {health_data.get('source')}")
+        print_info(f"Antigüedad de la comprobación: {health_data.get('last_check_age_seconds')}s")
         
         return True
         
@@ -400,6 +444,455 @@ def test_voice_availability():
     
     return successful == len(problematic_voices)
 
+def test_batch_synthesis():
+    """Prueba el endpoint de síntesis por lotes"""
+    print_header("PRUEBA DE SÍNTESIS POR LOTES")
+    
+    items = [
+        {"text": "¿En qué puedo ayudarte?", "language": "es-ES", "voice": "Abril"},
+        {"text": "Gracias por tu llamada", "language": "es-MX", "voice": "Dalia"},
+        {"text": "¿En qué puedo ayudarte?", "language": "es-ES", "voice": "Abril"},  # Duplicado
+        {"text": ""}  # Inválido
+    ]
+    
+    try:
+        start_time = time.time()
+        response = requests.post(f"{SERVICE_URL}/synthesize_batch",
+                               json={"items": items, "concurrency": 4},
+                               timeout=60)
+        response.raise_for_status()
+        
+        lines = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+        summary = lines[-1]
+        results = lines[:-1]
+        
+        ok_indices = sorted(i for r in results if r.get('success') for i in r['indices'])
+        failed_indices = sorted(i for r in results if not r.get('success') for i in r['indices'])
+        
+        print_info(f"Elementos: {summary['total']}, únicos: {summary['unique']}, fallidos: {summary['failed']}")
+        print_info(f"Tiempo total: {time.time() - start_time:.2f}s")
+        
+        if ok_indices == [0, 1, 2] and failed_indices == [3] and summary['unique'] == 2:
+            print_success("Lote procesado con deduplicación y errores por elemento")
+            return True
+        
+        print_error(f"Resultado inesperado: correctos={ok_indices}, fallidos={failed_indices}")
+        return False
+        
+    except Exception as e:
+        print_error(f"Error en síntesis por lotes: {e}")
+        return False
+
+def test_batch_invalid_items():
+    """Lote en proceso: los elementos con campos de tipo incorrecto fallan solos, sin tumbar el lote"""
+    print_header("PRUEBA DE ELEMENTOS INVÁLIDOS EN LOTES")
+    
+    try:
+        items = [
+            {"text": f"Lote válido {uuid.uuid4().hex[:8]}"},
+            {"text": 123},
+            {"text": "Idioma inválido", "language": ["es-ES"]},
+            {"text": "Voz inválida", "voice": {"name": "Abril"}},
+            "no es un objeto",
+        ]
+        with in_process_service() as service:
+            response = service.app.test_client().post("/synthesize_batch", json={"items": items})
+            body = response.get_data(as_text=True)
+        if response.status_code != 200:
+            print_error(f"/synthesize_batch devolvió {response.status_code}")
+            return False
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        ok_indices = sorted(i for r in lines[:-1] if r.get("success") for i in r["indices"])
+        errors = {r["indices"][0]: r["error"] for r in lines[:-1] if not r.get("success")}
+        print_info(f"Correctos: {ok_indices}, errores: {errors}")
+        
+        if ok_indices != [0] or sorted(errors) != [1, 2, 3, 4]:
+            print_error("Cada elemento inválido debería fallar por separado")
+            return False
+        
+        print_success("Los elementos inválidos devuelven su error y el resto se sintetiza")
+        return True
+    
+    except Exception as e:
+        print_error(f"Error en prueba de elementos inválidos: {e}")
+        return False
+
+def test_binary_response():
+    """Prueba las respuestas sin Base64 de /synthesize_json (binaria y multipart)"""
+    print_header("PRUEBA DE RESPUESTAS BINARIAS")
+    
+    payload = {"text": "Prueba de respuesta binaria", "language": "es-ES", "voice": "Abril"}
+    
+    try:
+        response = requests.post(f"{SERVICE_URL}/synthesize_json",
+                               json=payload,
+                               headers={"Accept": "audio/wav"},
+                               timeout=30)
+        response.raise_for_status()
+        
+        metadata = json.loads(response.headers["X-Synthesis-Metadata"])
+        if response.headers.get("Content-Type") != "audio/wav" or metadata["audio_size_bytes"] != len(response.content):
+            print_error("La respuesta binaria no coincide con sus metadatos")
+            return False
+        print_success(f"Binario: {len(response.content)} bytes, {metadata['audio_duration']:.2f}s audio")
+        
+        response = requests.post(f"{SERVICE_URL}/synthesize_json",
+                               json=payload,
+                               headers={"Accept": "multipart/mixed"},
+                               timeout=30)
+        response.raise_for_status()
+        
+        if not response.headers.get("Content-Type", "").startswith("multipart/mixed"):
+            print_error("La respuesta no es multipart")
+            return False
+        print_success(f"Multipart: {len(response.content)} bytes")
+        
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en respuestas binarias: {e}")
+        return False
+
+def test_no_temp_files(requests_count=10):
+    """Comprueba en proceso (Flask test client + stub de Azure) que no quedan ficheros temporales"""
+    print_header("PRUEBA DE FICHEROS TEMPORALES")
+    
+    work_dir = tempfile.mkdtemp(prefix="azure_tts_test_")
+    temp_dir = os.path.join(work_dir, "tmp")
+    debug_dir = os.path.join(work_dir, "debug")
+    os.makedirs(temp_dir)
+    os.makedirs(debug_dir)
+    
+    try:
+        add_local_paths()
+        from debug_writer import DebugAudioWriter
+        
+        # Azure simulado, debug activado y todo fichero temporal dentro de temp_dir
+        writer = DebugAudioWriter(debug_dir, queue_size=requests_count * 2)
+        with in_process_service({"stub": {}}, debug_writer=writer) as service, \
+                patch.object(tempfile, "tempdir", temp_dir):
+            client = service.app.test_client()
+            for i in range(requests_count):
+                payload = {"text": f"Prueba de ficheros temporales {i % 3}", "voice": "Abril"}
+                for endpoint in ("/synthesize", "/synthesize_json"):
+                    response = client.post(endpoint, json=payload)
+                    response.close()
+                    if response.status_code != 200:
+                        print_error(f"{endpoint} devolvió {response.status_code}")
+                        return False
+        
+        writer.flush()
+        leftovers = os.listdir(temp_dir)
+        debug_files = os.listdir(debug_dir)
+        print_info(f"Peticiones: {requests_count * 2}, ficheros de debug: {len(debug_files)}")
+        
+        if leftovers:
+            print_error(f"Quedan {len(leftovers)} ficheros temporales: {leftovers[:5]}")
+            return False
+        if len(debug_files) != requests_count * 2:
+            print_error(f"Se esperaban {requests_count * 2} ficheros de debug")
+            return False
+        
+        print_success("Sin ficheros temporales; un fichero de debug por petición")
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en prueba de ficheros temporales: {e}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_endpoint_failover(requests_count=12):
+    """Enrutado entre varios stubs de Azure: el rápido recibe el tráfico y el que limita se salta"""
+    print_header("PRUEBA DE FAILOVER ENTRE ENDPOINTS")
+    
+    stubs = {
+        "rapida": {"latency_ms": 10},
+        "lenta": {"latency_ms": 200},
+        "limitada": {"error_rate": 1.0, "error_status": 429},
+    }
+    
+    try:
+        with in_process_service(stubs) as service:
+            client = service.app.test_client()
+            run_id = uuid.uuid4().hex[:8]
+            for i in range(requests_count):
+                response = client.post("/synthesize_json", json={"text": f"Failover {run_id} {i}"})
+                if response.status_code != 200:
+                    print_error(f"/synthesize_json devolvió {response.status_code}")
+                    return False
+            endpoints = client.get("/health").get_json()["endpoints"]
+        
+        stats = {endpoint["name"]: endpoint for endpoint in endpoints}
+        for name, endpoint in stats.items():
+            print_info(f"{name}: {endpoint['requests']} peticiones, EWMA {endpoint['latency_ewma_ms']} ms, "
+                       f"throttled {endpoint['throttled']}, sano: {endpoint['healthy']}")
+        
+        if stats["rapida"]["requests"] < requests_count - 2:
+            print_error("El endpoint más rápido no recibió la mayor parte del tráfico")
+            return False
+        if not stats["limitada"]["throttled"] or stats["limitada"]["requests"] > stats["lenta"]["requests"] + 1:
+            print_error("El endpoint con 429 debería quedar en enfriamiento tras el primer rechazo")
+            return False
+        
+        print_success("Todas las síntesis correctas; tráfico en el endpoint más rápido")
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en prueba de failover: {e}")
+        return False
+
+def test_request_coalescing(concurrency=8):
+    """Coalescencia: peticiones idénticas simultáneas hacen una sola llamada a Azure; locks de fichero por clave"""
+    print_header("PRUEBA DE COALESCENCIA DE PETICIONES")
+    
+    lock_dir = tempfile.mkdtemp(prefix="azure_tts_locks_")
+    
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        with in_process_service({"stub": {"latency_ms": 300}}) as service:
+            if service.coalescer is None:
+                print_info("Coalescencia desactivada (COALESCE_ENABLED=false)")
+                return True
+            payload = {"text": f"Coalescencia {uuid.uuid4().hex[:8]}"}
+            before = service.coalescer.stats()["upstream_calls"]
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                responses = list(pool.map(lambda _: service.app.test_client().post("/synthesize_json", json=payload),
+                                          range(concurrency)))
+            upstream_calls = service.coalescer.stats()["upstream_calls"] - before
+        cache = sorted(response.headers.get("X-Cache") for response in responses)
+        print_info(f"{concurrency} peticiones idénticas: {upstream_calls} llamadas a Azure, X-Cache {cache}")
+        if any(response.status_code != 200 for response in responses) or upstream_calls != 1:
+            print_error("Las peticiones idénticas en vuelo deberían compartir una única llamada a Azure")
+            return False
+        
+        # Locks entre workers: la misma clave espera (y respeta el plazo); otra clave no
+        from admission import Overloaded
+        from singleflight import FileKeyLocks
+        locks = FileKeyLocks(lock_dir)
+        with locks.hold("ab" * 32):
+            with locks.hold("cd" * 32, deadline=time.monotonic() + 0.1):
+                pass
+            try:
+                with locks.hold("ab" * 32, deadline=time.monotonic() + 0.1):
+                    print_error("La misma clave no debería conseguir el lock mientras otro lo tiene")
+                    return False
+            except Overloaded as e:
+                print_info(f"La misma clave espera hasta su plazo: {e.reason}")
+        leftovers = [name for _, _, names in os.walk(lock_dir) for name in names]
+        if leftovers:
+            print_error(f"Quedan ficheros de lock: {leftovers}")
+            return False
+        
+        print_success("Una sola llamada a Azure para peticiones idénticas; locks independientes por clave")
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en prueba de coalescencia: {e}")
+        return False
+    finally:
+        shutil.rmtree(lock_dir, ignore_errors=True)
+
+def test_admission_priority():
+    """Control de admisión: con la cola llena una petición interactive expulsa a una bulk con 503"""
+    print_header("PRUEBA DE CONTROL DE ADMISIÓN")
+    
+    try:
+        add_local_paths()
+        import threading
+        from admission import PRIORITIES, AdmissionController, Overloaded, admission_context
+        
+        controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait=5.0)
+        outcomes = {}
+        
+        def request(name, priority):
+            admission_context.set((PRIORITIES[priority], None))
+            try:
+                with controller.slot():
+                    outcomes[name] = "ok"
+            except Overloaded as e:
+                outcomes[name] = e.reason
+        
+        holder = controller.acquire()
+        bulk = threading.Thread(target=request, args=("bulk", "bulk"))
+        bulk.start()
+        while not controller.stats()["queued"]["bulk"]:
+            time.sleep(0.01)
+        interactive = threading.Thread(target=request, args=("interactive", "interactive"))
+        interactive.start()
+        bulk.join(5)
+        controller.release(holder)
+        interactive.join(5)
+        
+        print_info(f"Resultados: {outcomes}; rechazos: {controller.stats()['shed']}")
+        if outcomes != {"bulk": "preempted", "interactive": "ok"}:
+            print_error("La petición interactive debería expulsar a la bulk de la cola llena")
+            return False
+        
+        print_success("La petición bulk se rechazó y la interactive ocupó el hueco")
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en prueba de control de admisión: {e}")
+        return False
+
+def test_circuit_breaker():
+    """Circuit breaker: se abre tras los fallos, rechaza al momento y se cierra con la síntesis de prueba"""
+    print_header("PRUEBA DE CIRCUIT BREAKER")
+    
+    try:
+        add_local_paths()
+        from admission import Overloaded
+        from circuit_breaker import CircuitBreaker
+        
+        breaker = CircuitBreaker(min_calls=4, failure_ratio=0.5, slow_threshold=1.0, open_seconds=0.2)
+        for ok, latency in ((True, 0.1), (False, 0.1), (True, 2.0), (True, 0.1)):
+            breaker.allow()
+            breaker.record(ok, latency)
+        if breaker.state != "open":
+            print_error(f"Con 2 de 4 síntesis fallidas o lentas el circuito debería abrirse ({breaker.state})")
+            return False
+        
+        try:
+            breaker.allow()
+            print_error("Con el circuito abierto la síntesis debería rechazarse")
+            return False
+        except Overloaded as e:
+            print_info(f"Rechazada al momento: {e.reason}, Retry-After {e.retry_after}")
+        
+        time.sleep(0.25)
+        probe = breaker.allow()
+        try:
+            breaker.allow()
+            print_error("Solo debería pasar una síntesis de prueba con el circuito semiabierto")
+            return False
+        except Overloaded:
+            pass
+        breaker.record(True, 0.1, probe)
+        print_info(f"Estado final: {breaker.stats()}")
+        if not probe or breaker.state != "closed":
+            print_error("La síntesis de prueba correcta debería cerrar el circuito")
+            return False
+        
+        print_success("El circuito se abrió, rechazó síntesis y se cerró tras la prueba")
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en prueba de circuit breaker: {e}")
+        return False
+
+def test_audio_postprocess():
+    """Post-procesado: recorte del silencio, normalización LUFS y limitador sobre WAV y μ-law"""
+    print_header("PRUEBA DE POST-PROCESADO DE AUDIO")
+    
+    try:
+        add_local_paths()
+        import numpy as np
+        from audio_processing import (G711_ENCODE, integrated_loudness, parse_postprocess_options, process_audio,
+                                      ulaw_table)
+        from audio_utils import build_wav_header, parse_wav_header
+        
+        # 0,5 s de silencio, 2 s de tono a -30 dBFS y 0,5 s de silencio a 8 kHz
+        t = np.arange(16000) / 8000
+        tone = 0.0316 * np.sin(2 * np.pi * 440 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+        pcm = (np.concatenate([np.zeros(4000), tone, np.zeros(4000)]) * 32767).astype("<i2")
+        # A -7 LUFS los picos pasarían de 0 dBFS: el limitador los deja en -1 dBFS
+        options = parse_postprocess_options({"normalize": "lufs", "target": -7, "trim_silence": True,
+                                             "fade_out_ms": 20})
+        
+        for name, bits, codec, data in (("wav-8khz", 16, 1, pcm.tobytes()),
+                                        ("mulaw-8khz", 8, 7, G711_ENCODE[7](pcm).tobytes())):
+            audio = build_wav_header(8000, bits_per_sample=bits, data_size=len(data), format_tag=codec) + data
+            processed, duration = process_audio(name, audio, options)
+            info = parse_wav_header(processed)
+            samples = processed[info["data_offset"]:]
+            if bits == 16:
+                signal = np.frombuffer(samples, dtype="<i2") / 32768
+            else:
+                signal = ulaw_table()[np.frombuffer(samples, dtype=np.uint8)] / 32768
+            loudness = integrated_loudness(signal, 8000)
+            peak = 20 * np.log10(np.max(np.abs(signal)))
+            print_info(f"{name}: {duration:.2f} s, {loudness:.1f} LUFS, pico {peak:.1f} dBFS")
+            if not 2.0 <= duration < 2.2:
+                print_error(f"El silencio de {name} no se recortó ({duration:.2f} s)")
+                return False
+            if abs(loudness - (-7)) > 1.5 or peak > -0.9:
+                print_error(f"La normalización o el limitador de {name} no dieron el nivel esperado")
+                return False
+        
+        if parse_postprocess_options({}) is not None:
+            print_error("Sin opciones el audio debería enviarse sin procesar")
+            return False
+        
+        # En un lote, el mismo texto con y sin post-procesado son dos síntesis distintas
+        text = f"Post-procesado {uuid.uuid4().hex[:8]}"
+        items = [{"text": text}, {"text": text, "postprocess": {"normalize": "lufs", "gain_db": -6}}, {"text": text}]
+        with in_process_service() as service:
+            response = service.app.test_client().post("/synthesize_batch", json={"items": items})
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line.strip()]
+        audio = {tuple(r["indices"]): r.get("audio_data") for r in lines[:-1]}
+        print_info(f"Lote: {lines[-1]['unique']} síntesis únicas para {lines[-1]['total']} elementos")
+        if lines[-1]["unique"] != 2 or set(audio) != {(0, 2), (1,)} or audio[(0, 2)] == audio[(1,)]:
+            print_error(f"Los elementos con y sin post-procesado no deberían compartir audio: {sorted(audio)}")
+            return False
+        
+        print_success("El audio se recortó, normalizó y limitó en WAV y μ-law, también dentro de un lote")
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en prueba de post-procesado: {e}")
+        return False
+
+def test_text_segmentation():
+    """Segmentación: abreviaturas, frases largas sin puntuación y el límite de max_chars"""
+    print_header("PRUEBA DE SEGMENTACIÓN DE TEXTO")
+    
+    try:
+        add_local_paths()
+        from text_segmentation import split_text
+        
+        # Las abreviaturas e iniciales no cierran frase
+        text = "El Sr. García y la Dra. Pérez llegaron a las 10 aprox. de la mañana. Trajeron el vol. 2 de J. R. Tolkien. ¿Vienes?"
+        expected = ["El Sr. García y la Dra. Pérez llegaron a las 10 aprox. de la mañana.",
+                    "Trajeron el vol. 2 de J. R. Tolkien.", "¿Vienes?"]
+        segments = split_text(text, min_chars=0)
+        print_info(f"Abreviaturas: {segments}")
+        if segments != expected:
+            print_error("Las abreviaturas no deberían partir la frase")
+            return False
+        
+        # Sin puntuación se corta por palabras sin pasar de max_chars ni perder texto
+        text = " ".join(f"palabra{i}" for i in range(200))
+        segments = split_text(text, max_chars=50, min_chars=0)
+        print_info(f"Sin puntuación: {len(text)} caracteres en {len(segments)} segmentos, "
+                   f"el mayor de {max(map(len, segments))}")
+        if len(segments) < 2 or max(map(len, segments)) > 50 or " ".join(segments) != text:
+            print_error("Una frase larga sin puntuación debería cortarse por palabras hasta max_chars")
+            return False
+        
+        # Una frase de exactamente max_chars cabe entera; con un carácter menos se parte
+        sentence = "uno dos tres cuatro cinco seis siete ocho nueve diez once doce trece catorce."
+        limit = len(sentence)
+        if split_text(sentence, max_chars=limit, min_chars=0) != [sentence]:
+            print_error("Una frase de exactamente max_chars no debería partirse")
+            return False
+        segments = split_text(sentence, max_chars=limit - 1, min_chars=0)
+        if len(segments) != 2 or max(map(len, segments)) > limit - 1:
+            print_error(f"Con max_chars={limit - 1} la frase debería partirse en dos: {segments}")
+            return False
+        # Agrupar frases cortas tampoco pasa de max_chars
+        segments = split_text("Hola. Adiós. " + sentence, max_chars=limit, min_chars=40)
+        if segments != ["Hola. Adiós.", sentence]:
+            print_error(f"Las frases cortas no deberían agruparse por encima de max_chars: {segments}")
+            return False
+        
+        print_success("Las abreviaturas se respetan y ningún segmento pasa de max_chars")
+        return True
+        
+    except Exception as e:
+        print_error(f"Error en prueba de segmentación: {e}")
+        return False
+
 def run_all_tests():
     """Ejecuta todas las pruebas"""
     print_header("AZURE TTS SERVICE - SUITE DE PRUEBAS")
@@ -413,7 +906,17 @@ def run_all_tests():
         ("Cambio de Idiomas", test_language_switching),
         ("Recomendaciones de Voces", test_voice_recommendations),
         ("Variaciones de Velocidad", test_speed_variations),
-        ("Debug de Audio", test_debug_audio)
+        ("Debug de Audio", test_debug_audio),
+        ("Síntesis por Lotes", test_batch_synthesis),
+        ("Elementos Inválidos en Lotes", test_batch_invalid_items),
+        ("Respuestas Binarias", test_binary_response),
+        ("Ficheros Temporales", test_no_temp_files),
+        ("Failover entre Endpoints", test_endpoint_failover),
+        ("Coalescencia de Peticiones", test_request_coalescing),
+        ("Control de Admisión", test_admission_priority),
+        ("Circuit Breaker", test_circuit_breaker),
+        ("Post-procesado de Audio", test_audio_postprocess),
+        ("Segmentación de Texto", test_text_segmentation)
     ]
     
     results = []